@@ -0,0 +1,80 @@
+import asyncio
+import logging
+
+from app.config import Config
+from app.services.audio_cache import AudioCache
+from app.services.database import Database, DB_FILE
+from app.services.downloader import Downloader, NativeDownloader
+from app.services.images import CoverProcessor
+from app.services.cli_pool import CLIWorkerPool
+from app.services.processes import ProcessRunner
+from app.services.yandex import setup_yandex_client
+from app.services.yandex_api import YandexClientPool
+
+logger = logging.getLogger(__name__)
+
+# Общая настройка сервисов для бота (run.py) и воркеров (worker.py)
+
+
+async def create_database(config: Config) -> Database:
+    db = Database(
+        db_path=DB_FILE,
+        lyrics_negative_ttl=config.cache.lyrics_negative_ttl,
+        stats_flush_interval=config.stats.flush_interval,
+        stats_flush_threshold=config.stats.flush_threshold,
+        settings_cache_size=config.cache.settings_cache_size,
+        settings_cache_ttl=config.cache.settings_cache_ttl
+    )
+    await db.init_db()
+    return db
+
+
+async def create_yandex_client(config: Config) -> YandexClientPool:
+    yandex = await setup_yandex_client(
+        config.yandex.api_tokens,
+        max_connections=config.yandex.api_connections,
+        timeout=config.yandex.api_timeout,
+        retries=config.yandex.api_retries
+    )
+    logger.info(
+        f"Yandex.Music API: {len(yandex.clients)} token(s), "
+        f"{config.yandex.api_connections} connections."
+    )
+    return yandex
+
+
+async def create_downloader(config: Config, yandex: YandexClientPool) -> Downloader:
+    native = NativeDownloader(
+        yandex,
+        max_connections=config.yandex.download_http_connections
+    )
+    # Пул "теплых" процессов загрузчика или новый процесс на каждую задачу
+    if config.yandex.cli_pool_size > 0:
+        runner = CLIWorkerPool(
+            size=config.yandex.cli_pool_size,
+            max_jobs=config.yandex.cli_pool_max_jobs,
+            timeout=config.yandex.cli_timeout
+        )
+        runner.start()
+    else:
+        runner = ProcessRunner(
+            max_processes=config.yandex.cli_max_processes,
+            timeout=config.yandex.cli_timeout
+        )
+
+    audio_cache = AudioCache(max_bytes=config.cache.audio_cache_max_mb * 2**20)
+    await asyncio.to_thread(audio_cache.load)
+    downloader = Downloader(
+        config.yandex.token,
+        native=native,
+        engine=config.yandex.download_engine,
+        cover_resolution=config.yandex.cover_resolution,
+        cache=audio_cache,
+        runner=runner,
+        covers=CoverProcessor(
+            workers=config.cache.cover_process_workers,
+            cache_size=config.cache.thumbnail_cache_size
+        )
+    )
+    logger.info(f"Download engine: {config.yandex.download_engine}")
+    return downloader
@@ -1,3 +1,4 @@
+import hashlib
 from dataclasses import dataclass
 from pydantic_settings import BaseSettings
 from pydantic import SecretStr
@@ -8,6 +9,63 @@ class EnvConfig(BaseSettings):
     """
     BOT_TOKEN: SecretStr
     YANDEX_TOKEN: SecretStr
+
+    # --- Получение обновлений ---
+    BOT_MODE: str = "polling"
+    DROP_PENDING_UPDATES: bool = True
+    WEBHOOK_URL: str = ""
+    WEBHOOK_PATH: str = "/webhook"
+    WEBHOOK_SECRET: SecretStr | None = None
+    WEBHOOK_HOST: str = "0.0.0.0"
+    WEBHOOK_PORT: int = 8080
+
+    # --- API Яндекса ---
+    YANDEX_EXTRA_TOKENS: str = ""
+    YANDEX_API_CONNECTIONS: int = 16
+    YANDEX_API_TIMEOUT: float = 10
+    YANDEX_API_RETRIES: int = 3
+
+    # --- Загрузчик ---
+    DOWNLOAD_ENGINE: str = "native"
+    DOWNLOAD_HTTP_CONNECTIONS: int = 32
+    COVER_RESOLUTION: str = "orig"
+    CLI_MAX_PROCESSES: int = 4
+    CLI_TIMEOUT: int = 300
+    CLI_POOL_SIZE: int = 0
+    CLI_POOL_MAX_JOBS: int = 50
+
+    # --- Кэш ---
+    LYRICS_NEGATIVE_TTL: int = 86400
+    SEARCH_CACHE_SIZE: int = 2000
+    SEARCH_CACHE_TTL: int = 600
+    INLINE_CACHE_TIME: int = 300
+    INLINE_DEBOUNCE: float = 0.35
+    INLINE_PAGE_SIZE: int = 20
+    SETTINGS_CACHE_SIZE: int = 10000
+    SETTINGS_CACHE_TTL: float = 30
+    TRACK_CACHE_SIZE: int = 20000
+    TRACK_CACHE_TTL: int = 7 * 86400
+    AUDIO_CACHE_MAX_MB: int = 2048
+    THUMBNAIL_CACHE_SIZE: int = 5000
+    COVER_PROCESS_WORKERS: int = 2
+
+    # --- Статистика ---
+    STATS_FLUSH_INTERVAL: float = 5
+    STATS_FLUSH_THRESHOLD: int = 500
+
+    # --- Очередь задач ---
+    MAX_CONCURRENT_JOBS: int = 8
+    MAX_JOBS_PER_USER: int = 2
+    BATCH_MAX_TRACKS: int = 100
+
+    # --- Несколько процессов / серверов ---
+    FSM_STORAGE: str = "memory"
+    JOB_QUEUE: str = ""
+    JOB_QUEUE_NAME: str = "downloads"
+    JOB_LEASE: int = 600
+    JOB_MAX_ATTEMPTS: int = 3
+    WORKER_CONCURRENCY: int = 4
+    REDIS_URL: str = "redis://localhost:6379/0"
     
     class Config:
         env_file = ".env"
@@ -18,20 +76,162 @@ class EnvConfig(BaseSettings):
 class BotConfig:
     """Конфиг для Телеграм Бота"""
     token: str
+    mode: str
+    drop_pending_updates: bool
+
+@dataclass
+class WebhookConfig:
+    """Конфиг webhook-режима (aiohttp-сервер)"""
+    url: str
+    path: str
+    secret: str
+    host: str
+    port: int
 
 @dataclass
 class YandexConfig:
     """Конфиг для API Яндекса"""
     token: str
+    api_tokens: list[str]
+    api_connections: int
+    api_timeout: float
+    api_retries: int
+    download_engine: str
+    download_http_connections: int
+    cover_resolution: str
+    cli_max_processes: int
+    cli_timeout: int
+    cli_pool_size: int
+    cli_pool_max_jobs: int
+
+@dataclass
+class QueueConfig:
+    """Конфиг очереди задач (скачивание, тексты, обложки)"""
+    max_concurrent_jobs: int
+    max_jobs_per_user: int
+    batch_max_tracks: int
+
+@dataclass
+class BackendConfig:
+    """Конфиг общих хранилищ для запуска в несколько процессов"""
+    fsm_storage: str
+    job_queue: str
+    job_queue_name: str
+    job_lease: int
+    job_max_attempts: int
+    worker_concurrency: int
+    redis_url: str
+
+@dataclass
+class CacheConfig:
+    """Конфиг кэшей"""
+    lyrics_negative_ttl: int
+    search_cache_size: int
+    search_cache_ttl: int
+    inline_cache_time: int
+    inline_debounce: float
+    inline_page_size: int
+    settings_cache_size: int
+    settings_cache_ttl: float
+    track_cache_size: int
+    track_cache_ttl: int
+    audio_cache_max_mb: int
+    thumbnail_cache_size: int
+    cover_process_workers: int
 
-def load_config() -> tuple[BotConfig, YandexConfig]:
+@dataclass
+class StatsConfig:
+    """Конфиг записи статистики"""
+    flush_interval: float
+    flush_threshold: int
+
+@dataclass
+class Config:
+    """Вся конфигурация бота"""
+    bot: BotConfig
+    webhook: WebhookConfig
+    yandex: YandexConfig
+    queue: QueueConfig
+    backend: BackendConfig
+    cache: CacheConfig
+    stats: StatsConfig
+
+def load_config() -> Config:
     """
     Загружает, валидирует и возвращает 
     конфигурацию в удобных объектах.
     """
     env = EnvConfig()
+    bot_token = env.BOT_TOKEN.get_secret_value()
+
+    # Секрет по умолчанию выводится из токена бота, поэтому
+    # у всех экземпляров за одним адресом он одинаковый.
+    webhook_secret = (
+        env.WEBHOOK_SECRET.get_secret_value() if env.WEBHOOK_SECRET
+        else hashlib.sha256(bot_token.encode()).hexdigest()
+    )
 
-    return (
-        BotConfig(token=env.BOT_TOKEN.get_secret_value()),
-        YandexConfig(token=env.YANDEX_TOKEN.get_secret_value())
-    )
\ No newline at end of file
+    return Config(
+        bot=BotConfig(
+            token=bot_token,
+            mode=env.BOT_MODE.lower(),
+            drop_pending_updates=env.DROP_PENDING_UPDATES
+        ),
+        webhook=WebhookConfig(
+            url=env.WEBHOOK_URL.rstrip("/"),
+            path=env.WEBHOOK_PATH,
+            secret=webhook_secret,
+            host=env.WEBHOOK_HOST,
+            port=env.WEBHOOK_PORT
+        ),
+        yandex=YandexConfig(
+            token=env.YANDEX_TOKEN.get_secret_value(),
+            # Основной токен + дополнительные (через запятую) для запросов к API
+            api_tokens=[env.YANDEX_TOKEN.get_secret_value()] + [
+                token.strip() for token in env.YANDEX_EXTRA_TOKENS.split(",") if token.strip()
+            ],
+            api_connections=env.YANDEX_API_CONNECTIONS,
+            api_timeout=env.YANDEX_API_TIMEOUT,
+            api_retries=env.YANDEX_API_RETRIES,
+            download_engine=env.DOWNLOAD_ENGINE.lower(),
+            download_http_connections=env.DOWNLOAD_HTTP_CONNECTIONS,
+            cover_resolution=env.COVER_RESOLUTION,
+            cli_max_processes=env.CLI_MAX_PROCESSES,
+            cli_timeout=env.CLI_TIMEOUT,
+            cli_pool_size=env.CLI_POOL_SIZE,
+            cli_pool_max_jobs=env.CLI_POOL_MAX_JOBS
+        ),
+        queue=QueueConfig(
+            max_concurrent_jobs=env.MAX_CONCURRENT_JOBS,
+            max_jobs_per_user=env.MAX_JOBS_PER_USER,
+            batch_max_tracks=env.BATCH_MAX_TRACKS
+        ),
+        backend=BackendConfig(
+            fsm_storage=env.FSM_STORAGE.lower(),
+            job_queue=env.JOB_QUEUE.lower(),
+            job_queue_name=env.JOB_QUEUE_NAME,
+            job_lease=env.JOB_LEASE,
+            job_max_attempts=env.JOB_MAX_ATTEMPTS,
+            worker_concurrency=env.WORKER_CONCURRENCY,
+            redis_url=env.REDIS_URL
+        ),
+        cache=CacheConfig(
+            lyrics_negative_ttl=env.LYRICS_NEGATIVE_TTL,
+            search_cache_size=env.SEARCH_CACHE_SIZE,
+            search_cache_ttl=env.SEARCH_CACHE_TTL,
+            inline_cache_time=env.INLINE_CACHE_TIME,
+            inline_debounce=env.INLINE_DEBOUNCE,
+            inline_page_size=env.INLINE_PAGE_SIZE,
+            settings_cache_size=env.SETTINGS_CACHE_SIZE,
+            settings_cache_ttl=env.SETTINGS_CACHE_TTL,
+            track_cache_size=env.TRACK_CACHE_SIZE,
+            track_cache_ttl=env.TRACK_CACHE_TTL,
+            audio_cache_max_mb=env.AUDIO_CACHE_MAX_MB,
+            thumbnail_cache_size=env.THUMBNAIL_CACHE_SIZE,
+            cover_process_workers=env.COVER_PROCESS_WORKERS
+        ),
+        stats=StatsConfig(
+            flush_interval=env.STATS_FLUSH_INTERVAL,
+            flush_threshold=env.STATS_FLUSH_THRESHOLD
+        )
+    )
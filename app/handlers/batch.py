@@ -0,0 +1,320 @@
+import asyncio
+import logging
+import re
+import time
+
+from aiogram import Router, F, types
+from aiogram.exceptions import TelegramAPIError, TelegramBadRequest, TelegramRetryAfter
+
+from app.handlers.media import audio_tags, message_track_ids, sent_file_id
+from app.services.yandex import create_job_dir, remove_job_dir
+from app.services.downloader import AudioFile, Downloader
+from app.services.tracks import TrackCatalog, TrackInfo
+from app.services.tracklists import TrackList, resolve_album, resolve_artist, resolve_playlist
+from app.services.database import Database, FILE_AUDIO
+from app.services.scheduler import JobScheduler, PRIORITY_DOWNLOAD
+from app.services.singleflight import SingleFlight
+
+
+router = Router()
+logger = logging.getLogger(__name__)
+
+# /album/<id> (но не /album/<id>/track/<id> - это один трек),
+# /users/<логин>/playlists/<id> и /artist/<id>
+COLLECTION_REGEX = (
+    r"https?://music\.yandex\.(?:ru|com)/"
+    r"(?:album/(?P<album>\d+)(?!\d|/track)"
+    r"|users/(?P<owner>[^/\s?]+)/playlists/(?P<kind>\d+)"
+    r"|artist/(?P<artist>\d+))"
+)
+
+# Telegram принимает в одной медиагруппе от 2 до 10 файлов
+MEDIA_GROUP_SIZE = 10
+# Сколько раз ждать flood control (retry_after) перед повтором отправки
+SEND_RETRIES = 3
+
+
+class _BatchStatus:
+    """Одно общее сообщение о ходе загрузки вместо статуса на каждый трек."""
+
+    def __init__(self, status_msg: types.Message, title: str, total: int):
+        self.status_msg = status_msg
+        self.title = title
+        self.total = total
+        self.sent = 0
+        self.failed = 0
+
+    def _text(self, done: bool = False) -> str:
+        header = "✅ <b>Готово</b>" if done else "⏳ <b>Скачиваю...</b>"
+        text = f"{header}\n💿 {self.title}\n\nОтправлено: {self.sent} из {self.total}"
+        if self.failed:
+            text += f"\n❌ Не удалось: {self.failed}"
+        return text
+
+    async def update(self, done: bool = False):
+        # Статус не должен ломать пачку: "текст не изменился",
+        # flood control, сетевые ошибки - просто пропускаем
+        try:
+            await self.status_msg.edit_text(self._text(done))
+        except Exception as e:
+            logger.debug(f"Batch status update failed: {e}")
+
+
+async def _send_media(message: types.Message, media: list[types.InputMediaAudio]) -> list[types.Message]:
+    """Отправляет аудио или медиагруппу, при flood control ждет и повторяет."""
+    for attempt in range(SEND_RETRIES + 1):
+        try:
+            if len(media) == 1:
+                return [await message.answer_audio(
+                    audio=media[0].media,
+                    title=media[0].title,
+                    performer=media[0].performer,
+                    duration=media[0].duration,
+                    thumbnail=media[0].thumbnail
+                )]
+            return await message.answer_media_group(media=media)
+        except TelegramRetryAfter as e:
+            if attempt == SEND_RETRIES:
+                raise
+            logger.warning(f"Flood control while sending a batch, waiting {e.retry_after}s")
+            await asyncio.sleep(e.retry_after)
+
+
+async def _send_group(
+    message: types.Message,
+    group: list[tuple[TrackInfo, str | AudioFile]],
+    db: Database,
+    quality_code: int
+) -> dict[str, str | None]:
+    """
+    Отправляет готовые треки одной медиагруппой (или одним аудио).
+    Новые file_id сохраняет в кэш, отклоненные старые - удаляет.
+    Возвращает {track_id: file_id} отправленных треков.
+    """
+    media = [
+        types.InputMediaAudio(media=item)
+        if isinstance(item, str)
+        else types.InputMediaAudio(media=types.FSInputFile(item.path), **audio_tags(item))
+        for _, item in group
+    ]
+
+    try:
+        sent = await _send_media(message, media)
+    except TelegramBadRequest as e:
+        if len(group) == 1:
+            track, item = group[0]
+            logger.warning(f"Failed to send track {track.id}: {e}")
+            if isinstance(item, str):
+                # Устаревший file_id - иначе на нем споткнется каждая следующая пачка
+                await db.delete_file_id(track.id, FILE_AUDIO, quality_code)
+            return {}
+        # Например, устаревший file_id - шлем по одному, чтобы не терять остальные
+        logger.warning(f"Media group rejected, sending one by one: {e}")
+        delivered = {}
+        for entry in group:
+            delivered.update(await _send_group(message, [entry], db, quality_code))
+        return delivered
+    except TelegramAPIError as e:
+        # Flood control не отпустил, сеть и т.п. - эти треки не дошли,
+        # но остальная пачка продолжается
+        logger.warning(f"Failed to send {len(group)} track(s): {e}")
+        return {}
+
+    delivered = {}
+    for (track, item), sent_msg in zip(group, sent):
+        file_id = sent_file_id(sent_msg)
+        if not isinstance(item, str):
+            await db.save_file_id(track.id, FILE_AUDIO, file_id, quality_code)
+        await db.increment_track_count(message.from_user.id)
+        delivered[track.id] = file_id
+    return delivered
+
+
+async def process_batch(
+    message: types.Message,
+    track_list: TrackList,
+    db: Database,
+    scheduler: JobScheduler,
+    downloader: Downloader,
+    flights: SingleFlight
+):
+    """
+    Качает и отправляет несколько треков одной задачей.
+
+    - уже загруженные в Telegram треки отправляются по file_id;
+    - остальные качаются параллельно через общую очередь
+      (не больше MAX_JOBS_PER_USER одновременно);
+    - трек, который уже качает кто-то другой, не качается второй раз
+      (SingleFlight, те же ключи, что у одиночных загрузок);
+    - готовые треки уходят сразу, по порядку, подряд идущие
+      собираются в медиагруппы до 10 штук;
+    - весь прогресс - в одном сообщении.
+    """
+    user_id = message.from_user.id
+    tracks = track_list.tracks
+    settings = await db.get_user_settings(user_id)
+    quality_code = settings.get("quality", 1)
+
+    status = _BatchStatus(
+        await message.answer(f"⏳ <b>Скачиваю...</b>\n💿 {track_list.title}"),
+        track_list.title,
+        len(tracks)
+    )
+    started = time.perf_counter()
+
+    cached = await db.get_file_ids([track.id for track in tracks], FILE_AUDIO, quality_code)
+    job_dirs: dict[str, str] = {}
+    loop = asyncio.get_running_loop()
+    # Загрузки, которые ведет эта пачка: ожидающие получат file_id,
+    # когда трек уйдет в чат (результат SingleFlight - file_id, как
+    # у одиночной загрузки)
+    published: dict[str, asyncio.Future] = {}
+    flight_tasks: dict[str, asyncio.Task] = {}
+    published_ids: set[str] = set()
+
+    async def download(track: TrackInfo) -> AudioFile:
+        job_dir = create_job_dir()
+        job_dirs[track.id] = job_dir
+        return await downloader.download_audio(track.id, quality_code, job_dir, track)
+
+    async def fetch(track: TrackInfo) -> str | AudioFile | None:
+        """Свой скачанный файл или file_id чужой загрузки того же трека."""
+        audio_ready = loop.create_future()
+
+        async def lead():
+            try:
+                audio = await scheduler.submit(
+                    user_id, lambda: download(track), priority=PRIORITY_DOWNLOAD
+                )
+            except asyncio.CancelledError:
+                audio_ready.cancel()
+                raise
+            except Exception as e:
+                audio_ready.set_exception(e)
+                audio_ready.exception()  # ошибку заберет fetch, если он еще ждет
+                raise
+            published[track.id] = loop.create_future()
+            published_ids.add(track.id)
+            audio_ready.set_result(audio)
+            return await published[track.id]
+
+        flight = asyncio.create_task(flights.do((track.id, quality_code), lead))
+        flight_tasks[track.id] = flight
+        await asyncio.wait({flight, audio_ready}, return_when=asyncio.FIRST_COMPLETED)
+        if audio_ready.done():
+            return audio_ready.result()
+        file_id, _ = flight.result()
+        return file_id
+
+    pending: list[str | asyncio.Task] = [
+        cached.get(track.id) or asyncio.create_task(fetch(track))
+        for track in tracks
+    ]
+
+    def ready(index: int) -> bool:
+        item = pending[index]
+        return not isinstance(item, asyncio.Task) or item.done()
+
+    group: list[tuple[TrackInfo, str | AudioFile]] = []
+    try:
+        for index, track in enumerate(tracks):
+            item = pending[index]
+            if isinstance(item, asyncio.Task):
+                try:
+                    item = await item
+                except Exception as e:
+                    logger.warning(f"Batch download failed for {track.id}: {e}")
+                    status.failed += 1
+                    item = None
+            if item is not None:
+                group.append((track, item))
+
+            # Отправляем, когда группа полная или следующий трек еще не готов
+            is_last = index == len(tracks) - 1
+            if group and (len(group) == MEDIA_GROUP_SIZE or is_last or not ready(index + 1)):
+                delivered = await _send_group(message, group, db, quality_code)
+                status.sent += len(delivered)
+                status.failed += len(group) - len(delivered)
+                for sent_track, _ in group:
+                    waiting = published.pop(sent_track.id, None)
+                    if waiting and not waiting.done():
+                        waiting.set_result(delivered.get(sent_track.id))
+                    job_dir = job_dirs.pop(sent_track.id, None)
+                    if job_dir:
+                        remove_job_dir(job_dir)
+                group = []
+                await status.update()
+    finally:
+        for waiting in published.values():
+            if not waiting.done():
+                waiting.set_result(None)
+        # Отменяем только загрузки, которые еще идут: ведущий, чей трек уже
+        # отправлен (или отпущен выше), сам отдаст file_id ожидающим чатам
+        for track_id, task in flight_tasks.items():
+            if not task.done() and track_id not in published_ids:
+                task.cancel()
+        for item in pending:
+            if isinstance(item, asyncio.Task) and not item.done():
+                item.cancel()
+        # Забираем ошибки отмененных и упавших задач
+        await asyncio.gather(
+            *flight_tasks.values(), *(item for item in pending if isinstance(item, asyncio.Task)),
+            return_exceptions=True
+        )
+        for job_dir in job_dirs.values():
+            remove_job_dir(job_dir)
+
+    await status.update(done=True)
+    logger.info(
+        f"Batch '{track_list.title}' ({len(tracks)} tracks, {len(cached)} cached) "
+        f"finished in {time.perf_counter() - started:.2f}s: "
+        f"{status.sent} sent, {status.failed} failed"
+    )
+
+
+@router.message(F.text.regexp(COLLECTION_REGEX).as_("link"))
+async def handle_collection_link(
+    message: types.Message,
+    link: re.Match,
+    catalog: TrackCatalog,
+    db: Database,
+    scheduler: JobScheduler,
+    flights: SingleFlight,
+    downloader: Downloader,
+    batch_max_tracks: int
+):
+    """
+    Ловит ссылку на альбом, плейлист или исполнителя
+    и отправляет все треки одной пакетной задачей.
+    Ссылки на отдельные треки в том же сообщении
+    добавляются в конец пачки.
+    """
+    try:
+        if link["album"]:
+            track_list = await resolve_album(catalog, link["album"], batch_max_tracks)
+        elif link["kind"]:
+            track_list = await resolve_playlist(
+                catalog, link["owner"], link["kind"], batch_max_tracks
+            )
+        else:
+            track_list = await resolve_artist(catalog, link["artist"], batch_max_tracks)
+    except Exception as e:
+        logger.error(f"Failed to resolve {link[0]}: {e}")
+        track_list = None
+
+    if not track_list or not track_list.tracks:
+        await message.answer("❌ <b>Не удалось получить список треков.</b>")
+        return
+
+    listed = {track.id for track in track_list.tracks}
+    extra_ids = [track_id for track_id in message_track_ids(message) if track_id not in listed]
+    if extra_ids:
+        extra = await catalog.get_many(extra_ids)
+        track_list.tracks += [extra[track_id] for track_id in extra_ids if track_id in extra]
+
+    try:
+        await message.delete()
+    except Exception:
+        pass
+
+    await process_batch(message, track_list, db, scheduler, downloader, flights)
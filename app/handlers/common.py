@@ -76,8 +76,8 @@ async def handle_settings_button(message: types.Message, db: Database):
     """
     Показывает инлайн-меню настроек (читает из SQLite).
     """
-    # ===>>> ЧИТАЕМ ИЗ БД <<<===
-    settings = await db.get_user_stats_and_settings(message.from_user.id)
+    # ===>>> ЧИТАЕМ ИЗ БД (через кэш настроек) <<<===
+    settings = await db.get_user_settings(message.from_user.id)
     
     quality_code = settings.get("quality", 1)
     send_lrc = settings.get("send_lrc", True)
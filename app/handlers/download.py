@@ -1,70 +1,245 @@
 import logging
-import os
 import asyncio
+import time
 import io 
 
-from aiogram import Router, F, types
+from aiogram import Router, types
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.fsm.context import FSMContext
-from yandex_music import Client, Track 
 
-from app.services.yandex import download_track_via_cli, get_lyrics_via_cli, get_cover_via_cli
-from app.services.metadata import extract_metadata
+from app.services.yandex import create_job_dir, remove_job_dir
+from app.handlers.batch import process_batch
+from app.handlers.media import audio_tags, message_track_ids, sent_file_id
+from app.services.downloader import Downloader
+from app.services.tracks import TrackCatalog, TrackInfo
+from app.services.tracklists import TrackList
 from app.keyboards.inline import get_settings_menu 
-from app.services.database import Database
+from app.services.database import Database, FILE_AUDIO, FILE_COVER, FILE_COVER_DOCUMENT, FILE_LRC
+from app.services.job_queue import JobQueue
+from app.services.scheduler import JobScheduler, PRIORITY_DOWNLOAD, PRIORITY_LIGHT
+from app.services.singleflight import SingleFlight
 from app.states.main import ActionStates
 
 
 router = Router()
 logger = logging.getLogger(__name__)
 
-TRACK_REGEX = r"https?://music\.yandex\.(ru|com)/track/(\d+)"
+# Как часто обновлять процент скачивания в статусе (сек)
+PROGRESS_INTERVAL = 3
 
+# Telegram не принимает фото тяжелее 10 МБ
+MAX_PHOTO_SIZE = 10 * 1024 * 1024
 
-@router.message(F.text.regexp(TRACK_REGEX))
+
+def _track_links(message: types.Message) -> dict | bool:
+    """
+    Фильтр: ищет ссылки на треки в любом месте текста или подписи,
+    в том числе спрятанные под текстом (пересланные сообщения).
+    Найденные id передаются в хендлер как track_ids.
+    """
+    track_ids = message_track_ids(message)
+    return {"track_ids": track_ids} if track_ids else False
+
+
+class _QueueStatus:
+    """
+    Показывает позицию в очереди в статусном сообщении
+    и возвращает исходный текст, когда задача стартовала.
+    """
+    def __init__(self, status_msg: types.Message, start_text: str):
+        self.status_msg = status_msg
+        self.start_text = start_text
+        self.was_queued = False
+        self.last_progress = time.monotonic()
+
+    async def queued(self, position: int):
+        self.was_queued = True
+        await self.status_msg.edit_text(
+            f"🕒 <b>Вы в очереди:</b> {position}\n"
+            "<i>Задача начнется автоматически.</i>"
+        )
+
+    async def progress(self, percent: float):
+        """Процент скачивания (не чаще раза в PROGRESS_INTERVAL секунд)."""
+        now = time.monotonic()
+        if now - self.last_progress < PROGRESS_INTERVAL:
+            return
+        self.last_progress = now
+        try:
+            await self.status_msg.edit_text(f"⬇️ <b>Скачиваю...</b> {percent:.0f}%")
+        except Exception as e:
+            # Flood control или сеть - не повод прерывать саму загрузку
+            logger.debug(f"Failed to report progress: {e}")
+
+    async def started(self):
+        if self.was_queued:
+            try:
+                await self.status_msg.edit_text(self.start_text)
+            except Exception:
+                pass
+
+
+async def _send_cached(send, db: Database, track_id: str, kind: str, quality: int = 0) -> bool:
+    """
+    Пытается переотправить файл по сохраненному file_id
+    (без скачивания и выгрузки). Возвращает True, если получилось.
+    """
+    file_id = await db.get_file_id(track_id, kind, quality)
+    if not file_id:
+        return False
+    try:
+        await send(file_id)
+        return True
+    except TelegramBadRequest as e:
+        logger.warning(f"Cached file_id rejected ({kind}, {track_id}): {e}")
+        await db.delete_file_id(track_id, kind, quality)
+        return False
+
+
+async def _get_lyrics(
+    downloader: Downloader,
+    db: Database,
+    track_id: str,
+    track_obj: TrackInfo | None,
+    cli_gate=None
+) -> (str, str):
+    """
+    Текст песни: сначала из кэша в БД, потом из API.
+    cli_gate - см. Downloader.get_lyrics.
+    """
+    cached = await db.get_lyrics(track_id)
+    if cached is not None:
+        return cached
+    
+    lrc_text, plain_text = await downloader.get_lyrics(track_id, track_obj, cli_gate)
+    await db.save_lyrics(track_id, lrc_text, plain_text)
+    return lrc_text, plain_text
+
+
+async def _send_auto_lrc(
+    message: types.Message,
+    lyrics: asyncio.Task,
+    track_id: str,
+    track_obj: TrackInfo | None,
+    db: Database
+):
+    """
+    Отправляет LRC после трека (настройка "Авто-LRC").
+    lyrics - заранее запущенная задача получения текста.
+    """
+    try:
+        if await _send_cached(
+            lambda file_id: message.answer_document(file_id), db, track_id, FILE_LRC
+        ):
+            lyrics.cancel()
+            await db.increment_lyrics_count(message.from_user.id)
+            return
+
+        waited = time.perf_counter()
+        lrc_text, plain_text = await lyrics
+        logger.info(f"Track {track_id}: LRC waited {time.perf_counter() - waited:.2f}s after audio")
+        if lrc_text and track_obj:
+            lrc_file = types.BufferedInputFile(
+                file=lrc_text.encode('utf-8'), 
+                filename=f"{track_obj.main_artist} - {track_obj.title}.lrc"
+            )
+            sent = await message.answer_document(lrc_file)
+            await db.save_file_id(track_id, FILE_LRC, sent_file_id(sent))
+            await db.increment_lyrics_count(message.from_user.id)
+    except Exception as e:
+        logger.warning(f"Failed to auto-send LRC: {e}")
+
+
+@router.message(_track_links)
 async def handle_track_link(
     message: types.Message, 
     state: FSMContext, 
-    yandex_client: Client,
-    yandex_token: str,
-    db: Database
+    track_ids: list[str],
+    catalog: TrackCatalog,
+    db: Database,
+    scheduler: JobScheduler,
+    flights: SingleFlight,
+    downloader: Downloader,
+    job_queue: JobQueue | None
 ):
     """
-    Ловит ссылку на трек и решает, что с ней делать.
+    Ловит ссылки на треки и решает, что с ними делать.
+    Несколько ссылок в одном сообщении качаются одной пачкой.
     """
+    # FSM state (временный). Сбрасываем сразу, а не после выполнения:
+    # задача может долго ждать в очереди, а следующая ссылка
+    # уже должна обрабатываться как обычное скачивание.
+    current_state = await state.get_state()
+    await state.set_state(ActionStates.awaiting_link_for_download)
+
+    # Информация о треках - из кэша (память / SQLite), в Яндекс
+    # только промахи, одним запросом на все сразу
+    tracks = await catalog.get_many(track_ids)
+
+    if current_state == ActionStates.awaiting_link_for_lyrics.state:
+        for track_id in track_ids:
+            await process_lyrics(message, track_id, tracks.get(track_id), db, scheduler, downloader) 
+    elif current_state == ActionStates.awaiting_link_for_cover.state:
+        for track_id in track_ids:
+            await process_cover(message, track_id, tracks.get(track_id), db, scheduler, downloader) 
+    elif len(track_ids) == 1:
+        await process_download(
+            message, track_ids[0], tracks.get(track_ids[0]), db, scheduler, flights, downloader,
+            job_queue
+        ) 
+    else:
+        await process_links_batch(message, track_ids, tracks, db, scheduler, flights, downloader)
+
+
+async def process_links_batch(
+    message: types.Message,
+    track_ids: list[str],
+    tracks: dict[str, TrackInfo],
+    db: Database,
+    scheduler: JobScheduler,
+    flights: SingleFlight,
+    downloader: Downloader
+):
+    """Скачивает все треки из сообщения одной пачкой с общим статусом."""
+    missing = [track_id for track_id in track_ids if track_id not in tracks]
+    if missing:
+        await message.answer(
+            "❌ <b>Не удалось найти треки:</b> " + ", ".join(missing)
+        )
+
+    found = [tracks[track_id] for track_id in track_ids if track_id in tracks]
+    if not found:
+        return
+
     try:
-        # FSM state (временный)
-        current_state = await state.get_state()
-        track_id = message.text.split("/")[-1].split("?")[0]
+        await message.delete() 
+    except Exception:
+        pass 
 
-        try:
-            track_obj = (await asyncio.to_thread(yandex_client.tracks, track_id))[0]
-        except Exception:
-            track_obj = None
-
-        if current_state == ActionStates.awaiting_link_for_lyrics.state:
-            await process_lyrics(message, yandex_token, track_id, track_obj, db) 
-        elif current_state == ActionStates.awaiting_link_for_cover.state:
-            await process_cover(message, yandex_token, track_id, track_obj, db) 
-        else:
-            await process_download(message, yandex_token, track_id, track_obj, db) 
-            
-    finally:
-        await state.set_state(ActionStates.awaiting_link_for_download)
+    await process_batch(
+        message,
+        TrackList(title=f"Треков из сообщения: {len(found)}", tracks=found),
+        db, scheduler, downloader, flights
+    )
 
 
 async def process_download(
     message: types.Message, 
-    yandex_token: str,
     track_id: str,
-    track_obj: Track | None,
-    db: Database
+    track_obj: TrackInfo | None,
+    db: Database,
+    scheduler: JobScheduler,
+    flights: SingleFlight,
+    downloader: Downloader,
+    job_queue: JobQueue | None = None
 ):
     """
     Обрабатывает скачивание аудиофайла.
-    (Читает настройки из БД)
+    (Читает настройки из БД, сама загрузка идет через очередь:
+    локальную или, если задан job_queue, - отдельных воркеров)
     """
     # ===>>> ЧИТАЕМ НАСТРОЙКИ ИЗ БД <<<===
-    settings = await db.get_user_stats_and_settings(message.from_user.id)
+    settings = await db.get_user_settings(message.from_user.id)
     quality_code = settings.get("quality", 1)
     send_lrc = settings.get("send_lrc", True)
 
@@ -73,76 +248,223 @@ async def process_download(
     except Exception:
         pass 
 
-    status_msg = await message.answer("⏳ <b>Начинаю скачивание...</b>\n<i>(Это может занять время)</i>")
-    
-    filepath = None
-    
+    # ===>>> ЗАГРУЗКОЙ ЗАНИМАЮТСЯ ВОРКЕРЫ <<<===
+    if job_queue is not None and not await db.get_file_id(track_id, FILE_AUDIO, quality_code):
+        await _enqueue_download(message, job_queue, track_id, quality_code, send_lrc)
+        return
+
+    started = time.perf_counter()
+    lyrics_task = None
+
+    def start_lyrics():
+        # Запасной путь через CLI - тоже через очередь задач (лимиты на процессы)
+        return asyncio.create_task(_get_lyrics(
+            downloader, db, track_id, track_obj,
+            cli_gate=lambda func: scheduler.submit(
+                message.from_user.id, func, priority=PRIORITY_LIGHT
+            )
+        ))
+
     try:
-        filepath = await download_track_via_cli(
-            yandex_token, track_id, quality_code
+        # ===>>> ТРЕК УЖЕ ЕСТЬ В TELEGRAM <<<===
+        delivered = await _send_cached(
+            lambda file_id: message.answer_audio(audio=file_id),
+            db, track_id, FILE_AUDIO, quality_code
         )
-        
-        await status_msg.edit_text("⚙️ <b>Извлекаю метаданные...</b>")
-        
-        title_to_send, performer_to_send, duration_to_send, thumb = await asyncio.to_thread(
-            extract_metadata, filepath
+
+        # ===>>> ТЕКСТ ИЩЕМ ПАРАЛЛЕЛЬНО С АУДИО <<<===
+        # (ответ из API или кэша будет готов к моменту отправки трека)
+        if send_lrc:
+            lyrics_task = start_lyrics()
+
+        if delivered:
+            await db.increment_track_count(message.from_user.id)
+        else:
+            start_text = "⏳ <b>Начинаю скачивание...</b>\n<i>(Это может занять время)</i>"
+            status_msg = await message.answer(start_text)
+            queue_status = _QueueStatus(status_msg, start_text)
+
+            def submit_download():
+                return scheduler.submit(
+                    message.from_user.id,
+                    lambda: _download_job(
+                        message, status_msg, queue_status, downloader,
+                        track_id, track_obj, quality_code, db
+                    ),
+                    priority=PRIORITY_DOWNLOAD,
+                    on_queued=queue_status.queued
+                )
+
+            # ===>>> ТОТ ЖЕ ТРЕК УЖЕ КАЧАЕТ КТО-ТО ДРУГОЙ <<<===
+            # Одинаковые одновременные запросы ждут одну загрузку,
+            # а потом переотправляют ее file_id. Если чужая загрузка
+            # не удалась, ожидавшие делают одну повторную попытку -
+            # тоже общую (под тем же ключом), а не каждый свою.
+            flight_key = (track_id, quality_code)
+            file_id = None
+            reported = False
+            for _ in range(2):
+                try:
+                    file_id, shared = await flights.do(flight_key, submit_download)
+                except Exception as e:
+                    logger.warning(f"Download flight for {track_id} failed: {e}")
+                    break
+                if not shared:
+                    # Своя загрузка: ошибку уже показал _download_job, не повторяем
+                    reported = True
+                    break
+                file_id = await _send_shared(message, status_msg, file_id, db)
+                if file_id:
+                    break
+
+            if not file_id and not reported:
+                try:
+                    await status_msg.edit_text("❌ <b>Не удалось скачать трек.</b>")
+                except TelegramBadRequest:
+                    pass
+
+            delivered = bool(file_id)
+
+        logger.info(
+            f"Track {track_id} (q={quality_code}) "
+            f"{'delivered' if delivered else 'failed'} in {time.perf_counter() - started:.2f}s"
         )
 
-        if not title_to_send and track_obj:
-            title_to_send = track_obj.title
-        if not performer_to_send and track_obj:
-            performer_to_send = ', '.join(a.name for a in track_obj.artists)
-        if not duration_to_send and track_obj:
-            duration_to_send = track_obj.duration_ms // 1000
+        # ===>>> ЧИТАЕМ НАСТРОЙКУ ИЗ ПЕРЕМЕННОЙ <<<===
+        if lyrics_task and delivered:
+            await _send_auto_lrc(message, lyrics_task, track_id, track_obj, db)
+    finally:
+        if lyrics_task:
+            _discard_task(lyrics_task)
+
+
+def _discard_task(task: asyncio.Task):
+    """Отменяет ненужную задачу; ошибку уже завершившейся - забирает (без "never retrieved")."""
+    if not task.done():
+        task.cancel()
+    elif not task.cancelled():
+        task.exception()
+
+
+async def _enqueue_download(
+    message: types.Message,
+    job_queue: JobQueue,
+    track_id: str,
+    quality_code: int,
+    send_lrc: bool
+):
+    """
+    Ставит загрузку в общую очередь. Воркер сам отправит трек
+    и будет обновлять статусное сообщение.
+    """
+    status_msg = await message.answer("🕒 <b>Трек в очереди на скачивание...</b>")
+    try:
+        await job_queue.put({
+            "chat_id": message.chat.id,
+            "user_id": message.from_user.id,
+            "track_id": track_id,
+            "quality": quality_code,
+            "send_lrc": send_lrc,
+            "status_message_id": status_msg.message_id,
+        })
+    except Exception as e:
+        logger.error(f"Failed to enqueue {track_id}: {e}")
+        error_text = str(e).replace("<", "&lt;").replace(">", "&gt;")
+        await status_msg.edit_text(
+            f"❌ <b>Не удалось поставить трек в очередь:</b>\n<code>{error_text}</code>"
+        )
+
+
+async def _send_shared(
+    message: types.Message,
+    status_msg: types.Message,
+    file_id: str | None,
+    db: Database
+) -> str | None:
+    """
+    Отправляет трек, загруженный чужой (объединенной) задачей.
+    Возвращает file_id при успехе.
+    """
+    if not file_id:
+        return None
+    try:
+        await message.answer_audio(audio=file_id)
+    except TelegramBadRequest as e:
+        logger.warning(f"Shared file_id rejected: {e}")
+        return None
+    
+    try:
+        await status_msg.delete()
+    except Exception:
+        pass
+    
+    await db.increment_track_count(message.from_user.id)
+    return file_id
+
+
+async def _download_job(
+    message: types.Message,
+    status_msg: types.Message,
+    queue_status: _QueueStatus,
+    downloader: Downloader,
+    track_id: str,
+    track_obj: TrackInfo | None,
+    quality_code: int,
+    db: Database
+) -> str | None:
+    """
+    Сама загрузка и отправка трека (выполняется в очереди).
+    Возвращает file_id отправленного аудио или None при ошибке.
+    """
+    await queue_status.started()
+    job_dir = create_job_dir()
+    started = time.perf_counter()
+    
+    try:
+        audio = await downloader.download_audio(
+            track_id, quality_code, job_dir, track_obj, on_progress=queue_status.progress
+        )
+        downloaded = time.perf_counter()
 
         await status_msg.edit_text("📤 <b>Загружаю аудио в Telegram...</b>")
         
-        await message.answer_audio(
-            audio=types.FSInputFile(filepath),
-            title=title_to_send or "Без названия",
-            performer=performer_to_send or "Неизвестный",
-            duration=duration_to_send,
-            thumbnail=types.BufferedInputFile(thumb.getvalue(), "jpg") if thumb else None
+        sent = await message.answer_audio(
+            audio=types.FSInputFile(audio.path), **audio_tags(audio)
         )
+        uploaded = time.perf_counter()
         
         await status_msg.delete()
+        logger.info(
+            f"Track {track_id} pipeline: download {downloaded - started:.2f}s, "
+            f"upload {uploaded - downloaded:.2f}s"
+        )
+        
+        # ===>>> ЗАПОМИНАЕМ file_id <<<===
+        file_id = sent_file_id(sent)
+        await db.save_file_id(track_id, FILE_AUDIO, file_id, quality_code)
         
         # ===>>> СЧЕТЧИК <<<===
         await db.increment_track_count(message.from_user.id)
 
-        # ===>>> ЧИТАЕМ НАСТРОЙКУ ИЗ ПЕРЕМЕННОЙ <<<===
-        if send_lrc:
-            try:
-                lrc_text, plain_text = await get_lyrics_via_cli(yandex_token, track_id)
-                if lrc_text and track_obj:
-                    lrc_file = types.BufferedInputFile(
-                        file=lrc_text.encode('utf-8'), 
-                        filename=f"{track_obj.artists[0].name if track_obj.artists else 'Unknown'} - {track_obj.title}.lrc"
-                    )
-                    await message.answer_document(lrc_file)
-                    await db.increment_lyrics_count(message.from_user.id)
-            except Exception as e:
-                logger.warning(f"Failed to auto-send LRC: {e}")
+        return file_id
 
     except Exception as e:
         logger.error(f"Download error: {e}")
         error_text = str(e).replace("<", "&lt;").replace(">", "&gt;")
         await status_msg.edit_text(f"❌ <b>Ошибка при загрузке:</b>\n<code>{error_text}</code>")
+        return None
     
     finally:
-        if filepath and os.path.exists(filepath):
-            try:
-                os.remove(filepath)
-            except Exception as e:
-                logger.warning(f"Failed to remove file: {e}")
+        remove_job_dir(job_dir)
 
 
 async def process_lyrics(
     message: types.Message,
-    yandex_token: str,
     track_id: str,
-    track_obj: Track | None,
-    db: Database
+    track_obj: TrackInfo | None,
+    db: Database,
+    scheduler: JobScheduler,
+    downloader: Downloader
 ):
     """
     Обрабатывает запрос на текст песни (по кнопке).
@@ -152,16 +474,52 @@ async def process_lyrics(
     except Exception:
         pass
 
-    status_msg = await message.answer("⏳ <b>Ищу текст песни (LRC)...</b>")
+    # ===>>> LRC УЖЕ ЕСТЬ В TELEGRAM <<<===
+    if track_obj:
+        track_title = f"<i>Трек: {track_obj.main_artist} - {track_obj.title}</i>" if track_obj.artists else ""
+        if await _send_cached(
+            lambda file_id: message.answer_document(
+                file_id, caption=f"🎵 Текст песни (LRC) с таймкодами.\n{track_title}"
+            ),
+            db, track_id, FILE_LRC
+        ):
+            await db.increment_lyrics_count(message.from_user.id)
+            return
+
+    start_text = "⏳ <b>Ищу текст песни (LRC)...</b>"
+    status_msg = await message.answer(start_text)
+    queue_status = _QueueStatus(status_msg, start_text)
+
+    await scheduler.submit(
+        message.from_user.id,
+        lambda: _lyrics_job(
+            message, status_msg, queue_status, downloader, track_id, track_obj, db
+        ),
+        priority=PRIORITY_LIGHT,
+        on_queued=queue_status.queued
+    )
+
+
+async def _lyrics_job(
+    message: types.Message,
+    status_msg: types.Message,
+    queue_status: _QueueStatus,
+    downloader: Downloader,
+    track_id: str,
+    track_obj: TrackInfo | None,
+    db: Database
+):
+    """Поиск и отправка текста песни (выполняется в очереди)."""
+    await queue_status.started()
     
     try:
-        lrc_text, plain_text = await get_lyrics_via_cli(yandex_token, track_id)
+        lrc_text, plain_text = await _get_lyrics(downloader, db, track_id, track_obj)
         
         if not track_obj:
              await status_msg.edit_text("❌ <b>Ошибка:</b> Не удалось получить информацию о треке.")
              return
 
-        track_title = f"<i>Трек: {track_obj.artists[0].name} - {track_obj.title}</i>" if track_obj.artists else ""
+        track_title = f"<i>Трек: {track_obj.main_artist} - {track_obj.title}</i>" if track_obj.artists else ""
 
         if not plain_text:
             await status_msg.edit_text(
@@ -169,11 +527,22 @@ async def process_lyrics(
             )
             return
 
-        lrc_file = types.BufferedInputFile(
-            file=lrc_text.encode('utf-8'), 
-            filename=f"{track_obj.artists[0].name if track_obj.artists else 'Unknown'} - {track_obj.title}.lrc"
-        )
-        await message.answer_document(lrc_file, caption=f"🎵 Текст песни (LRC) с таймкодами.\n{track_title}")
+        filename = f"{track_obj.main_artist} - {track_obj.title}"
+
+        if lrc_text:
+            lrc_file = types.BufferedInputFile(
+                file=lrc_text.encode('utf-8'), 
+                filename=f"{filename}.lrc"
+            )
+            sent = await message.answer_document(lrc_file, caption=f"🎵 Текст песни (LRC) с таймкодами.\n{track_title}")
+            await db.save_file_id(track_id, FILE_LRC, sent_file_id(sent))
+        else:
+            # Синхронизированного текста нет - отправляем обычный
+            txt_file = types.BufferedInputFile(
+                file=plain_text.encode('utf-8'),
+                filename=f"{filename}.txt"
+            )
+            await message.answer_document(txt_file, caption=f"🎵 Текст песни (без таймкодов).\n{track_title}")
         
         await status_msg.delete()
         
@@ -188,10 +557,11 @@ async def process_lyrics(
 
 async def process_cover(
     message: types.Message,
-    yandex_token: str,
     track_id: str,
-    track_obj: Track | None,
-    db: Database
+    track_obj: TrackInfo | None,
+    db: Database,
+    scheduler: JobScheduler,
+    downloader: Downloader
 ):
     """
     Обрабатывает запрос на обложку трека.
@@ -201,27 +571,63 @@ async def process_cover(
     except Exception:
         pass
 
-    status_msg = await message.answer("⏳ <b>Ищу обложку...</b>")
-    filepath = None
+    # ===>>> ОБЛОЖКА УЖЕ ЕСТЬ В TELEGRAM <<<===
+    track_title = ""
+    if track_obj:
+        track_title = f"<i>{track_obj.main_artist} - {track_obj.title}</i>" if track_obj.artists else ""
+    caption = f"🖼 Обложка трека.\n{track_title}"
+    if await _send_cached(
+        lambda file_id: message.answer_photo(photo=file_id, caption=caption),
+        db, track_id, FILE_COVER
+    ) or await _send_cached(
+        lambda file_id: message.answer_document(file_id, caption=caption),
+        db, track_id, FILE_COVER_DOCUMENT
+    ):
+        await db.increment_cover_count(message.from_user.id)
+        return
+
+    start_text = "⏳ <b>Ищу обложку...</b>"
+    status_msg = await message.answer(start_text)
+    queue_status = _QueueStatus(status_msg, start_text)
+
+    await scheduler.submit(
+        message.from_user.id,
+        lambda: _cover_job(
+            message, status_msg, queue_status, downloader, track_id, track_obj, track_title, db
+        ),
+        priority=PRIORITY_LIGHT,
+        on_queued=queue_status.queued
+    )
+
+
+async def _cover_job(
+    message: types.Message,
+    status_msg: types.Message,
+    queue_status: _QueueStatus,
+    downloader: Downloader,
+    track_id: str,
+    track_obj: TrackInfo | None,
+    track_title: str,
+    db: Database
+):
+    """Поиск и отправка обложки (выполняется в очереди)."""
+    await queue_status.started()
     
     try:
-        filepath = await get_cover_via_cli(yandex_token, track_id)
-        await status_msg.edit_text("⚙️ <b>Извлекаю обложку...</b>")
-        
-        _, _, _, thumb = await asyncio.to_thread(
-            extract_metadata, filepath
-        )
-
-        track_title = ""
-        if track_obj:
-            track_title = f"<i>{track_obj.artists[0].name} - {track_obj.title}</i>" if track_obj.artists else ""
+        cover = await downloader.get_cover(track_id, track_obj)
 
-        if thumb:
-            await message.answer_photo(
-                photo=types.BufferedInputFile(thumb.getvalue(), "cover.jpg"),
-                caption=f"🖼 Обложка трека.\n{track_title}"
-            )
+        if cover:
+            caption = f"🖼 Обложка трека.\n{track_title}"
+            cover_file = types.BufferedInputFile(cover, "cover.jpg")
+            if len(cover) <= MAX_PHOTO_SIZE:
+                sent = await message.answer_photo(photo=cover_file, caption=caption)
+                kind = FILE_COVER
+            else:
+                # Слишком большая для фото - отправляем файлом
+                sent = await message.answer_document(cover_file, caption=caption)
+                kind = FILE_COVER_DOCUMENT
             await status_msg.delete()
+            await db.save_file_id(track_id, kind, sent_file_id(sent))
             
             # ===>>> СЧЕТЧИК <<<===
             await db.increment_cover_count(message.from_user.id)
@@ -233,10 +639,3 @@ async def process_cover(
         logger.error(f"Cover error: {e}")
         error_text = str(e).replace("<", "&lt;").replace(">", "&gt;")
         await status_msg.edit_text(f"❌ <b>Ошибка при поиске обложки:</b>\n<code>{error_text}</code>")
-    
-    finally:
-        if filepath and os.path.exists(filepath):
-            try:
-                os.remove(filepath)
-            except Exception as e:
-                logger.warning(f"Failed to remove dummy file: {e}")
\ No newline at end of file
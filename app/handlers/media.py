@@ -0,0 +1,45 @@
+import re
+
+from aiogram import types
+
+from app.services.downloader import AudioFile
+
+# /track/<id> и /album/<id>/track/<id>
+TRACK_REGEX = re.compile(r"https?://music\.yandex\.(?:ru|com)/(?:album/\d+/)?track/(\d+)")
+
+
+def extract_track_ids(text: str) -> list[str]:
+    """Все id треков из текста по порядку, без повторов."""
+    return list(dict.fromkeys(match[1] for match in TRACK_REGEX.finditer(text)))
+
+
+def message_track_ids(message: types.Message) -> list[str]:
+    """
+    Id треков из текста или подписи сообщения, в том числе
+    из ссылок, спрятанных под текстом (пересланные сообщения).
+    """
+    text = message.text or message.caption or ""
+    entities = message.entities or message.caption_entities or []
+    urls = [entity.url for entity in entities if entity.url]
+    return extract_track_ids("\n".join([text, *urls]))
+
+
+def audio_tags(audio: AudioFile) -> dict:
+    """Теги скачанного трека для answer_audio / InputMediaAudio."""
+    return dict(
+        title=audio.title or "Без названия",
+        performer=audio.performer or "Неизвестный",
+        duration=audio.duration,
+        thumbnail=types.BufferedInputFile(audio.thumbnail, "thumb.jpg") if audio.thumbnail else None
+    )
+
+
+def sent_file_id(sent: types.Message) -> str | None:
+    """Достает file_id из отправленного сообщения с файлом."""
+    if sent.audio:
+        return sent.audio.file_id
+    if sent.document:
+        return sent.document.file_id
+    if sent.photo:
+        return sent.photo[-1].file_id
+    return None
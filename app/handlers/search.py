@@ -1,42 +1,85 @@
 import logging
 from aiogram import Router, types
-from aiogram.types import InlineQueryResultArticle, InputTextMessageContent, InlineKeyboardMarkup, InlineKeyboardButton
-from yandex_music import Client
-from app.services.yandex import search_tracks
+from aiogram.types import (
+    InlineQueryResultArticle, InlineQueryResultCachedAudio, InputTextMessageContent,
+    InlineKeyboardMarkup, InlineKeyboardButton
+)
+from app.services.database import Database, FILE_AUDIO
+from app.services.search_cache import SearchCache
 
 router = Router()
 logger = logging.getLogger(__name__)
 
 @router.inline_query()
-async def handle_inline_search(query: types.InlineQuery, yandex_client: Client):
+async def handle_inline_search(
+    query: types.InlineQuery,
+    search_cache: SearchCache,
+    inline_cache_time: int,
+    db: Database
+):
     """
-    Обрабатывает inline-запросы, используя асинхронный поиск.
+    Обрабатывает inline-запросы, используя кэш и асинхронный поиск.
+    Треки, которые уже есть в Telegram (в качестве юзера),
+    отдаются сразу аудио, остальные - ссылкой.
     """
     try:
-        tracks = await search_tracks(yandex_client, query.query)
+        offset = int(query.offset) if query.offset.isdigit() else 0
+
+        page = search_cache.cached(query.query, offset)
+        if page is None:
+            # Ждем, пока юзер допечатает. Устаревшие запросы не отвечаем.
+            # (Прокрутка вниз - не набор текста, ее не откладываем)
+            if offset == 0 and not await search_cache.debounce(query.from_user.id, query.id):
+                return
+            page = await search_cache.search(query.query, offset)
+        tracks, next_offset = page
+
+        settings = await db.get_user_settings(query.from_user.id)
+        file_ids = await db.get_file_ids(
+            [track.id for track in tracks], FILE_AUDIO, settings.get("quality", 1)
+        )
         results = []
         
         for track in tracks:
             title = track.title
-            performer = ', '.join(artist.name for artist in track.artists)
+            performer = track.performer
             full_title = f"{performer} — {title}"
             url = f"https://music.yandex.ru/track/{track.id}"
+            reply_markup = InlineKeyboardMarkup(inline_keyboard=[[
+                InlineKeyboardButton(text="Открыть в Яндекс.Музыке", url=url)
+            ]])
+
+            file_id = file_ids.get(str(track.id))
+            if file_id:
+                # Аудио уже загружено - появится в чате мгновенно
+                results.append(
+                    InlineQueryResultCachedAudio(
+                        id=str(track.id),
+                        audio_file_id=file_id,
+                        reply_markup=reply_markup
+                    )
+                )
+                continue
             
             results.append(
                 InlineQueryResultArticle(
                     id=str(track.id),
                     title=full_title,
-                    description=f"Альбом: {track.albums[0].title}" if track.albums else "Трек",
+                    description=f"Альбом: {track.album_title}" if track.album_title else "Трек",
                     input_message_content=InputTextMessageContent(message_text=url),
-                    reply_markup=InlineKeyboardMarkup(inline_keyboard=[[
-                        InlineKeyboardButton(text="Открыть в Яндекс.Музыке", url=url)
-                    ]])
+                    reply_markup=reply_markup
                 )
             )
         
-        await query.answer(results, cache_time=1)
+        await query.answer(
+            results,
+            cache_time=inline_cache_time,
+            next_offset=next_offset,
+            # file_id зависят от качества юзера - не делимся ими с другими
+            is_personal=bool(file_ids)
+        )
 
     except Exception as e:
         logger.error(f"Inline search error: {e}")
         # Не падаем, просто отдаем пустой результат
-        await query.answer([], cache_time=1)
\ No newline at end of file
+        await query.answer([], cache_time=1)
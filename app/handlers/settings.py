@@ -17,7 +17,7 @@ async def _update_settings_menu(message: types.Message, db: Database, user_id: i
     Вспомогательная функция для обновления меню настроек
     (читает настройки из БД).
     """
-    settings = await db.get_user_stats_and_settings(user_id)
+    settings = await db.get_user_settings(user_id)
     
     quality_code = settings.get("quality", 1)
     send_lrc = settings.get("send_lrc", True)
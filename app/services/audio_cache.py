@@ -0,0 +1,218 @@
+import asyncio
+import logging
+import os
+import re
+import shutil
+import time
+from collections import OrderedDict
+
+from app.services.yandex import AUDIO_EXTENSIONS, DOWNLOAD_DIR
+
+logger = logging.getLogger(__name__)
+
+AUDIO_CACHE_DIR = os.path.join(DOWNLOAD_DIR, "cache")
+
+_CACHE_FILE = re.compile(r"^(\d+)_(\d+)(\.\w+)$")
+# Временный файл живет доли секунды (ссылка + rename); старше - остался после падения
+TMP_MAX_AGE = 3600
+
+
+class AudioCache:
+    """
+    Локальный кэш скачанных треков: (track_id, качество) -> файл.
+
+    - общий объем ограничен max_bytes, при переполнении удаляются
+      файлы, которые дольше всего не запрашивали (LRU);
+    - запись атомарная: файл появляется в кэше целиком через os.replace;
+    - наружу файл выдается жесткой ссылкой в папку задачи, поэтому
+      вытеснение из кэша не ломает уже идущую отправку.
+    Порядок LRU хранится во времени изменения файлов, поэтому
+    переживает перезапуск и общий у всех процессов (бот и воркеры)
+    с одной папкой кэша: после каждой записи содержимое папки
+    перечитывается, и лимит max_bytes действует на всю папку.
+    Работа с диском (ссылки, копирование, удаление, обход папки)
+    идет в потоках; индекс меняется только в цикле событий.
+    """
+
+    def __init__(self, max_bytes: int, root: str = AUDIO_CACHE_DIR):
+        self.max_bytes = max_bytes
+        self.root = root
+        self.hits = 0
+        self.misses = 0
+        self.size = 0
+        self._entries: OrderedDict[tuple[str, int], tuple[str, int]] = OrderedDict()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def load(self):
+        """Читает содержимое папки кэша (вызывать при старте, в потоке)."""
+        if not self.enabled:
+            return
+        os.makedirs(self.root, exist_ok=True)
+        self._apply_scan(self._scan())
+        logger.info(f"Audio cache: {len(self._entries)} files, {self.size / 2**20:.1f} MB.")
+
+    def _scan(self) -> list[tuple[float, tuple[str, int], str, int]]:
+        """
+        Обходит папку кэша (блокирующий вызов): в нее пишут и из нее
+        удаляют и другие процессы. Порядок LRU - по времени изменения.
+        """
+        now = time.time()
+        found = []
+        for entry in os.scandir(self.root):
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            match = _CACHE_FILE.match(entry.name)
+            if not match:
+                # Недописанные файлы после падения (свежие - чужая запись в процессе)
+                if now - stat.st_mtime > TMP_MAX_AGE:
+                    self._remove(entry.path)
+                continue
+            found.append((stat.st_mtime, (match[1], int(match[2])), entry.path, stat.st_size))
+        return sorted(found)
+
+    def _apply_scan(self, found: list) -> list[str]:
+        """
+        Пересобирает индекс по результату _scan и применяет лимит.
+        Возвращает пути, которые нужно удалить с диска.
+        """
+        stale = []
+        self._entries.clear()
+        self.size = 0
+        for _, key, path, size in found:
+            old = self._entries.pop(key, None)
+            if old:
+                # Тот же трек с другим расширением - оставляем новый
+                self.size -= old[1]
+                stale.append(old[0])
+            self._entries[key] = (path, size)
+            self.size += size
+        return stale + self._evict()
+
+    def _find_on_disk(self, key: tuple[str, int]) -> tuple[str, int] | None:
+        """Файл, который положил в кэш другой процесс (блокирующий вызов)."""
+        for extension in AUDIO_EXTENSIONS:
+            path = os.path.join(self.root, f"{key[0]}_{key[1]}{extension}")
+            try:
+                return path, os.path.getsize(path)
+            except FileNotFoundError:
+                continue
+        return None
+
+    def _remove(self, path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Failed to remove cached file {path}: {e}")
+
+    def _remove_all(self, paths: list[str]):
+        for path in paths:
+            self._remove(path)
+
+    def _evict(self) -> list[str]:
+        """Убирает из индекса старые записи сверх лимита и возвращает их пути."""
+        evicted = []
+        while self.size > self.max_bytes and self._entries:
+            _, (path, size) = self._entries.popitem(last=False)
+            self.size -= size
+            evicted.append(path)
+        return evicted
+
+    def _link(self, src: str, dst: str):
+        """Жесткая ссылка (без копирования), копия - если ФС не умеет."""
+        try:
+            os.link(src, dst)
+        except OSError:
+            shutil.copyfile(src, dst)
+
+    def _link_and_touch(self, src: str, dst: str):
+        self._link(src, dst)
+        os.utime(src)
+
+    def _publish(self, src: str, tmp: str, target: str):
+        """Атомарно кладет файл в кэш: ссылка во временный файл и rename."""
+        try:
+            self._link(src, tmp)
+            os.replace(tmp, target)
+        except Exception:
+            self._remove(tmp)
+            raise
+
+    async def checkout(self, track_id: str, quality: int, dest_path: str) -> str | None:
+        """
+        Выдает закэшированный трек в dest_path (без расширения)
+        и возвращает полный путь, или None при промахе.
+        """
+        if not self.enabled:
+            return None
+
+        key = (str(track_id), quality)
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = await asyncio.to_thread(self._find_on_disk, key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if key not in self._entries:
+                self._entries[key] = entry
+                self.size += entry[1]
+
+        path, size = entry
+        target = dest_path + os.path.splitext(path)[1]
+        try:
+            await asyncio.to_thread(self._link_and_touch, path, target)
+        except FileNotFoundError:
+            # Файл вытеснил другой процесс или удалили мимо кэша
+            if self._entries.get(key) == entry:
+                del self._entries[key]
+                self.size -= size
+            self.misses += 1
+            return None
+
+        if key in self._entries:
+            self._entries.move_to_end(key)
+        self.hits += 1
+        return target
+
+    def has_any(self, track_id: str) -> str | None:
+        """Путь к треку в любом качестве (для обложки из тегов) или None."""
+        for (cached_id, _), (path, _) in reversed(self._entries.items()):
+            if cached_id == str(track_id):
+                return path
+        return None
+
+    async def store(self, track_id: str, quality: int, path: str):
+        """Кладет скачанный файл в кэш (исходный файл остается на месте)."""
+        if not self.enabled:
+            return
+
+        size = await asyncio.to_thread(os.path.getsize, path)
+        if size > self.max_bytes:
+            return
+
+        target = os.path.join(self.root, f"{track_id}_{quality}{os.path.splitext(path)[1]}")
+        tmp = f"{target}.{os.getpid()}.tmp"
+        try:
+            await asyncio.to_thread(self._publish, path, tmp, target)
+        except Exception as e:
+            logger.warning(f"Failed to cache {track_id}: {e}")
+            return
+
+        found = await asyncio.to_thread(self._scan)
+        stale = self._apply_scan(found)
+        if stale:
+            await asyncio.to_thread(self._remove_all, stale)
+
+    def stats(self) -> str:
+        total = self.hits + self.misses
+        ratio = self.hits / total * 100 if total else 0
+        return (
+            f"{len(self._entries)} files, {self.size / 2**20:.1f} MB, "
+            f"hits {self.hits}, misses {self.misses} ({ratio:.0f}% hit rate)"
+        )
@@ -0,0 +1,60 @@
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Iterator
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Простой LRU-кэш в памяти с необязательным временем жизни записей.
+    При переполнении вытесняется запись, к которой дольше всего не обращались.
+    """
+
+    def __init__(self, maxsize: int, ttl: float | None = None):
+        self.maxsize = max(1, maxsize)
+        self.ttl = ttl
+        self._data: OrderedDict[Hashable, tuple[float | None, Any]] = OrderedDict()
+
+    def _expired(self, expires_at: float | None) -> bool:
+        return expires_at is not None and expires_at <= time.monotonic()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.get(key, _MISSING)
+        if entry is _MISSING:
+            return default
+        expires_at, value = entry
+        if self._expired(expires_at):
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: float | None = None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.pop(key, _MISSING)
+        if entry is _MISSING or self._expired(entry[0]):
+            return default
+        return entry[1]
+
+    def clear(self):
+        self._data.clear()
+
+    def items(self) -> Iterator[tuple[Hashable, Any]]:
+        """Живые записи (без обновления порядка LRU)."""
+        for key, (expires_at, value) in list(self._data.items()):
+            if not self._expired(expires_at):
+                yield key, value
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self) -> int:
+        return len(self._data)
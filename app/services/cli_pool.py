@@ -0,0 +1,234 @@
+import asyncio
+import contextlib
+import io
+import logging
+import multiprocessing
+import sys
+import traceback
+from multiprocessing.connection import Connection
+
+from app.services.processes import ProcessResult, ProgressCallback
+
+logger = logging.getLogger(__name__)
+
+CLI_SCRIPT = "yandex-music-downloader"
+PING = "ping"
+HEALTH_CHECK_INTERVAL = 60
+PING_TIMEOUT = 5
+STDERR_LIMIT = 16 * 1024
+
+
+def _load_entry_point():
+    """Функция main() загрузчика - та же, что вызывает консольная команда."""
+    from importlib.metadata import entry_points
+    (entry,) = entry_points(group="console_scripts", name=CLI_SCRIPT)
+    return entry.load()
+
+
+def _reuse_account_status():
+    """
+    Загрузчик на каждый запуск создает Client(token).init(), а init -
+    это лишний запрос account_status. Внутри воркера ответ запоминается
+    для каждого токена.
+    """
+    from yandex_music import Client
+
+    original_init = Client.init
+    accounts = {}
+
+    def init(self, *args, **kwargs):
+        me = accounts.get(self.token)
+        if me is None:
+            original_init(self, *args, **kwargs)
+            accounts[self.token] = self.me
+        else:
+            self.me = me
+        return self
+
+    Client.init = init
+
+
+def _worker_main(conn: Connection):
+    """Цикл дочернего процесса: argv -> (код возврата, хвост stderr)."""
+    main = _load_entry_point()
+    _reuse_account_status()
+
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            return
+        if message is None:
+            return
+        if message == PING:
+            conn.send(PING)
+            continue
+
+        stderr = io.StringIO()
+        returncode = 0
+        sys.argv = [CLI_SCRIPT, *message]
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(stderr):
+            try:
+                main()
+            except SystemExit as e:
+                returncode = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+            except BaseException:
+                traceback.print_exc()
+                returncode = 1
+        conn.send((returncode, stderr.getvalue()[-STDERR_LIMIT:]))
+
+
+class _Worker:
+    def __init__(self, context: multiprocessing.context.BaseContext):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.jobs = 0
+
+    @property
+    def alive(self) -> bool:
+        return self.process.is_alive()
+
+    async def recv(self, timeout: float):
+        """Ждет ответа через loop.add_reader - без потоков."""
+        loop = asyncio.get_running_loop()
+        readable = loop.create_future()
+        fd = self.conn.fileno()
+        loop.add_reader(fd, lambda: readable.done() or readable.set_result(None))
+        try:
+            await asyncio.wait_for(readable, timeout)
+        finally:
+            loop.remove_reader(fd)
+        return self.conn.recv()
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except Exception:
+            pass
+        self.conn.close()
+
+    def kill(self):
+        self.process.kill()
+        self.conn.close()
+
+
+class CLIWorkerPool:
+    """
+    Пул долгоживущих процессов с уже импортированным загрузчиком.
+
+    Вместо запуска интерпретатора на каждую задачу аргументы
+    командной строки передаются по pipe в свободный воркер.
+    - size воркеров, задачи сверх этого ждут свободного;
+    - воркер перезапускается после max_jobs задач (утечки памяти);
+    - раз в минуту простаивающие воркеры проверяются ping'ом;
+    - зависший (по таймауту) или отмененный воркер убивается и заменяется.
+    Интерфейс как у ProcessRunner.run, поэтому Downloader
+    может использовать любой из них.
+    """
+
+    def __init__(self, size: int = 2, max_jobs: int = 50, timeout: float = 300):
+        self.size = max(1, size)
+        self.max_jobs = max(1, max_jobs)
+        self.timeout = timeout
+        self._context = multiprocessing.get_context("spawn")
+        self._idle: asyncio.Queue[_Worker] = asyncio.Queue()
+        self._health_task: asyncio.Task | None = None
+
+    def start(self):
+        for _ in range(self.size):
+            self._idle.put_nowait(_Worker(self._context))
+        self._health_task = asyncio.create_task(self._health_loop())
+        logger.info(f"CLI worker pool: {self.size} processes, recycled after {self.max_jobs} jobs.")
+
+    async def close(self):
+        if self._health_task:
+            self._health_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._health_task
+        while not self._idle.empty():
+            self._idle.get_nowait().stop()
+
+    def _replace(self, worker: _Worker, kill: bool = False):
+        worker.kill() if kill else worker.stop()
+        multiprocessing.active_children()  # забирает завершившиеся процессы
+        self._idle.put_nowait(_Worker(self._context))
+
+    async def _health_loop(self):
+        while True:
+            await asyncio.sleep(HEALTH_CHECK_INTERVAL)
+            try:
+                await self._check_idle()
+            except Exception as e:
+                logger.error(f"CLI pool health check failed: {e}")
+
+    async def _check_idle(self):
+        """
+        Пингует воркеры, простаивающие на момент проверки.
+        Они забираются из очереди разом (run() пока ждет остальных),
+        поэтому вернувшийся воркер не проверяется дважды.
+        """
+        workers = []
+        while True:
+            try:
+                workers.append(self._idle.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+
+        try:
+            while workers:
+                worker = workers.pop()
+                try:
+                    if not worker.alive:
+                        raise Exception("process exited")
+                    worker.conn.send(PING)
+                    if await worker.recv(PING_TIMEOUT) != PING:
+                        raise Exception("bad ping reply")
+                except asyncio.CancelledError:
+                    # Ответ на ping мог остаться в pipe - воркер не переиспользуем
+                    self._replace(worker, kill=True)
+                    raise
+                except Exception as e:
+                    logger.warning(f"CLI worker {worker.process.pid} is unhealthy ({e}), replacing.")
+                    self._replace(worker, kill=True)
+                else:
+                    self._idle.put_nowait(worker)
+        finally:
+            # Остановка пула посреди проверки - непроверенные возвращаются в очередь
+            for worker in workers:
+                self._idle.put_nowait(worker)
+
+    async def run(
+        self,
+        cmd: list[str],
+        timeout: float | None = None,
+        on_progress: ProgressCallback | None = None
+    ) -> ProcessResult:
+        """
+        Выполняет команду загрузчика в воркере (cmd[0] - имя программы).
+        Вывод воркера не читается построчно, поэтому on_progress не вызывается.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        worker = await self._idle.get()
+        if not worker.alive:
+            self._replace(worker, kill=True)
+            worker = await self._idle.get()
+
+        try:
+            worker.conn.send(cmd[1:])
+            returncode, stderr = await worker.recv(timeout)
+        except asyncio.TimeoutError:
+            self._replace(worker, kill=True)
+            raise Exception(f"{CLI_SCRIPT} не ответил за {timeout:g} с и был остановлен.")
+        except BaseException:
+            # Отмена или упавший воркер - его состояние неизвестно
+            self._replace(worker, kill=True)
+            raise
+
+        worker.jobs += 1
+        if worker.jobs >= self.max_jobs:
+            self._replace(worker)
+        else:
+            self._idle.put_nowait(worker)
+        return ProcessResult(returncode=returncode, stderr=stderr)
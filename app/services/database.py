@@ -1,43 +1,77 @@
 import aiosqlite
+import asyncio
 import logging
+import time
+from collections import defaultdict
 from datetime import datetime
 
+from app.services.cache import TTLCache
+from app.services.migrations import apply_pragmas, migrate
+
 logger = logging.getLogger(__name__)
 
 DB_FILE = "bot_data.db" 
 
+# Виды файлов в кэше file_id Telegram
+FILE_AUDIO = "audio"
+FILE_COVER = "cover"
+# Обложка больше лимита фото: отправлена документом,
+# и переотправлять ее можно только как документ
+FILE_COVER_DOCUMENT = "cover_document"
+FILE_LRC = "lrc"
+
+# Счетчики статистики (колонки таблицы user_stats)
+COUNTER_COLUMNS = ("tracks", "lyrics", "covers")
+
+# Как часто удалять устаревшие записи "текста нет" (сек)
+LYRICS_CLEANUP_INTERVAL = 3600
+
 class Database:
-    def __init__(self, db_path: str):
+    def __init__(
+        self,
+        db_path: str,
+        lyrics_negative_ttl: int = 86400,
+        stats_flush_interval: float = 5,
+        stats_flush_threshold: int = 500,
+        settings_cache_size: int = 10000,
+        settings_cache_ttl: float = 30
+    ):
         self.db_path = db_path
         self.connection = None
+        # Сколько секунд помним, что у трека НЕТ текста
+        self.lyrics_negative_ttl = lyrics_negative_ttl
+
+        # Счетчики копятся в памяти и пишутся в БД пачкой:
+        # раз в stats_flush_interval секунд или при stats_flush_threshold изменений.
+        self.stats_flush_interval = stats_flush_interval
+        self.stats_flush_threshold = stats_flush_threshold
+        self._pending_counters: dict[int, dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self._pending_count = 0
+        self._flush_lock = asyncio.Lock()
+        self._flush_task: asyncio.Task | None = None
+        self._threshold_flush: asyncio.Task | None = None
+        self._cleanup_task: asyncio.Task | None = None
+        # Отдельное соединение для фоновых записей (сброс счетчиков, чистка):
+        # его транзакция (и откат при ошибке) не задевает незакоммиченные
+        # записи других корутин в общем соединении
+        self._stats_connection = None
+
+        # Настройки юзеров (quality, send_lrc) в памяти.
+        # Запись идет сразу и в БД, и в кэш. Время жизни короткое:
+        # настройку могли поменять через другую реплику бота с той же БД.
+        self._settings_cache = TTLCache(maxsize=settings_cache_size, ttl=settings_cache_ttl)
 
     async def init_db(self):
-        """Инициализирует базу данных и создает таблицы."""
+        """Открывает базу данных и применяет миграции схемы."""
         try:
             self.connection = await aiosqlite.connect(self.db_path)
-            await self.connection.execute("""
-                CREATE TABLE IF NOT EXISTS users (
-                    user_id INTEGER PRIMARY KEY,
-                    first_seen TEXT NOT NULL,
-                    tracks_downloaded INTEGER DEFAULT 0,
-                    lyrics_downloaded INTEGER DEFAULT 0,
-                    covers_downloaded INTEGER DEFAULT 0,
-                    
-                    quality INTEGER DEFAULT 1,
-                    send_lrc INTEGER DEFAULT 1 
-                )
-            """)
-            try:
-                await self.connection.execute("ALTER TABLE users ADD COLUMN quality INTEGER DEFAULT 1")
-            except aiosqlite.OperationalError:
-                pass 
-            try:
-                await self.connection.execute("ALTER TABLE users ADD COLUMN send_lrc INTEGER DEFAULT 1")
-            except aiosqlite.OperationalError:
-                pass 
-                
-            await self.connection.commit()
-            logger.info("Database initialized successfully.")
+            await apply_pragmas(self.connection)
+            version = await migrate(self.connection)
+            self._stats_connection = await aiosqlite.connect(self.db_path)
+            await apply_pragmas(self._stats_connection)
+            self._flush_task = asyncio.create_task(self._flush_loop())
+            self._cleanup_task = asyncio.create_task(self._cleanup_loop())
+            logger.info(f"Database initialized successfully (schema v{version}).")
         except Exception as e:
             logger.critical(f"Failed to initialize database: {e}")
             raise
@@ -55,37 +89,159 @@ class Database:
         if not user:
             now = datetime.now().isoformat()
             await self.connection.execute(
-                "INSERT INTO users (user_id, first_seen) VALUES (?, ?)", (user_id, now)
+                "INSERT OR IGNORE INTO users (user_id, first_seen) VALUES (?, ?)", (user_id, now)
+            )
+            await self.connection.execute(
+                "INSERT OR IGNORE INTO user_stats (user_id) VALUES (?)", (user_id,)
+            )
+            await self.connection.execute(
+                "INSERT OR IGNORE INTO user_settings (user_id) VALUES (?)", (user_id,)
             )
             await self.connection.commit()
             logger.info(f"New user created: {user_id}")
     
     async def _increment_counter(self, user_id: int, column: str):
-        """Внутренняя функция для увеличения счетчика."""
-        await self.get_or_create_user(user_id) 
-        await self.connection.execute(
-            f"UPDATE users SET {column} = {column} + 1 WHERE user_id = ?", (user_id,)
-        )
-        await self.connection.commit()
+        """
+        Внутренняя функция для увеличения счетчика.
+        Ничего не пишет на диск: изменение попадает в БД
+        при следующем сбросе (flush_counters).
+        """
+        self._pending_counters[user_id][column] += 1
+        self._pending_count += 1
+        if self._pending_count >= self.stats_flush_threshold and (
+            self._threshold_flush is None or self._threshold_flush.done()
+        ):
+            self._threshold_flush = asyncio.create_task(self.flush_counters())
+            self._threshold_flush.add_done_callback(self._log_flush_error)
+
+    @staticmethod
+    def _log_flush_error(task: asyncio.Task):
+        if not task.cancelled() and task.exception():
+            logger.error(f"Failed to flush stats counters: {task.exception()}")
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.stats_flush_interval)
+            try:
+                await self.flush_counters()
+            except Exception as e:
+                logger.error(f"Failed to flush stats counters: {e}")
+
+    async def _cleanup_loop(self):
+        while True:
+            try:
+                await self.delete_expired_lyrics()
+            except Exception as e:
+                logger.error(f"Failed to clean up lyrics cache: {e}")
+            await asyncio.sleep(LYRICS_CLEANUP_INTERVAL)
+
+    async def delete_expired_lyrics(self) -> int:
+        """
+        Удаляет записи "текста нет" старше lyrics_negative_ttl
+        (по индексу idx_lyrics_fetched_at). Возвращает число удаленных.
+        Идет через отдельное соединение, как и сброс счетчиков.
+        """
+        async with self._flush_lock:
+            connection = self._stats_connection
+            try:
+                cursor = await connection.execute(
+                    "DELETE FROM lyrics WHERE fetched_at < ? "
+                    "AND COALESCE(lrc, '') = '' AND COALESCE(plain, '') = ''",
+                    (time.time() - self.lyrics_negative_ttl,)
+                )
+                await connection.commit()
+            except Exception:
+                await connection.rollback()
+                raise
+        if cursor.rowcount:
+            logger.info(f"Removed {cursor.rowcount} expired 'no lyrics' entries.")
+        return cursor.rowcount
+
+    async def flush_counters(self):
+        """Записывает накопленные счетчики в БД одной транзакцией."""
+        async with self._flush_lock:
+            if not self._pending_counters:
+                return
+            pending = self._pending_counters
+            self._pending_counters = defaultdict(lambda: defaultdict(int))
+            self._pending_count = 0
+
+            now = datetime.now().isoformat()
+            connection = self._stats_connection
+            try:
+                await connection.executemany(
+                    "INSERT OR IGNORE INTO users (user_id, first_seen) VALUES (?, ?)",
+                    [(user_id, now) for user_id in pending]
+                )
+                await connection.executemany(
+                    "INSERT OR IGNORE INTO user_settings (user_id) VALUES (?)",
+                    [(user_id,) for user_id in pending]
+                )
+                await connection.executemany(
+                    "INSERT INTO user_stats (user_id, tracks, lyrics, covers) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (user_id) DO UPDATE SET "
+                    "tracks = tracks + excluded.tracks, "
+                    "lyrics = lyrics + excluded.lyrics, "
+                    "covers = covers + excluded.covers",
+                    [
+                        (user_id, deltas["tracks"], deltas["lyrics"], deltas["covers"])
+                        for user_id, deltas in pending.items()
+                    ]
+                )
+                await connection.commit()
+            except Exception:
+                # Не теряем счетчики: вернем их в очередь на следующий сброс
+                await connection.rollback()
+                for user_id, deltas in pending.items():
+                    for column, delta in deltas.items():
+                        self._pending_counters[user_id][column] += delta
+                        self._pending_count += delta
+                raise
+
+    async def close(self):
+        """Сбрасывает счетчики и закрывает соединение (при остановке бота)."""
+        for task in (self._flush_task, self._cleanup_task):
+            if task:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        if self._threshold_flush:
+            await asyncio.gather(self._threshold_flush, return_exceptions=True)
+        try:
+            await self.flush_counters()
+        finally:
+            await self._stats_connection.close()
+            await self.connection.close()
 
     async def increment_track_count(self, user_id: int):
-        await self._increment_counter(user_id, "tracks_downloaded")
+        await self._increment_counter(user_id, "tracks")
 
     async def increment_lyrics_count(self, user_id: int):
-        await self._increment_counter(user_id, "lyrics_downloaded")
+        await self._increment_counter(user_id, "lyrics")
     
     async def increment_cover_count(self, user_id: int):
-        await self._increment_counter(user_id, "covers_downloaded")
+        await self._increment_counter(user_id, "covers")
 
     async def get_user_stats_and_settings(self, user_id: int) -> dict | None:
         """Получает ВСЮ информацию о пользователе (статистику И настройки)."""
         await self.get_or_create_user(user_id)
         async with self.connection.execute(
-            "SELECT * FROM users WHERE user_id = ?", (user_id,)
+            """
+            SELECT u.user_id, u.first_seen,
+                   COALESCE(st.tracks, 0), COALESCE(st.lyrics, 0), COALESCE(st.covers, 0),
+                   COALESCE(se.quality, 1), COALESCE(se.send_lrc, 1)
+            FROM users u
+            LEFT JOIN user_stats st ON st.user_id = u.user_id
+            LEFT JOIN user_settings se ON se.user_id = u.user_id
+            WHERE u.user_id = ?
+            """,
+            (user_id,)
         ) as cursor:
             row = await cursor.fetchone()
             if row:
-                return {
+                stats = {
                     "user_id": row[0],
                     "first_seen": row[1],
                     "tracks": row[2],
@@ -94,26 +250,154 @@ class Database:
                     "quality": row[5],
                     "send_lrc": bool(row[6]) 
                 }
+                # Добавляем то, что еще не сброшено на диск
+                pending = self._pending_counters.get(user_id, {})
+                for column in COUNTER_COLUMNS:
+                    stats[column] += pending.get(column, 0)
+                self._settings_cache.set(
+                    user_id, {"quality": stats["quality"], "send_lrc": stats["send_lrc"]}
+                )
+                return stats
         return None
+
+    async def get_user_settings(self, user_id: int) -> dict:
+        """
+        Только настройки юзера (quality, send_lrc).
+        Для "горячих" юзеров отвечает из памяти, без запроса к БД.
+        """
+        settings = self._settings_cache.get(user_id)
+        if settings is None:
+            await self.get_or_create_user(user_id)
+            async with self.connection.execute(
+                "SELECT quality, send_lrc FROM user_settings WHERE user_id = ?", (user_id,)
+            ) as cursor:
+                row = await cursor.fetchone()
+            settings = {
+                "quality": row[0] if row else 1,
+                "send_lrc": bool(row[1]) if row else True
+            }
+            self._settings_cache.set(user_id, settings)
+        return dict(settings)
         
     
     async def set_user_quality(self, user_id: int, quality_code: int):
         await self.get_or_create_user(user_id)
         await self.connection.execute(
-            "UPDATE users SET quality = ? WHERE user_id = ?", (quality_code, user_id)
+            "UPDATE user_settings SET quality = ? WHERE user_id = ?", (quality_code, user_id)
         )
         await self.connection.commit()
 
+        settings = self._settings_cache.get(user_id)
+        if settings is not None:
+            settings["quality"] = quality_code
+
     async def toggle_user_lrc(self, user_id: int) -> bool:
         """Переключает LRC и возвращает НОВОЕ значение."""
         await self.get_or_create_user(user_id)
         await self.connection.execute(
-            "UPDATE users SET send_lrc = (1 - send_lrc) WHERE user_id = ?", (user_id,)
+            "UPDATE user_settings SET send_lrc = (1 - send_lrc) WHERE user_id = ?", (user_id,)
         )
         await self.connection.commit()
         
         async with self.connection.execute(
-            "SELECT send_lrc FROM users WHERE user_id = ?", (user_id,)
+            "SELECT send_lrc FROM user_settings WHERE user_id = ?", (user_id,)
         ) as cursor:
             new_val = await cursor.fetchone()
-            return bool(new_val[0])
\ No newline at end of file
+            send_lrc = bool(new_val[0])
+
+        settings = self._settings_cache.get(user_id)
+        if settings is not None:
+            settings["send_lrc"] = send_lrc
+        return send_lrc
+
+    async def get_file_id(self, track_id: str, kind: str, quality: int = 0) -> str | None:
+        """Возвращает file_id ранее отправленного файла (или None)."""
+        async with self.connection.execute(
+            "SELECT file_id FROM file_cache WHERE track_id = ? AND kind = ? AND quality = ?",
+            (str(track_id), kind, quality)
+        ) as cursor:
+            row = await cursor.fetchone()
+        return row[0] if row else None
+
+    async def get_file_ids(self, track_ids: list[str], kind: str, quality: int = 0) -> dict[str, str]:
+        """Пакетно возвращает {track_id: file_id} для уже отправленных файлов."""
+        track_ids = [str(track_id) for track_id in track_ids]
+        if not track_ids:
+            return {}
+        placeholders = ", ".join("?" for _ in track_ids)
+        async with self.connection.execute(
+            f"SELECT track_id, file_id FROM file_cache "
+            f"WHERE kind = ? AND quality = ? AND track_id IN ({placeholders})",
+            (kind, quality, *track_ids)
+        ) as cursor:
+            rows = await cursor.fetchall()
+        return {track_id: file_id for track_id, file_id in rows}
+
+    async def save_file_id(self, track_id: str, kind: str, file_id: str | None, quality: int = 0):
+        """Запоминает file_id отправленного файла."""
+        if not file_id:
+            return
+        now = datetime.now().isoformat()
+        await self.connection.execute(
+            "INSERT OR REPLACE INTO file_cache (track_id, kind, quality, file_id, created_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (str(track_id), kind, quality, file_id, now)
+        )
+        await self.connection.commit()
+
+    async def delete_file_id(self, track_id: str, kind: str, quality: int = 0):
+        """Удаляет file_id, который Telegram больше не принимает."""
+        await self.connection.execute(
+            "DELETE FROM file_cache WHERE track_id = ? AND kind = ? AND quality = ?",
+            (str(track_id), kind, quality)
+        )
+        await self.connection.commit()
+
+    async def get_lyrics(self, track_id: str) -> tuple[str | None, str | None] | None:
+        """
+        Возвращает (lrc, plain) из кэша или None, если в кэше ничего нет.
+        (None, None) - текста у трека нет (и это еще актуально).
+        """
+        async with self.connection.execute(
+            "SELECT lrc, plain, fetched_at FROM lyrics WHERE track_id = ?", (str(track_id),)
+        ) as cursor:
+            row = await cursor.fetchone()
+        if not row:
+            return None
+
+        lrc, plain, fetched_at = row
+        if not lrc and not plain and time.time() - fetched_at > self.lyrics_negative_ttl:
+            return None
+        return lrc, plain
+
+    async def save_lyrics(self, track_id: str, lrc: str | None, plain: str | None):
+        """Сохраняет текст (или факт его отсутствия) в кэш."""
+        await self.connection.execute(
+            "INSERT OR REPLACE INTO lyrics (track_id, lrc, plain, fetched_at) VALUES (?, ?, ?, ?)",
+            (str(track_id), lrc, plain, time.time())
+        )
+        await self.connection.commit()
+
+    async def get_tracks(self, track_ids: list[str], max_age: float | None = None) -> dict[str, str]:
+        """Пакетно возвращает {track_id: data} из кэша треков (не старше max_age секунд)."""
+        track_ids = [str(track_id) for track_id in track_ids]
+        if not track_ids:
+            return {}
+        min_updated = time.time() - max_age if max_age is not None else 0
+        placeholders = ", ".join("?" for _ in track_ids)
+        async with self.connection.execute(
+            f"SELECT track_id, data FROM tracks "
+            f"WHERE updated_at >= ? AND track_id IN ({placeholders})",
+            (min_updated, *track_ids)
+        ) as cursor:
+            rows = await cursor.fetchall()
+        return {track_id: data for track_id, data in rows}
+
+    async def save_tracks(self, tracks: dict[str, str]):
+        """Сохраняет {track_id: data} в кэш треков одной транзакцией."""
+        now = time.time()
+        await self.connection.executemany(
+            "INSERT OR REPLACE INTO tracks (track_id, data, updated_at) VALUES (?, ?, ?)",
+            [(str(track_id), data, now) for track_id, data in tracks.items()]
+        )
+        await self.connection.commit()
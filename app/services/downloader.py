@@ -0,0 +1,446 @@
+import asyncio
+import logging
+import os
+import re
+from dataclasses import dataclass
+from typing import Awaitable, Callable
+
+import aiohttp
+from mutagen.id3 import ID3, ID3NoHeaderError, TIT2, TPE1, TALB, APIC
+
+from app.services.audio_cache import AudioCache
+from app.services.cli_pool import CLIWorkerPool
+from app.services.images import CoverProcessor
+from app.services.metadata import TrackTags, read_tags
+from app.services.processes import ProcessRunner, ProgressCallback
+from app.services.tracks import TrackInfo
+from app.services.yandex_api import YandexClientPool
+from app.services.yandex import (
+    download_track_via_cli, get_cover_via_cli, get_lyrics_via_api, get_lyrics_via_cli,
+    create_job_dir, remove_job_dir
+)
+
+logger = logging.getLogger(__name__)
+
+ENGINE_NATIVE = "native"
+ENGINE_CLI = "cli"
+
+# Целевой битрейт MP3 для кодов качества.
+# Лучшее качество (2, FLAC) через download-info недоступно,
+# поэтому его всегда качает yandex-music-downloader.
+NATIVE_BITRATES = {
+    0: 128,
+    1: 192,
+}
+
+CHUNK_SIZE = 64 * 1024
+# Запись на диск идет в потоке пачками по столько байт
+WRITE_BUFFER_SIZE = 1024 * 1024
+EMBED_COVER_SIZE = "400x400"
+# Telegram: миниатюра JPEG не больше 320x320 и 200 КБ.
+# Яндекс отдает обложку нужного размера сам - декодировать не нужно.
+THUMBNAIL_SIZE = "200x200"
+
+
+@dataclass
+class AudioFile:
+    """Скачанный трек и все, что нужно для отправки в Telegram."""
+    path: str
+    title: str | None = None
+    performer: str | None = None
+    duration: int | None = None
+    thumbnail: bytes | None = None
+
+
+def cover_url(track: TrackInfo, resolution: str) -> str | None:
+    """
+    Ссылка на обложку трека (или его альбома) в нужном разрешении.
+    resolution: "orig" или "<ширина>x<высота>", например "1000x1000".
+    """
+    if not track.cover_uri:
+        return None
+    return "https://" + track.cover_uri.replace("%%", resolution)
+
+
+def _cover_key(track: TrackInfo | None) -> str | None:
+    """Ключ кэша миниатюр: одна обложка на весь альбом."""
+    if track is None:
+        return None
+    return track.cover_uri or (f"album:{track.album_id}" if track.album_id else None)
+
+
+async def _report_progress(on_progress: ProgressCallback, percent: float):
+    """Ошибка в отображении прогресса не должна ломать загрузку."""
+    try:
+        await on_progress(percent)
+    except Exception as e:
+        logger.debug(f"Progress callback failed: {e}")
+
+
+async def _read_cover(tags: TrackTags) -> bytes | None:
+    """
+    Байты встроенной обложки или None. Без обложки трек все равно
+    отправляется, поэтому ошибка чтения (файл вытеснен из кэша,
+    битый тег) не должна ломать загрузку.
+    """
+    if not tags.has_cover:
+        return None
+    try:
+        return await asyncio.to_thread(tags.read_cover)
+    except Exception as e:
+        logger.warning(f"Cover reading failed for {tags.path}: {e}")
+        return None
+
+
+def _safe_filename(name: str) -> str:
+    """Убирает символы, недопустимые в имени файла."""
+    name = re.sub(r'[\\/:*?"<>|]', "_", name).strip(" .")
+    return name[:150] or "track"
+
+
+def _pick_download_info(infos: list, target_bitrate: int):
+    """
+    Выбирает MP3 с наибольшим битрейтом, не превышающим целевой
+    (или самый легкий, если все тяжелее).
+    """
+    mp3 = sorted(
+        (info for info in infos if info.codec == "mp3"),
+        key=lambda info: info.bitrate_in_kbps
+    )
+    if not mp3:
+        return None
+    suitable = [info for info in mp3 if info.bitrate_in_kbps <= target_bitrate]
+    return suitable[-1] if suitable else mp3[0]
+
+
+def _embed_tags(path: str, track: TrackInfo, cover: bytes | None):
+    """Записывает ID3-теги и обложку в MP3 (в отдельном потоке)."""
+    try:
+        tags = ID3(path)
+    except ID3NoHeaderError:
+        tags = ID3()
+
+    tags.add(TIT2(encoding=3, text=track.title or ""))
+    tags.add(TPE1(encoding=3, text=track.performer))
+    if track.album_title:
+        tags.add(TALB(encoding=3, text=track.album_title))
+    if cover:
+        tags.add(APIC(encoding=3, mime="image/jpeg", type=3, desc="Cover", data=cover))
+    tags.save(path)
+
+
+class NativeDownloader:
+    """
+    Загрузчик внутри процесса бота: берет ссылку на файл через уже
+    авторизованные клиенты yandex_music и качает его напрямую
+    через общий пул HTTP-соединений, без запуска внешней программы.
+    """
+
+    def __init__(self, yandex: YandexClientPool, max_connections: int = 32):
+        self.yandex = yandex
+        self.max_connections = max_connections
+        self._session: aiohttp.ClientSession | None = None
+
+    def supports(self, quality_code: int) -> bool:
+        return quality_code in NATIVE_BITRATES
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """Общая HTTP-сессия (создается при первом обращении)."""
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=self.max_connections,
+                    ttl_dns_cache=300
+                ),
+                timeout=aiohttp.ClientTimeout(total=None, sock_connect=15, sock_read=60)
+            )
+        return self._session
+
+    async def close(self):
+        if self._session and not self._session.closed:
+            await self._session.close()
+
+    async def _fetch_bytes(self, url: str) -> bytes:
+        async with self.session.get(url) as response:
+            response.raise_for_status()
+            return await response.read()
+
+    async def _stream_to_file(
+        self, url: str, path: str, on_progress: ProgressCallback | None = None
+    ):
+        async with self.session.get(url) as response:
+            response.raise_for_status()
+            total = response.content_length
+            received = 0
+            buffer = bytearray()
+            f = await asyncio.to_thread(open, path, "wb")
+            try:
+                async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                    buffer += chunk
+                    received += len(chunk)
+                    if len(buffer) >= WRITE_BUFFER_SIZE:
+                        await asyncio.to_thread(f.write, buffer)
+                        buffer.clear()
+                    if on_progress and total:
+                        await _report_progress(on_progress, received * 100 / total)
+                if buffer:
+                    await asyncio.to_thread(f.write, buffer)
+            finally:
+                await asyncio.to_thread(f.close)
+
+    async def fetch_cover(self, track: TrackInfo, resolution: str) -> bytes | None:
+        """Скачивает только картинку обложки, без аудио."""
+        url = cover_url(track, resolution)
+        if not url:
+            return None
+        return await self._fetch_bytes(url)
+
+    async def _fetch_embed_cover(self, track: TrackInfo) -> bytes | None:
+        url = cover_url(track, EMBED_COVER_SIZE)
+        if not url:
+            return None
+        try:
+            return await self._fetch_bytes(url)
+        except Exception as e:
+            logger.warning(f"Failed to fetch cover for embedding: {e}")
+            return None
+
+    async def download_track(
+        self,
+        track_id: str,
+        quality_code: int,
+        job_dir: str,
+        track: TrackInfo | None = None,
+        on_progress: ProgressCallback | None = None
+    ) -> str:
+        """
+        Скачивает трек в job_dir и возвращает путь к файлу.
+        """
+        if track is None:
+            track = TrackInfo.from_track((await self.yandex.client.tracks(track_id))[0])
+
+        infos = await self.yandex.download_client.tracks_download_info(track_id)
+        info = _pick_download_info(infos, NATIVE_BITRATES[quality_code])
+        if info is None:
+            raise Exception("Для трека нет доступных MP3-файлов.")
+
+        # Ссылка подписывается тем же клиентом (токеном), что выдал download_info
+        direct_link, cover = await asyncio.gather(
+            info.get_direct_link_async(),
+            self._fetch_embed_cover(track)
+        )
+
+        path = os.path.join(
+            job_dir, _safe_filename(f"{track.performer or 'Unknown'} - {track.title}") + ".mp3"
+        )
+
+        try:
+            await self._stream_to_file(direct_link, path, on_progress)
+            await asyncio.to_thread(_embed_tags, path, track, cover)
+        except BaseException:
+            if os.path.exists(path):
+                os.remove(path)
+            raise
+
+        return path
+
+
+class Downloader:
+    """
+    Точка входа для загрузки треков и обложек.
+    Использует встроенный загрузчик (если выбран engine=native),
+    а yandex-music-downloader - для FLAC и как запасной вариант при ошибке.
+    Перед любой загрузкой проверяет локальный кэш треков.
+    """
+
+    def __init__(
+        self,
+        token: str,
+        native: NativeDownloader,
+        engine: str = ENGINE_NATIVE,
+        cover_resolution: str = "orig",
+        cache: AudioCache | None = None,
+        runner: ProcessRunner | CLIWorkerPool | None = None,
+        covers: CoverProcessor | None = None
+    ):
+        self.token = token
+        self.native = native
+        self.engine = engine
+        self.cover_resolution = cover_resolution
+        self.cache = cache
+        self.runner = runner or ProcessRunner()
+        self.covers = covers or CoverProcessor()
+
+    async def close(self):
+        await self.native.close()
+        await self.runner.close()
+        self.covers.close()
+
+    async def download_track(
+        self,
+        track_id: str,
+        quality_code: int,
+        job_dir: str,
+        track: TrackInfo | None = None,
+        on_progress: ProgressCallback | None = None
+    ) -> str:
+        """
+        on_progress(проценты) вызывается по ходу скачивания
+        (у CLI - если он печатает проценты).
+        """
+        name = _safe_filename(f"{track.performer or 'Unknown'} - {track.title}") if track else track_id
+        if self.cache:
+            path = await self.cache.checkout(track_id, quality_code, os.path.join(job_dir, name))
+            if path:
+                return path
+
+        path = None
+        if self.engine == ENGINE_NATIVE and self.native.supports(quality_code):
+            try:
+                path = await self.native.download_track(
+                    track_id, quality_code, job_dir, track, on_progress
+                )
+            except Exception as e:
+                logger.warning(f"Native download failed for {track_id}, falling back to CLI: {e}")
+
+        if path is None:
+            path = await download_track_via_cli(
+                self.token, track_id, quality_code, job_dir, self.runner, on_progress,
+                filename=name
+            )
+
+        if self.cache:
+            await self.cache.store(track_id, quality_code, path)
+        return path
+
+    async def download_audio(
+        self,
+        track_id: str,
+        quality_code: int,
+        job_dir: str,
+        track: TrackInfo | None = None,
+        on_progress: ProgressCallback | None = None
+    ) -> AudioFile:
+        """
+        Скачивает трек и готовит теги для отправки.
+        Миниатюра качается параллельно с аудио; название, исполнитель
+        и длительность берутся из TrackInfo, а файл разбирается,
+        только если чего-то не хватает.
+        """
+        thumb_task = asyncio.create_task(self.get_thumbnail(track)) if track else None
+        try:
+            path = await self.download_track(track_id, quality_code, job_dir, track, on_progress)
+            audio = AudioFile(path=path, thumbnail=await thumb_task if thumb_task else None)
+        finally:
+            if thumb_task and not thumb_task.done():
+                thumb_task.cancel()
+
+        if track:
+            audio.title = track.title
+            audio.performer = track.performer
+            audio.duration = track.duration_ms // 1000 if track.duration_ms else None
+
+        if not (audio.title and audio.performer and audio.duration and audio.thumbnail):
+            tags = await asyncio.to_thread(read_tags, path)
+            audio.title = audio.title or tags.title
+            audio.performer = audio.performer or tags.performer
+            audio.duration = audio.duration or tags.duration
+            if not audio.thumbnail:
+                audio.thumbnail = await self._thumbnail_from_tags(tags, track)
+
+        return audio
+
+    async def get_cover(self, track_id: str, track: TrackInfo | None = None) -> bytes | None:
+        """
+        Возвращает картинку обложки.
+        Если информация о треке есть - берет ее прямо по ссылке
+        (никакого аудио). Иначе - старый путь через yandex-music-downloader.
+        """
+        if track is not None:
+            try:
+                return await self.native.fetch_cover(track, self.cover_resolution)
+            except Exception as e:
+                logger.warning(f"Direct cover fetch failed for {track_id}, falling back to CLI: {e}")
+
+        # Трек уже лежит в кэше - обложка есть в его тегах
+        cached = self.cache.has_any(track_id) if self.cache else None
+        if cached:
+            cover = await self._cover_from_file(cached, track)
+            if cover:
+                return cover
+
+        job_dir = create_job_dir()
+        try:
+            filepath = await get_cover_via_cli(self.token, track_id, job_dir, self.runner)
+            return await self._cover_from_file(filepath, track)
+        finally:
+            remove_job_dir(job_dir)
+
+    async def _cover_from_file(self, path: str, track: TrackInfo | None) -> bytes | None:
+        """
+        Полная обложка из тегов файла. Миниатюра делается
+        тем же проходом и остается в кэше для треков альбома.
+        """
+        tags = await asyncio.to_thread(read_tags, path)
+        cover = await _read_cover(tags)
+        if not cover:
+            return None
+        images = await self.covers.process(_cover_key(track), cover)
+        return images[1] if images else None
+
+    async def _thumbnail_from_tags(self, tags: TrackTags, track: TrackInfo | None) -> bytes | None:
+        """
+        Миниатюра из встроенной обложки. Картинка читается из файла,
+        только если миниатюры этого альбома еще нет в кэше.
+        """
+        key = _cover_key(track)
+        thumb = self.covers.cached_thumbnail(key)
+        if thumb or not tags.has_cover:
+            return thumb
+        cover = await _read_cover(tags)
+        return await self.covers.thumbnail(key, cover) if cover else None
+
+    async def get_thumbnail(self, track: TrackInfo) -> bytes | None:
+        """
+        Миниатюра для Telegram: из кэша по обложке альбома
+        или прямо по ссылке (или None).
+        """
+        key = _cover_key(track)
+        thumb = self.covers.cached_thumbnail(key)
+        if thumb:
+            return thumb
+        try:
+            thumb = await self.native.fetch_cover(track, THUMBNAIL_SIZE)
+        except Exception as e:
+            logger.warning(f"Failed to fetch thumbnail for {track.id}: {e}")
+            return None
+        self.covers.remember_thumbnail(key, thumb)
+        return thumb
+
+    async def get_lyrics(
+        self,
+        track_id: str,
+        track: TrackInfo | None = None,
+        cli_gate: Callable[[Callable[[], Awaitable]], Awaitable] | None = None
+    ) -> (str, str):
+        """
+        Возвращает (lrc_text, plain_text) напрямую через API,
+        а при ошибке API - через yandex-music-downloader.
+        cli_gate(func) - как запустить запасной путь через CLI
+        (например, через очередь задач); по умолчанию - сразу.
+        """
+        try:
+            return await get_lyrics_via_api(
+                self.native.yandex,
+                track_id,
+                has_sync=track.has_sync_lyrics if track else None,
+                has_text=track.has_text_lyrics if track else None
+            )
+        except Exception as e:
+            logger.warning(f"Lyrics API failed for {track_id}, falling back to CLI: {e}")
+
+        def via_cli():
+            return get_lyrics_via_cli(self.token, track_id, self.runner)
+
+        return await (cli_gate(via_cli) if cli_gate else via_cli())
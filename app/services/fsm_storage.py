@@ -0,0 +1,105 @@
+import json
+import logging
+from typing import Any
+
+import aiosqlite
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from app.services.migrations import apply_pragmas
+
+logger = logging.getLogger(__name__)
+
+STORAGE_MEMORY = "memory"
+STORAGE_SQLITE = "sqlite"
+STORAGE_REDIS = "redis"
+
+
+def _key(key: StorageKey) -> str:
+    return ":".join(str(part) for part in (
+        key.bot_id,
+        key.chat_id,
+        key.user_id,
+        key.thread_id or "",
+        getattr(key, "business_connection_id", None) or "",
+        key.destiny,
+    ))
+
+
+class SQLiteStorage(BaseStorage):
+    """
+    FSM-хранилище в той же SQLite, что и остальные данные бота.
+    Состояние ("жду ссылку для текста" и т.п.) переживает перезапуск,
+    а в WAL-режиме его видят все процессы на одной машине.
+    Таблица fsm_states создается миграцией.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.connection: aiosqlite.Connection | None = None
+
+    async def open(self):
+        self.connection = await aiosqlite.connect(self.db_path)
+        await apply_pragmas(self.connection)
+
+    async def close(self):
+        if self.connection:
+            await self.connection.close()
+            self.connection = None
+
+    async def set_state(self, key: StorageKey, state: StateType = None):
+        value = state.state if isinstance(state, State) else state
+        await self.connection.execute(
+            """
+            INSERT INTO fsm_states (key, state) VALUES (?, ?)
+            ON CONFLICT(key) DO UPDATE SET state = excluded.state
+            """,
+            (_key(key), value)
+        )
+        await self.connection.commit()
+
+    async def get_state(self, key: StorageKey) -> str | None:
+        async with self.connection.execute(
+            "SELECT state FROM fsm_states WHERE key = ?", (_key(key),)
+        ) as cursor:
+            row = await cursor.fetchone()
+        return row[0] if row else None
+
+    async def set_data(self, key: StorageKey, data: dict[str, Any]):
+        await self.connection.execute(
+            """
+            INSERT INTO fsm_states (key, data) VALUES (?, ?)
+            ON CONFLICT(key) DO UPDATE SET data = excluded.data
+            """,
+            (_key(key), json.dumps(data, ensure_ascii=False))
+        )
+        await self.connection.commit()
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        async with self.connection.execute(
+            "SELECT data FROM fsm_states WHERE key = ?", (_key(key),)
+        ) as cursor:
+            row = await cursor.fetchone()
+        return json.loads(row[0]) if row else {}
+
+
+async def create_fsm_storage(kind: str, db_path: str, redis_url: str) -> BaseStorage:
+    """
+    memory - в памяти процесса (теряется при перезапуске),
+    sqlite - в файле БД (один сервер, несколько процессов),
+    redis  - общее для нескольких серверов (нужен пакет redis).
+    """
+    if kind == STORAGE_SQLITE:
+        storage = SQLiteStorage(db_path)
+        await storage.open()
+        return storage
+
+    if kind == STORAGE_REDIS:
+        try:
+            from aiogram.fsm.storage.redis import RedisStorage
+        except ImportError as e:
+            raise RuntimeError("FSM_STORAGE=redis requires the 'redis' package") from e
+        return RedisStorage.from_url(redis_url)
+
+    return MemoryStorage()
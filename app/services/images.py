@@ -0,0 +1,118 @@
+import asyncio
+import io
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image
+
+from app.services.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Telegram: миниатюра аудио - JPEG не больше 320x320 и 200 КБ
+THUMBNAIL_SIZE = 320
+THUMBNAIL_QUALITY = 85
+
+# Форматы, которые Telegram принимает как фото без перекодирования
+_PHOTO_FORMATS = ("JPEG", "PNG")
+
+
+def _encode_jpeg(img: Image.Image, quality: int = THUMBNAIL_QUALITY) -> bytes:
+    out = io.BytesIO()
+    img.convert("RGB").save(out, format="JPEG", quality=quality)
+    return out.getvalue()
+
+
+def make_cover_images(data: bytes, thumb_size: int = THUMBNAIL_SIZE) -> tuple[bytes, bytes]:
+    """
+    Из исходной картинки обложки делает (миниатюра, полная обложка).
+    Выполняется в процессе пула.
+
+    JPEG декодируется сразу в уменьшенном масштабе (draft: 1/2 - 1/8
+    средствами libjpeg), поэтому "original"-обложка 3000x3000 не
+    разворачивается в память целиком. Полная обложка - исходные
+    байты без перекодирования, если Telegram примет их как фото.
+    """
+    with Image.open(io.BytesIO(data)) as img:
+        source_format = img.format
+        img.draft("RGB", (thumb_size, thumb_size))
+        img.thumbnail((thumb_size, thumb_size))
+        thumb = _encode_jpeg(img)
+
+    if source_format in _PHOTO_FORMATS:
+        return thumb, data
+
+    with Image.open(io.BytesIO(data)) as img:
+        return thumb, _encode_jpeg(img, quality=95)
+
+
+def make_thumbnail(data: bytes, thumb_size: int = THUMBNAIL_SIZE) -> bytes:
+    """Только миниатюра (полная обложка не нужна)."""
+    with Image.open(io.BytesIO(data)) as img:
+        img.draft("RGB", (thumb_size, thumb_size))
+        img.thumbnail((thumb_size, thumb_size))
+        return _encode_jpeg(img)
+
+
+class CoverProcessor:
+    """
+    Обработка обложек в отдельных процессах (не занимает GIL бота)
+    и кэш готовых миниатюр по обложке альбома: треки одного
+    альбома не декодируют одну и ту же картинку повторно.
+    """
+
+    def __init__(self, workers: int = 2, cache_size: int = 5000):
+        self.workers = max(1, workers)
+        self._thumbnails = TTLCache(maxsize=cache_size)
+        self._pool: ProcessPoolExecutor | None = None
+
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        """Пул процессов (создается при первой обложке)."""
+        if self._pool is None:
+            # spawn: fork процесса с потоками (aiosqlite, aiohttp) небезопасен
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._pool
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def cached_thumbnail(self, key: str | None) -> bytes | None:
+        return self._thumbnails.get(key) if key else None
+
+    def remember_thumbnail(self, key: str | None, thumb: bytes | None):
+        if key and thumb:
+            self._thumbnails.set(key, thumb)
+
+    async def _run(self, func, data: bytes):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.pool, func, data)
+
+    async def thumbnail(self, key: str | None, data: bytes) -> bytes | None:
+        """Миниатюра из кэша или из data (None, если картинка битая)."""
+        thumb = self.cached_thumbnail(key)
+        if thumb:
+            return thumb
+        try:
+            thumb = await self._run(make_thumbnail, data)
+        except Exception as e:
+            logger.warning(f"Failed to make thumbnail: {e}")
+            return None
+        self.remember_thumbnail(key, thumb)
+        return thumb
+
+    async def process(self, key: str | None, data: bytes) -> tuple[bytes, bytes] | None:
+        """(миниатюра, полная обложка) за один проход; миниатюра кэшируется."""
+        try:
+            thumb, full = await self._run(make_cover_images, data)
+        except Exception as e:
+            logger.warning(f"Failed to process cover: {e}")
+            return None
+        self.remember_thumbnail(key, thumb)
+        return thumb, full
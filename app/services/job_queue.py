@@ -0,0 +1,332 @@
+import asyncio
+import json
+import logging
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from typing import Any
+
+import aiosqlite
+
+from app.services.migrations import apply_pragmas
+
+logger = logging.getLogger(__name__)
+
+QUEUE_SQLITE = "sqlite"
+QUEUE_REDIS = "redis"
+
+
+@dataclass
+class QueuedJob:
+    """Задача, выданная воркеру. После выполнения - ack() или retry()."""
+    id: str
+    payload: dict[str, Any] = field(default_factory=dict)
+    attempts: int = 1
+
+
+class JobQueue(ABC):
+    """
+    Надежная очередь задач между процессами.
+
+    - put() кладет задачу (payload - JSON-совместимый словарь);
+    - get() выдает задачу одному воркеру и "арендует" ее на lease секунд;
+    - ack() - задача выполнена, retry() - вернуть в очередь;
+    - если воркер умер и не ответил, после lease задача выдается снова.
+    После max_attempts неудачных попыток задача больше не выдается.
+    """
+
+    def __init__(self, name: str, lease: float = 600, max_attempts: int = 3):
+        self.name = name
+        self.lease = lease
+        self.max_attempts = max_attempts
+
+    async def open(self):
+        pass
+
+    async def close(self):
+        pass
+
+    @abstractmethod
+    async def put(self, payload: dict[str, Any]) -> str:
+        ...
+
+    @abstractmethod
+    async def get(self, timeout: float = 5) -> QueuedJob | None:
+        """Ждет задачу не дольше timeout секунд (None - очередь пуста)."""
+
+    @abstractmethod
+    async def ack(self, job: QueuedJob):
+        ...
+
+    @abstractmethod
+    async def retry(self, job: QueuedJob, error: str):
+        ...
+
+
+class SQLiteJobQueue(JobQueue):
+    """
+    Очередь в таблице jobs той же SQLite (для одного сервера).
+    Выдача задачи - один атомарный UPDATE ... RETURNING, поэтому
+    одну задачу не получат два воркера даже из разных процессов.
+    """
+
+    POLL_INTERVAL = 0.5
+
+    def __init__(self, db_path: str, name: str, lease: float = 600, max_attempts: int = 3):
+        super().__init__(name, lease, max_attempts)
+        self.db_path = db_path
+        self.connection: aiosqlite.Connection | None = None
+
+    async def open(self):
+        self.connection = await aiosqlite.connect(self.db_path)
+        await apply_pragmas(self.connection)
+
+    async def close(self):
+        if self.connection:
+            await self.connection.close()
+            self.connection = None
+
+    async def put(self, payload: dict[str, Any]) -> str:
+        cursor = await self.connection.execute(
+            "INSERT INTO jobs (queue, payload, created_at) VALUES (?, ?, ?)",
+            (self.name, json.dumps(payload, ensure_ascii=False), time.time())
+        )
+        await self.connection.commit()
+        return str(cursor.lastrowid)
+
+    async def _claim(self) -> QueuedJob | None:
+        now = time.time()
+        async with self.connection.execute(
+            """
+            UPDATE jobs
+            SET status = 'running', attempts = attempts + 1, locked_until = ?
+            WHERE id = (
+                SELECT id FROM jobs
+                WHERE queue = ? AND (
+                    status = 'queued'
+                    OR (status = 'running' AND locked_until < ?)
+                )
+                ORDER BY id LIMIT 1
+            )
+            RETURNING id, payload, attempts
+            """,
+            (now + self.lease, self.name, now)
+        ) as cursor:
+            row = await cursor.fetchone()
+        await self.connection.commit()
+        if row is None:
+            return None
+
+        job = QueuedJob(id=str(row[0]), payload=json.loads(row[1]), attempts=row[2])
+        if job.attempts > self.max_attempts:
+            # Воркеры умирали на ней раз за разом
+            await self._fail(job, "lease expired too many times")
+            return await self._claim()
+        return job
+
+    async def get(self, timeout: float = 5) -> QueuedJob | None:
+        deadline = time.monotonic() + timeout
+        while True:
+            job = await self._claim()
+            if job or time.monotonic() >= deadline:
+                return job
+            await asyncio.sleep(self.POLL_INTERVAL)
+
+    async def ack(self, job: QueuedJob):
+        await self.connection.execute("DELETE FROM jobs WHERE id = ?", (int(job.id),))
+        await self.connection.commit()
+
+    async def _fail(self, job: QueuedJob, error: str):
+        logger.warning(f"Job {job.id} failed after {job.attempts} attempts: {error}")
+        await self.connection.execute(
+            "UPDATE jobs SET status = 'failed', locked_until = NULL, error = ? WHERE id = ?",
+            (error, int(job.id))
+        )
+        await self.connection.commit()
+
+    async def retry(self, job: QueuedJob, error: str):
+        if job.attempts >= self.max_attempts:
+            await self._fail(job, error)
+            return
+        await self.connection.execute(
+            "UPDATE jobs SET status = 'queued', locked_until = NULL, error = ? WHERE id = ?",
+            (error, int(job.id))
+        )
+        await self.connection.commit()
+
+
+# Каждый переход задачи - один Lua-скрипт, то есть атомарно:
+# упавший посреди операции процесс не оставит задачу в processing
+# без аренды (такую никто бы уже не вернул в очередь).
+# KEYS: 1 - очередь, 2 - processing, 3 - leases; ARGV[1] - префикс ключей задач.
+
+_REDIS_PUT = """
+local id = redis.call('INCR', KEYS[4])
+redis.call('HSET', ARGV[1] .. id, 'payload', ARGV[2], 'attempts', 0)
+redis.call('LPUSH', KEYS[1], id)
+return id
+"""
+
+_REDIS_CLAIM = """
+for _, id in ipairs(redis.call('ZRANGEBYSCORE', KEYS[3], 0, ARGV[2])) do
+    redis.call('ZREM', KEYS[3], id)
+    redis.call('LREM', KEYS[2], 1, id)
+    redis.call('RPUSH', KEYS[1], id)
+end
+local id = redis.call('LMOVE', KEYS[1], KEYS[2], 'RIGHT', 'LEFT')
+if not id then
+    return false
+end
+local payload = redis.call('HGET', ARGV[1] .. id, 'payload')
+if not payload then
+    redis.call('LREM', KEYS[2], 1, id)
+    return {id}
+end
+redis.call('ZADD', KEYS[3], ARGV[3], id)
+local attempts = redis.call('HINCRBY', ARGV[1] .. id, 'attempts', 1)
+return {id, attempts, payload}
+"""
+
+_REDIS_ACK = """
+redis.call('ZREM', KEYS[3], ARGV[2])
+redis.call('LREM', KEYS[2], 1, ARGV[2])
+redis.call('DEL', ARGV[1] .. ARGV[2])
+"""
+
+# Задачу, чью аренду уже забрал sweeper, повторно в очередь не кладем
+_REDIS_RETRY = """
+redis.call('ZREM', KEYS[3], ARGV[2])
+if redis.call('LREM', KEYS[2], 1, ARGV[2]) == 1 then
+    redis.call('RPUSH', KEYS[1], ARGV[2])
+end
+"""
+
+_REDIS_FAIL = """
+redis.call('ZREM', KEYS[3], ARGV[2])
+redis.call('LREM', KEYS[2], 1, ARGV[2])
+redis.call('HSET', ARGV[1] .. ARGV[2], 'error', ARGV[3])
+redis.call('LPUSH', KEYS[4], ARGV[2])
+"""
+
+
+class RedisJobQueue(JobQueue):
+    """
+    Очередь в Redis (или совместимом сервере): общая для нескольких
+    реплик бота и воркеров. База и кэш треков при этом остаются
+    локальными, поэтому все процессы работают на одной машине.
+
+    Схема "надежной очереди": id задач лежат в списке <name>,
+    выданные переносятся в <name>:processing, срок аренды -
+    в sorted set <name>:leases. Просроченные аренды возвращаются
+    в очередь при каждой выдаче. Все переходы - Lua-скрипты
+    (атомарны), поэтому выдача опрашивает очередь, а не ждет в BLMOVE.
+    Нужен пакет redis (redis.asyncio) и Redis 6.2+.
+    """
+
+    POLL_INTERVAL = 0.5
+
+    def __init__(self, url: str, name: str, lease: float = 600, max_attempts: int = 3):
+        super().__init__(name, lease, max_attempts)
+        self.url = url
+        self.redis = None
+        self._scripts = {}
+
+    async def open(self):
+        if self.redis is None:
+            try:
+                from redis.asyncio import Redis
+            except ImportError as e:
+                raise RuntimeError("JOB_QUEUE=redis requires the 'redis' package") from e
+            self.redis = Redis.from_url(self.url, decode_responses=True)
+        self._scripts = {
+            name: self.redis.register_script(script)
+            for name, script in (
+                ("put", _REDIS_PUT), ("claim", _REDIS_CLAIM), ("ack", _REDIS_ACK),
+                ("retry", _REDIS_RETRY), ("fail", _REDIS_FAIL),
+            )
+        }
+
+    async def close(self):
+        if self.redis:
+            await self.redis.aclose()
+            self.redis = None
+
+    @property
+    def _keys(self) -> list[str]:
+        return [self.name, f"{self.name}:processing", f"{self.name}:leases"]
+
+    @property
+    def _job_prefix(self) -> str:
+        return f"{self.name}:job:"
+
+    async def put(self, payload: dict[str, Any]) -> str:
+        job_id = await self._scripts["put"](
+            keys=[*self._keys, f"{self.name}:seq"],
+            args=[self._job_prefix, json.dumps(payload, ensure_ascii=False)]
+        )
+        return str(job_id)
+
+    async def _claim(self) -> QueuedJob | None:
+        while True:
+            now = time.time()
+            result = await self._scripts["claim"](
+                keys=self._keys, args=[self._job_prefix, now, now + self.lease]
+            )
+            if not result:
+                return None
+            if len(result) == 1:
+                continue  # данные задачи пропали - id выброшен, берем следующую
+
+            job_id, attempts, data = result
+            job = QueuedJob(id=str(job_id), payload=json.loads(data), attempts=int(attempts))
+            if job.attempts > self.max_attempts:
+                # Воркеры умирали на ней раз за разом
+                await self._fail(job, "lease expired too many times")
+                continue
+            return job
+
+    async def get(self, timeout: float = 5) -> QueuedJob | None:
+        deadline = time.monotonic() + timeout
+        while True:
+            job = await self._claim()
+            if job or time.monotonic() >= deadline:
+                return job
+            await asyncio.sleep(self.POLL_INTERVAL)
+
+    async def ack(self, job: QueuedJob):
+        await self._scripts["ack"](keys=self._keys, args=[self._job_prefix, job.id])
+
+    async def _fail(self, job: QueuedJob, error: str):
+        logger.warning(f"Job {job.id} failed after {job.attempts} attempts: {error}")
+        await self._scripts["fail"](
+            keys=[*self._keys, f"{self.name}:failed"],
+            args=[self._job_prefix, job.id, error]
+        )
+
+    async def retry(self, job: QueuedJob, error: str):
+        if job.attempts >= self.max_attempts:
+            await self._fail(job, error)
+            return
+        await self._scripts["retry"](keys=self._keys, args=[self._job_prefix, job.id])
+
+
+async def create_job_queue(
+    kind: str,
+    name: str,
+    db_path: str,
+    redis_url: str,
+    lease: float = 600,
+    max_attempts: int = 3
+) -> JobQueue | None:
+    """
+    sqlite / redis - очередь для отдельных воркеров (worker.py),
+    пустое значение - задачи выполняются в процессе бота (None).
+    """
+    if kind == QUEUE_SQLITE:
+        queue = SQLiteJobQueue(db_path, name, lease, max_attempts)
+    elif kind == QUEUE_REDIS:
+        queue = RedisJobQueue(redis_url, name, lease, max_attempts)
+    else:
+        return None
+    await queue.open()
+    return queue
@@ -1,42 +1,348 @@
-import io
 import logging
-from mutagen import File as AudioFile
-from PIL import Image
-from mutagen.mp4 import MP4, MP4Cover
+import struct
+from dataclasses import dataclass
+from typing import BinaryIO
+
+from mutagen import File as MutagenFile
+from mutagen.mp3 import MPEGInfo
+from mutagen.mp4 import MP4
 
 logger = logging.getLogger(__name__)
 
-def extract_metadata(path):
+# Тип картинки "передняя обложка" (одинаков в ID3 APIC и FLAC PICTURE)
+FRONT_COVER = 3
+
+
+@dataclass
+class TrackTags:
+    """
+    Теги файла без самой картинки обложки.
+    Обложка читается с диска только по запросу (read_cover):
+    ее место в файле запоминается при разборе заголовков.
+    """
+    path: str
+    title: str | None = None
+    performer: str | None = None
+    duration: int | None = None
+    cover_span: tuple[int, int] | None = None  # (смещение, длина)
+    cover_via_mutagen: bool = False
+
+    @property
+    def has_cover(self) -> bool:
+        return self.cover_span is not None or self.cover_via_mutagen
+
+    def read_cover(self) -> bytes | None:
+        """Исходные байты обложки (без декодирования) или None."""
+        if self.cover_span:
+            offset, length = self.cover_span
+            with open(self.path, "rb") as f:
+                f.seek(offset)
+                return f.read(length)
+        if self.cover_via_mutagen:
+            return _cover_with_mutagen(self.path)
+        return None
+
+
+# ---------- ID3v2 (MP3) ----------
+
+_ID3_ENCODINGS = {0: "latin-1", 1: "utf-16", 2: "utf-16-be", 3: "utf-8"}
+
+
+def _syncsafe(data: bytes) -> int:
+    return (data[0] << 21) | (data[1] << 14) | (data[2] << 7) | data[3]
+
+
+def _id3_text(body: bytes) -> str | None:
+    encoding = _ID3_ENCODINGS.get(body[0]) if body else None
+    if encoding is None:
+        return None
+    text = body[1:].decode(encoding, errors="replace")
+    return text.split("\x00")[0] or None
+
+
+def _apic_data_offset(body: bytes) -> tuple[int, int] | None:
+    """(смещение картинки внутри кадра APIC, тип картинки)."""
+    encoding = body[0]
+    mime_end = body.index(b"\x00", 1)
+    picture_type = body[mime_end + 1]
+    pos = mime_end + 2
+    if encoding in (1, 2):
+        # Описание в UTF-16 заканчивается двумя нулями на четной позиции
+        while body[pos:pos + 2] != b"\x00\x00":
+            pos += 2
+        return pos + 2, picture_type
+    return body.index(b"\x00", pos) + 1, picture_type
+
+
+def _read_id3(f: BinaryIO, tags: TrackTags) -> int:
+    """Разбирает ID3v2 в начале файла. Возвращает смещение конца тега."""
+    header = f.read(10)
+    version, flags = header[3], header[5]
+    end = 10 + _syncsafe(header[6:10])
+    if version not in (3, 4) or flags & 0x80:
+        # ID3v2.2 или глобальная рассинхронизация - пусть разбирает mutagen
+        raise ValueError("unsupported ID3 layout")
+
+    pos = 10
+    if flags & 0x40:
+        size = f.read(4)
+        pos += _syncsafe(size) if version == 4 else struct.unpack(">I", size)[0] + 4
+
+    best_cover = None
+    while pos + 10 <= end:
+        f.seek(pos)
+        frame = f.read(10)
+        frame_id = frame[:4]
+        if not frame_id.strip(b"\x00"):
+            break  # padding
+        size = _syncsafe(frame[4:8]) if version == 4 else struct.unpack(">I", frame[4:8])[0]
+        frame_flags = struct.unpack(">H", frame[8:10])[0]
+        body_start = pos + 10
+        pos = body_start + size
+
+        if frame_id in (b"TIT2", b"TPE1"):
+            value = _id3_text(f.read(size))
+            if frame_id == b"TIT2":
+                tags.title = tags.title or value
+            else:
+                tags.performer = tags.performer or value
+        elif frame_id == b"APIC":
+            if frame_flags & 0x00FF:
+                # Сжатый / зашифрованный кадр - смещение картинки не вычислить
+                tags.cover_via_mutagen = True
+                continue
+            # Заголовок APIC (кодировка, MIME, тип, описание) - первые байты кадра
+            head_size, picture_type = _apic_data_offset(f.read(min(size, 1024)))
+            if best_cover is None or picture_type == FRONT_COVER:
+                best_cover = (body_start + head_size, size - head_size)
+
+    tags.cover_span = best_cover
+    return end
+
+
+def _read_mp3_duration(f: BinaryIO, tags: TrackTags, offset: int):
+    """Длительность по первым кадрам MPEG (Xing/VBRI или битрейт)."""
     try:
-        audio = AudioFile(path)
-        title = performer = duration = None
-        cover_bytes = None
-
-        duration = int(audio.info.length) if audio and audio.info else None
-
-        if isinstance(audio, MP4):
-            tags = audio.tags
-            title = tags.get('\xa9nam', [None])[0]
-            performer = tags.get('\xa9ART', [None])[0]
-            if 'covr' in tags:
-                cover_data = tags['covr'][0]
-                if isinstance(cover_data, MP4Cover):
-                    img_format = 'PNG' if cover_data.imageformat == MP4Cover.FORMAT_PNG else 'JPEG'
-                    with io.BytesIO(cover_data) as stream:
-                        with Image.open(stream) as img:
-                            # Обложку нужно ресайзить, иначе Telegram не примет
-                            img.thumbnail((320, 320)) 
-                            cover_bytes = io.BytesIO()
-                            img.save(cover_bytes, format=img_format)
-                            cover_bytes.seek(0)
-        elif audio.tags:
-            title = audio.tags.get("TIT2", [None])[0]
-            performer = audio.tags.get("TPE1", [None])[0]
-            # (Логика для обложек MP3, если нужна, но yandex-music-downloader
-            #  кажется, всегда качает в M4A (MP4), так что пока опустим)
-
-        return title, performer, duration, cover_bytes
+        f.seek(0)
+        tags.duration = int(MPEGInfo(f, offset).length)
+    except Exception as e:
+        logger.debug(f"MP3 duration unavailable for {tags.path}: {e}")
+
+
+# ---------- FLAC ----------
+
+def _read_flac(f: BinaryIO, tags: TrackTags):
+    last = False
+    best_type = None
+    while not last:
+        header = f.read(4)
+        if len(header) < 4:
+            break
+        last = bool(header[0] & 0x80)
+        block_type = header[0] & 0x7F
+        length = int.from_bytes(header[1:4], "big")
+        block_start = f.tell()
+
+        if block_type == 0:  # STREAMINFO
+            info = f.read(18)
+            packed = int.from_bytes(info[10:18], "big")
+            sample_rate = packed >> 44
+            total_samples = packed & 0xFFFFFFFFF
+            if sample_rate:
+                tags.duration = total_samples // sample_rate
+        elif block_type == 4:  # VORBIS_COMMENT (little-endian)
+            data = f.read(length)
+            vendor_length = struct.unpack("<I", data[:4])[0]
+            pos = 4 + vendor_length
+            count = struct.unpack("<I", data[pos:pos + 4])[0]
+            pos += 4
+            artists = []
+            for _ in range(count):
+                entry_length = struct.unpack("<I", data[pos:pos + 4])[0]
+                entry = data[pos + 4:pos + 4 + entry_length].decode("utf-8", errors="replace")
+                pos += 4 + entry_length
+                key, _, value = entry.partition("=")
+                key = key.upper()
+                if key == "TITLE" and not tags.title:
+                    tags.title = value
+                elif key == "ARTIST":
+                    artists.append(value)
+            tags.performer = tags.performer or (", ".join(artists) if artists else None)
+        elif block_type == 6:  # PICTURE
+            picture_type, mime_length = struct.unpack(">II", f.read(8))
+            f.seek(mime_length, 1)
+            (description_length,) = struct.unpack(">I", f.read(4))
+            f.seek(description_length + 16, 1)  # описание, размеры, глубина цвета
+            (data_length,) = struct.unpack(">I", f.read(4))
+            if best_type is None or (picture_type == FRONT_COVER and best_type != FRONT_COVER):
+                tags.cover_span = (f.tell(), data_length)
+                best_type = picture_type
 
+        f.seek(block_start + length)
+
+
+# ---------- MP4 (M4A) ----------
+
+def _mp4_atoms(f: BinaryIO, start: int, end: int):
+    """(имя, начало тела, конец) для атомов одного уровня."""
+    pos = start
+    while pos + 8 <= end:
+        f.seek(pos)
+        size, name = struct.unpack(">I4s", f.read(8))
+        header = 8
+        if size == 1:
+            size = struct.unpack(">Q", f.read(8))[0]
+            header = 16
+        elif size == 0:
+            size = end - pos
+        if size < header:
+            return
+        yield name, pos + header, pos + size
+        pos += size
+
+
+def _mp4_child(f: BinaryIO, start: int, end: int, name: bytes) -> tuple[int, int] | None:
+    for atom, body_start, body_end in _mp4_atoms(f, start, end):
+        if atom == name:
+            return body_start, body_end
+    return None
+
+
+def _read_mp4_ilst(f: BinaryIO, start: int, end: int, tags: TrackTags):
+    for item, body_start, body_end in _mp4_atoms(f, start, end):
+        if item not in (b"\xa9nam", b"\xa9ART", b"covr"):
+            continue
+        data = _mp4_child(f, body_start, body_end, b"data")
+        if not data:
+            continue
+        value_start = data[0] + 8  # тип (4) + locale (4)
+        if item == b"covr":
+            tags.cover_span = tags.cover_span or (value_start, data[1] - value_start)
+            continue
+        f.seek(value_start)
+        value = f.read(data[1] - value_start).decode("utf-8", errors="replace") or None
+        if item == b"\xa9nam":
+            tags.title = value
+        else:
+            tags.performer = value
+
+
+def _read_mp4(f: BinaryIO, tags: TrackTags):
+    f.seek(0, 2)
+    moov = _mp4_child(f, 0, f.tell(), b"moov")
+    if not moov:
+        raise ValueError("no moov atom")
+
+    mvhd = _mp4_child(f, *moov, b"mvhd")
+    if mvhd:
+        f.seek(mvhd[0])
+        version = f.read(4)[0]
+        if version == 1:
+            timescale, duration = struct.unpack(">IQ", f.read(28)[16:])
+        else:
+            timescale, duration = struct.unpack(">II", f.read(16)[8:])
+        if timescale:
+            tags.duration = duration // timescale
+
+    # meta обычно в moov/udta, но бывает и прямо в moov
+    udta = _mp4_child(f, *moov, b"udta")
+    meta = (udta and _mp4_child(f, *udta, b"meta")) or _mp4_child(f, *moov, b"meta")
+    if meta:
+        ilst = _mp4_child(f, meta[0] + 4, meta[1], b"ilst")  # meta - full atom
+        if ilst:
+            _read_mp4_ilst(f, *ilst, tags)
+
+
+# ---------- Общий вход ----------
+
+def _has_mutagen_cover(audio) -> bool:
+    if getattr(audio, "pictures", None):
+        return True
+    if audio.tags is None:
+        return False
+    if isinstance(audio, MP4):
+        return bool(audio.tags.get("covr"))
+    if hasattr(audio.tags, "getall"):
+        return bool(audio.tags.getall("APIC"))
+    return False
+
+
+def _mutagen_text(audio, id3_key: str, mp4_key: str, vorbis_key: str) -> str | None:
+    """Первое значение текстового тега в обозначениях ID3, MP4 или Vorbis."""
+    if not audio.tags:
+        return None
+    if hasattr(audio.tags, "getall"):
+        frame = audio.tags.get(id3_key)
+        values = frame.text if frame else None
+    elif isinstance(audio, MP4):
+        values = audio.tags.get(mp4_key)
+    else:
+        values = audio.tags.get(vorbis_key)
+    return str(values[0]) if values else None
+
+
+def _cover_with_mutagen(path: str) -> bytes | None:
+    audio = MutagenFile(path)
+    if audio is None:
+        return None
+    if isinstance(audio, MP4):
+        covers = audio.tags.get("covr") if audio.tags else None
+        return bytes(covers[0]) if covers else None
+    pictures = getattr(audio, "pictures", None)
+    if pictures:
+        return pictures[0].data
+    if audio.tags is not None and hasattr(audio.tags, "getall"):
+        apic = next(iter(audio.tags.getall("APIC")), None)
+        return apic.data if apic else None
+    return None
+
+
+def _read_with_mutagen(path: str) -> TrackTags:
+    """Запасной путь для форматов, которые не разбираются вручную."""
+    audio = MutagenFile(path)
+    tags = TrackTags(path=path)
+    if audio is None:
+        return tags
+    tags.duration = int(audio.info.length) if audio.info else None
+    tags.cover_via_mutagen = _has_mutagen_cover(audio)
+    tags.title = _mutagen_text(audio, "TIT2", "\xa9nam", "title")
+    tags.performer = _mutagen_text(audio, "TPE1", "\xa9ART", "artist")
+    return tags
+
+
+def read_tags(path: str) -> TrackTags:
+    """
+    Читает только заголовки: ID3v2 (MP3), блоки метаданных FLAC
+    или атомы moov (M4A). Аудиоданные и картинка обложки не читаются.
+    Блокирующий вызов - запускать в потоке.
+    """
+    tags = TrackTags(path=path)
+    try:
+        with open(path, "rb") as f:
+            head = f.read(12)
+            f.seek(0)
+            if head[4:8] == b"ftyp":
+                _read_mp4(f, tags)
+            elif head[:4] == b"fLaC":
+                f.seek(4)
+                _read_flac(f, tags)
+            elif head[:3] == b"ID3":
+                end = _read_id3(f, tags)
+                f.seek(end)
+                if f.read(4) == b"fLaC":
+                    _read_flac(f, tags)
+                else:
+                    _read_mp3_duration(f, tags, end)
+            elif head[0] == 0xFF and head[1] & 0xE0 == 0xE0:
+                _read_mp3_duration(f, tags, 0)  # MP3 без тегов
+            else:
+                raise ValueError("unknown container")
+        return tags
+    except Exception as e:
+        logger.debug(f"Header parsing failed for {path}, using mutagen: {e}")
+
+    try:
+        return _read_with_mutagen(path)
     except Exception as e:
         logger.error(f"Metadata extraction failed: {e}")
-        return None, None, None, None
\ No newline at end of file
+        return TrackTags(path=path)
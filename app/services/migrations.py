@@ -0,0 +1,206 @@
+import logging
+
+import aiosqlite
+
+logger = logging.getLogger(__name__)
+
+# Применяются к каждому соединению (journal_mode=WAL сохраняется в файле БД).
+# WAL: читатели не блокируют писателя и наоборот,
+# synchronous=NORMAL: fsync только при checkpoint, а не на каждый commit.
+PRAGMAS = [
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA cache_size = -16000",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA busy_timeout = 5000",
+]
+
+
+async def _columns(connection: aiosqlite.Connection, table: str) -> set[str]:
+    async with connection.execute(f"PRAGMA table_info({table})") as cursor:
+        return {row[1] for row in await cursor.fetchall()}
+
+
+async def _migration_1_initial(connection: aiosqlite.Connection):
+    """
+    Исходная схема (одна широкая таблица users + кэши).
+    Для старых БД дописывает колонки, которых в них не было.
+    """
+    await connection.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            user_id INTEGER PRIMARY KEY,
+            first_seen TEXT NOT NULL,
+            tracks_downloaded INTEGER DEFAULT 0,
+            lyrics_downloaded INTEGER DEFAULT 0,
+            covers_downloaded INTEGER DEFAULT 0,
+            quality INTEGER DEFAULT 1,
+            send_lrc INTEGER DEFAULT 1
+        )
+    """)
+    columns = await _columns(connection, "users")
+    if "quality" not in columns:
+        await connection.execute("ALTER TABLE users ADD COLUMN quality INTEGER DEFAULT 1")
+    if "send_lrc" not in columns:
+        await connection.execute("ALTER TABLE users ADD COLUMN send_lrc INTEGER DEFAULT 1")
+
+    # Кэш file_id: уже загруженные в Telegram файлы
+    # можно переотправить без скачивания и выгрузки.
+    await connection.execute("""
+        CREATE TABLE IF NOT EXISTS file_cache (
+            track_id TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            quality INTEGER NOT NULL DEFAULT 0,
+            file_id TEXT NOT NULL,
+            created_at TEXT NOT NULL,
+            PRIMARY KEY (track_id, kind, quality)
+        )
+    """)
+
+    # Кэш текстов песен. lrc и plain = NULL - текста нет.
+    await connection.execute("""
+        CREATE TABLE IF NOT EXISTS lyrics (
+            track_id TEXT PRIMARY KEY,
+            lrc TEXT,
+            plain TEXT,
+            fetched_at REAL NOT NULL
+        )
+    """)
+
+
+async def _migration_2_split_users(connection: aiosqlite.Connection):
+    """
+    Разносит users на три узкие таблицы:
+    users (кто и когда пришел), user_stats (горячие счетчики)
+    и user_settings (настройки). Все три - по первичному ключу user_id.
+    """
+    await connection.execute("""
+        CREATE TABLE user_stats (
+            user_id INTEGER PRIMARY KEY,
+            tracks INTEGER NOT NULL DEFAULT 0,
+            lyrics INTEGER NOT NULL DEFAULT 0,
+            covers INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    await connection.execute("""
+        CREATE TABLE user_settings (
+            user_id INTEGER PRIMARY KEY,
+            quality INTEGER NOT NULL DEFAULT 1,
+            send_lrc INTEGER NOT NULL DEFAULT 1
+        )
+    """)
+    await connection.execute("""
+        INSERT INTO user_stats (user_id, tracks, lyrics, covers)
+        SELECT user_id,
+               COALESCE(tracks_downloaded, 0),
+               COALESCE(lyrics_downloaded, 0),
+               COALESCE(covers_downloaded, 0)
+        FROM users
+    """)
+    await connection.execute("""
+        INSERT INTO user_settings (user_id, quality, send_lrc)
+        SELECT user_id, COALESCE(quality, 1), COALESCE(send_lrc, 1)
+        FROM users
+    """)
+
+    await connection.execute("""
+        CREATE TABLE users_new (
+            user_id INTEGER PRIMARY KEY,
+            first_seen TEXT NOT NULL
+        )
+    """)
+    await connection.execute(
+        "INSERT INTO users_new (user_id, first_seen) SELECT user_id, first_seen FROM users"
+    )
+    await connection.execute("DROP TABLE users")
+    await connection.execute("ALTER TABLE users_new RENAME TO users")
+
+    # Для чистки устаревших "текста нет" записей
+    await connection.execute(
+        "CREATE INDEX IF NOT EXISTS idx_lyrics_fetched_at ON lyrics (fetched_at)"
+    )
+
+
+async def _migration_3_tracks(connection: aiosqlite.Connection):
+    """Кэш информации о треках (TrackInfo в JSON)."""
+    await connection.execute("""
+        CREATE TABLE tracks (
+            track_id TEXT PRIMARY KEY,
+            data TEXT NOT NULL,
+            updated_at REAL NOT NULL
+        )
+    """)
+
+
+async def _migration_4_fsm(connection: aiosqlite.Connection):
+    """FSM-состояния юзеров (переживают перезапуск бота)."""
+    await connection.execute("""
+        CREATE TABLE fsm_states (
+            key TEXT PRIMARY KEY,
+            state TEXT,
+            data TEXT NOT NULL DEFAULT '{}'
+        )
+    """)
+
+
+async def _migration_5_jobs(connection: aiosqlite.Connection):
+    """
+    Очередь задач для отдельных процессов-воркеров.
+    status: queued / running / failed; running с истекшим
+    locked_until снова выдается (воркер умер посреди задачи).
+    """
+    await connection.execute("""
+        CREATE TABLE jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            queue TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            locked_until REAL,
+            created_at REAL NOT NULL,
+            error TEXT
+        )
+    """)
+    await connection.execute(
+        "CREATE INDEX idx_jobs_queue_status ON jobs (queue, status, id)"
+    )
+
+
+# Порядок важен: номер миграции = индекс + 1 = PRAGMA user_version после нее.
+# Новые таблицы добавляются только новой миграцией в конец списка.
+MIGRATIONS = [
+    _migration_1_initial,
+    _migration_2_split_users,
+    _migration_3_tracks,
+    _migration_4_fsm,
+    _migration_5_jobs,
+]
+
+
+async def apply_pragmas(connection: aiosqlite.Connection):
+    for pragma in PRAGMAS:
+        await connection.execute(pragma)
+
+
+async def migrate(connection: aiosqlite.Connection) -> int:
+    """
+    Применяет недостающие миграции, каждую в своей транзакции.
+    Возвращает итоговую версию схемы.
+    """
+    async with connection.execute("PRAGMA user_version") as cursor:
+        version = (await cursor.fetchone())[0]
+
+    for target, migration in enumerate(MIGRATIONS, start=1):
+        if target <= version:
+            continue
+        await connection.execute("BEGIN")
+        try:
+            await migration(connection)
+            await connection.execute(f"PRAGMA user_version = {target}")
+            await connection.commit()
+        except Exception:
+            await connection.rollback()
+            raise
+        version = target
+        logger.info(f"Database migrated to version {version} ({migration.__name__}).")
+
+    return version
@@ -0,0 +1,127 @@
+import asyncio
+import logging
+import re
+from dataclasses import dataclass
+from typing import Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+# "45%", "45.5 %" в выводе загрузчика
+_PERCENT = re.compile(r"(\d{1,3}(?:\.\d+)?)\s*%")
+# Прогресс-бары перерисовывают строку через \r
+_LINE_BREAK = re.compile(rb"[\r\n]")
+
+ProgressCallback = Callable[[float], Awaitable[None]]
+
+
+@dataclass
+class ProcessResult:
+    returncode: int
+    stderr: str
+
+
+def parse_percent(line: str) -> float | None:
+    """Последний процент в строке вывода или None."""
+    found = _PERCENT.findall(line)
+    if not found:
+        return None
+    percent = float(found[-1])
+    return percent if 0 <= percent <= 100 else None
+
+
+class ProcessRunner:
+    """
+    Общий запуск внешних программ (yandex-music-downloader) без потоков.
+
+    - не больше max_processes дочерних процессов одновременно,
+      остальные ждут своей очереди;
+    - по таймауту или при отмене задачи процесс убивается;
+    - из stderr хранится только последние stderr_limit байт;
+    - проценты из stdout передаются в on_progress.
+    """
+
+    def __init__(self, max_processes: int = 4, timeout: float = 300, stderr_limit: int = 16 * 1024):
+        self.max_processes = max(1, max_processes)
+        self.timeout = timeout
+        self.stderr_limit = stderr_limit
+        self._slots = asyncio.Semaphore(self.max_processes)
+
+    async def close(self):
+        pass
+
+    async def _report(self, line: bytes, on_progress: ProgressCallback):
+        percent = parse_percent(line.decode("utf-8", errors="replace"))
+        if percent is None:
+            return
+        try:
+            await on_progress(percent)
+        except Exception as e:
+            logger.debug(f"Progress callback failed: {e}")
+
+    async def _read_stdout(self, stream: asyncio.StreamReader, on_progress: ProgressCallback | None):
+        buffer = b""
+        while chunk := await stream.read(4096):
+            if on_progress is None:
+                continue
+            *lines, buffer = _LINE_BREAK.split(buffer + chunk)
+            for line in lines:
+                await self._report(line, on_progress)
+            buffer = buffer[-4096:]
+        if on_progress and buffer:
+            await self._report(buffer, on_progress)
+
+    async def _read_stderr(self, stream: asyncio.StreamReader) -> bytes:
+        tail = bytearray()
+        while chunk := await stream.read(4096):
+            tail += chunk
+            if len(tail) > self.stderr_limit:
+                del tail[:len(tail) - self.stderr_limit]
+        return bytes(tail)
+
+    async def _kill(self, process: asyncio.subprocess.Process):
+        if process.returncode is None:
+            try:
+                process.kill()
+            except ProcessLookupError:
+                pass
+            await process.wait()
+
+    async def run(
+        self,
+        cmd: list[str],
+        timeout: float | None = None,
+        on_progress: ProgressCallback | None = None
+    ) -> ProcessResult:
+        """Запускает cmd и ждет завершения. Код возврата проверяет вызывающий."""
+        timeout = self.timeout if timeout is None else timeout
+
+        async with self._slots:
+            process = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE
+            )
+
+            async def communicate() -> bytes:
+                _, stderr = await asyncio.gather(
+                    self._read_stdout(process.stdout, on_progress),
+                    self._read_stderr(process.stderr)
+                )
+                await process.wait()
+                return stderr
+
+            try:
+                stderr = await asyncio.wait_for(communicate(), timeout)
+            except asyncio.TimeoutError:
+                await self._kill(process)
+                raise Exception(f"{cmd[0]} не ответил за {timeout:g} с и был остановлен.")
+            except BaseException:
+                # Отмена (юзер ушел, бот останавливается) - процесс не оставляем
+                await self._kill(process)
+                raise
+
+        return ProcessResult(
+            returncode=process.returncode,
+            stderr=stderr.decode("utf-8", errors="replace")
+        )
@@ -0,0 +1,135 @@
+import asyncio
+import itertools
+import logging
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+# Чем меньше число, тем раньше задача попадет в работу.
+# Тексты и обложки - дешевые, поэтому идут вперед тяжелых загрузок.
+PRIORITY_LIGHT = 0
+PRIORITY_DOWNLOAD = 1
+
+
+@dataclass
+class _Job:
+    priority: int
+    seq: int
+    user_id: int
+    func: Callable[[], Awaitable[Any]]
+    future: asyncio.Future = field(repr=False)
+    task: asyncio.Task | None = field(default=None, repr=False)
+
+    @property
+    def order(self) -> tuple[int, int]:
+        return self.priority, self.seq
+
+
+class JobScheduler:
+    """
+    Ограниченная очередь задач с честным распределением между юзерами.
+
+    - не больше max_concurrent задач одновременно на весь бот;
+    - не больше max_per_user задач одновременно на одного юзера;
+    - из ожидающих первой берется задача с меньшим приоритетом,
+      затем - юзера, у которого сейчас меньше всего задач в работе,
+      затем - самая старая.
+    """
+
+    def __init__(self, max_concurrent: int, max_per_user: int):
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_per_user = max(1, max_per_user)
+        self._pending: list[_Job] = []
+        self._running = 0
+        self._running_per_user: dict[int, int] = defaultdict(int)
+        self._seq = itertools.count()
+
+    @property
+    def running(self) -> int:
+        return self._running
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def _position(self, job: _Job) -> int:
+        """Примерная позиция задачи в очереди (начиная с 1)."""
+        return 1 + sum(1 for other in self._pending if other.order < job.order)
+
+    def _can_start(self, job: _Job) -> bool:
+        return self._running_per_user[job.user_id] < self.max_per_user
+
+    def _dispatch(self):
+        """Запускает столько ожидающих задач, сколько позволяют лимиты."""
+        while self._running < self.max_concurrent:
+            candidates = [job for job in self._pending if self._can_start(job)]
+            if not candidates:
+                return
+            job = min(
+                candidates,
+                key=lambda j: (j.priority, self._running_per_user[j.user_id], j.seq)
+            )
+            self._pending.remove(job)
+            self._running += 1
+            self._running_per_user[job.user_id] += 1
+            job.task = asyncio.create_task(self._run(job))
+
+    async def _run(self, job: _Job):
+        try:
+            result = await job.func()
+        except asyncio.CancelledError:
+            if not job.future.done():
+                job.future.cancel()
+            raise
+        except Exception as e:
+            if not job.future.done():
+                job.future.set_exception(e)
+        else:
+            if not job.future.done():
+                job.future.set_result(result)
+        finally:
+            self._running -= 1
+            self._running_per_user[job.user_id] -= 1
+            if self._running_per_user[job.user_id] <= 0:
+                del self._running_per_user[job.user_id]
+            self._dispatch()
+
+    async def submit(
+        self,
+        user_id: int,
+        func: Callable[[], Awaitable[Any]],
+        priority: int = PRIORITY_DOWNLOAD,
+        on_queued: Callable[[int], Awaitable[None]] | None = None
+    ) -> Any:
+        """
+        Ставит задачу в очередь и ждет ее результата.
+        Если задача не стартовала сразу, вызывает on_queued(позиция).
+        Отмена ожидающего снимает задачу с очереди или прерывает ее.
+        """
+        loop = asyncio.get_running_loop()
+        job = _Job(
+            priority=priority,
+            seq=next(self._seq),
+            user_id=user_id,
+            func=func,
+            future=loop.create_future()
+        )
+        self._pending.append(job)
+        self._dispatch()
+
+        if job.task is None and on_queued:
+            try:
+                await on_queued(self._position(job))
+            except Exception as e:
+                logger.warning(f"Failed to report queue position: {e}")
+
+        try:
+            return await asyncio.shield(job.future)
+        except asyncio.CancelledError:
+            if job in self._pending:
+                self._pending.remove(job)
+            elif job.task and not job.task.done():
+                job.task.cancel()
+            raise
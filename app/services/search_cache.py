@@ -0,0 +1,162 @@
+import asyncio
+import logging
+import re
+from dataclasses import dataclass, field
+
+from app.services.cache import TTLCache
+from app.services.singleflight import SingleFlight
+from app.services.tracks import TrackCatalog, TrackInfo
+from app.services.yandex import search_tracks
+from app.services.yandex_api import YandexClientPool
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_query(query: str) -> str:
+    """Приводит запрос к единому виду: нижний регистр, одинарные пробелы."""
+    return re.sub(r"\s+", " ", query or "").strip().lower()
+
+
+def _track_text(track: TrackInfo) -> str:
+    return f"{' '.join(track.artists)} {track.title}".lower()
+
+
+@dataclass
+class SearchCursor:
+    """Уже загруженные страницы результатов одного запроса."""
+    tracks: list[TrackInfo] = field(default_factory=list)
+    next_page: int = 0
+    total: int = 0
+    exhausted: bool = False
+
+
+class SearchCache:
+    """
+    Кэш inline-поиска: нормализованный запрос -> загруженные страницы.
+
+    - LRU + время жизни записей;
+    - страницы догружаются из Яндекса по мере прокрутки (next_offset);
+    - одинаковые одновременные запросы идут в Яндекс один раз;
+    - дописанный запрос переиспользует результат более короткого,
+      если тот загружен целиком и все его треки по-прежнему подходят;
+    - debounce: запрос юзера отбрасывается, если он успел
+      напечатать следующий.
+    Найденные треки сразу попадают в TrackCatalog, поэтому переход
+    по ссылке из результатов уже не требует запроса к Яндексу.
+    """
+
+    def __init__(
+        self,
+        yandex: YandexClientPool,
+        catalog: TrackCatalog,
+        maxsize: int = 2000,
+        ttl: float = 600,
+        debounce: float = 0.35,
+        page_size: int = 20
+    ):
+        self.yandex = yandex
+        self.catalog = catalog
+        self.debounce_delay = debounce
+        self.page_size = page_size
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._flights = SingleFlight()
+        self._latest_query: dict[int, str] = {}
+
+    def _from_prefix(self, query: str) -> SearchCursor | None:
+        """
+        Ищет закэшированный более короткий вариант запроса.
+        Годится, только если он загружен целиком и все его треки
+        подходят и под новый запрос.
+        """
+        words = query.split(" ")
+        for end in range(len(query) - 1, 1, -1):
+            cursor = self._cache.get(query[:end])
+            if cursor is None:
+                continue
+            if cursor.exhausted and all(
+                all(word in _track_text(t) for word in words) for t in cursor.tracks
+            ):
+                return SearchCursor(
+                    tracks=list(cursor.tracks),
+                    next_page=cursor.next_page,
+                    total=len(cursor.tracks),
+                    exhausted=True
+                )
+            return None
+        return None
+
+    def _cursor(self, query: str) -> SearchCursor:
+        cursor = self._cache.get(query)
+        if cursor is None:
+            cursor = self._from_prefix(query) or SearchCursor()
+            self._cache.set(query, cursor)
+        return cursor
+
+    def _slice(self, cursor: SearchCursor, offset: int) -> tuple[list, str]:
+        tracks = cursor.tracks[offset:offset + self.page_size]
+        end = offset + len(tracks)
+        has_more = end < len(cursor.tracks) or not cursor.exhausted
+        return tracks, str(end) if tracks and has_more else ""
+
+    def cached(self, query: str, offset: int = 0) -> tuple[list, str] | None:
+        """
+        (треки, next_offset) без обращения к Яндексу
+        или None, если нужную страницу еще надо загрузить.
+        """
+        query = normalize_query(query)
+        if not query:
+            return [], ""
+        # Только чтение: пустой курсор на каждое нажатие клавиши
+        # (в т.ч. для запросов, которые отбросит debounce) вытеснял бы настоящие
+        cursor = self._cache.get(query) or self._from_prefix(query)
+        if cursor is None:
+            return None
+        if len(cursor.tracks) >= offset + self.page_size or cursor.exhausted:
+            return self._slice(cursor, offset)
+        return None
+
+    async def _load_next_page(self, query: str, cursor: SearchCursor):
+        page = cursor.next_page
+
+        async def fetch():
+            tracks, total = await search_tracks(self.yandex, query, page=page)
+            return await self.catalog.remember(tracks), total
+
+        tracks, total = await self._flights.do((query, page), fetch)
+        if cursor.next_page != page:
+            return  # страницу уже добавил параллельный запрос
+
+        cursor.tracks.extend(tracks)
+        cursor.next_page += 1
+        cursor.total = total
+        if not tracks or len(cursor.tracks) >= total:
+            cursor.exhausted = True
+
+    async def search(self, query: str, offset: int = 0) -> tuple[list, str]:
+        """
+        Возвращает (треки начиная с offset, next_offset для Telegram).
+        Недостающие страницы догружаются по одной.
+        """
+        query = normalize_query(query)
+        if not query:
+            return [], ""
+
+        cursor = self._cursor(query)
+        while len(cursor.tracks) < offset + self.page_size and not cursor.exhausted:
+            await self._load_next_page(query, cursor)
+        if query not in self._cache:
+            # Пока грузилась страница, курсор вытеснили - возвращаем
+            self._cache.set(query, cursor)
+        return self._slice(cursor, offset)
+
+    async def debounce(self, user_id: int, query_id: str) -> bool:
+        """
+        Ждет паузу в наборе. Возвращает False, если за это время
+        от того же юзера пришел более новый запрос.
+        """
+        self._latest_query[user_id] = query_id
+        await asyncio.sleep(self.debounce_delay)
+        if self._latest_query.get(user_id) != query_id:
+            return False
+        del self._latest_query[user_id]
+        return True
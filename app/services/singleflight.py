@@ -0,0 +1,48 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Hashable
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """
+    Объединяет одинаковые одновременные задачи в одну.
+
+    Первый вызов do() с ключом выполняет задачу ("ведущий"),
+    остальные вызовы с тем же ключом, пока она не закончилась,
+    просто ждут ее результата.
+    """
+
+    def __init__(self):
+        self._flights: dict[Hashable, asyncio.Future] = {}
+
+    def in_flight(self, key: Hashable) -> bool:
+        return key in self._flights
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> tuple[Any, bool]:
+        """
+        Возвращает (результат, shared).
+        shared=True - результат получен от чужой (уже идущей) задачи.
+        """
+        future = self._flights.get(key)
+        if future is not None:
+            return await asyncio.shield(future), True
+
+        future = asyncio.get_running_loop().create_future()
+        self._flights[key] = future
+        try:
+            result = await func()
+        except asyncio.CancelledError:
+            future.set_exception(RuntimeError("Задача была отменена."))
+            future.exception()  # ошибку получат ожидающие, если они есть
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            self._flights.pop(key, None)
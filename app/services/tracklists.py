@@ -0,0 +1,67 @@
+import logging
+from dataclasses import dataclass, field
+
+from app.services.tracks import TrackCatalog, TrackInfo
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class TrackList:
+    """Альбом, плейлист или топ исполнителя: название и треки по порядку."""
+    title: str
+    tracks: list[TrackInfo] = field(default_factory=list)
+
+
+async def resolve_album(catalog: TrackCatalog, album_id: str, limit: int) -> TrackList | None:
+    """Треки альбома (все диски подряд) одним запросом albums_with_tracks."""
+    album = await catalog.yandex.client.albums_with_tracks(album_id)
+    if album is None:
+        return None
+
+    tracks = [track for volume in album.volumes or [] for track in volume]
+    artists = ", ".join(a.name for a in album.artists or [] if a.name)
+    return TrackList(
+        title=f"{artists} - {album.title}" if artists else album.title or "Альбом",
+        tracks=(await catalog.remember(tracks))[:limit]
+    )
+
+
+async def resolve_playlist(
+    catalog: TrackCatalog, owner: str, kind: str, limit: int
+) -> TrackList | None:
+    """
+    Треки плейлиста пользователя.
+    Полные объекты треков, если они пришли вместе с плейлистом,
+    сразу попадают в каталог; остальные добираются через get_many.
+    """
+    playlist = await catalog.yandex.client.users_playlists(int(kind), owner)
+    if playlist is None:
+        return None
+
+    shorts = playlist.tracks or await playlist.fetch_tracks_async()
+    shorts = shorts[:limit]
+    await catalog.remember([short.track for short in shorts if short.track])
+
+    track_ids = [str(short.id) for short in shorts]
+    infos = await catalog.get_many(track_ids)
+    return TrackList(
+        title=playlist.title or "Плейлист",
+        tracks=[infos[track_id] for track_id in track_ids if track_id in infos]
+    )
+
+
+async def resolve_artist(catalog: TrackCatalog, artist_id: str, limit: int) -> TrackList | None:
+    """Популярные треки исполнителя (первая страница, не больше limit)."""
+    result = await catalog.yandex.client.artists_tracks(artist_id, page=0, page_size=limit)
+    if result is None or not result.tracks:
+        return None
+
+    name = next(
+        (a.name for a in result.tracks[0].artists or [] if str(a.id) == str(artist_id)),
+        None
+    )
+    return TrackList(
+        title=f"{name or 'Исполнитель'}: популярное",
+        tracks=await catalog.remember(result.tracks)
+    )
@@ -0,0 +1,120 @@
+import json
+import logging
+from dataclasses import asdict, dataclass, field
+
+from yandex_music import Track
+
+from app.services.cache import TTLCache
+from app.services.database import Database
+from app.services.yandex_api import YandexClientPool
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class TrackInfo:
+    """
+    Компактная информация о треке (вместо тяжелого объекта Track).
+    Хранится в памяти и в SQLite, почти никогда не меняется.
+    """
+    id: str
+    title: str
+    artists: list[str] = field(default_factory=list)
+    duration_ms: int | None = None
+    album_id: str | None = None
+    album_title: str | None = None
+    cover_uri: str | None = None
+    has_sync_lyrics: bool | None = None
+    has_text_lyrics: bool | None = None
+
+    @property
+    def performer(self) -> str:
+        return ", ".join(self.artists)
+
+    @property
+    def main_artist(self) -> str:
+        return self.artists[0] if self.artists else "Unknown"
+
+    @classmethod
+    def from_track(cls, track: Track) -> "TrackInfo":
+        album = track.albums[0] if track.albums else None
+        lyrics_info = track.lyrics_info
+        return cls(
+            id=str(track.id),
+            title=track.title or "",
+            artists=[a.name for a in track.artists or [] if a.name],
+            duration_ms=track.duration_ms,
+            album_id=str(album.id) if album and album.id else None,
+            album_title=album.title if album else None,
+            cover_uri=track.cover_uri or track.og_image or (album.cover_uri if album else None),
+            has_sync_lyrics=lyrics_info.has_available_sync_lyrics if lyrics_info else None,
+            has_text_lyrics=lyrics_info.has_available_text_lyrics if lyrics_info else None,
+        )
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self), ensure_ascii=False)
+
+    @classmethod
+    def from_json(cls, data: str) -> "TrackInfo":
+        return cls(**json.loads(data))
+
+
+class TrackCatalog:
+    """
+    Двухуровневый кэш информации о треках: LRU в памяти + таблица в SQLite.
+    Промахи добираются из Яндекса одним запросом tracks() на все id сразу.
+    """
+
+    def __init__(
+        self,
+        yandex: YandexClientPool,
+        db: Database,
+        maxsize: int = 20000,
+        db_ttl: float = 7 * 86400
+    ):
+        self.yandex = yandex
+        self.db = db
+        self.db_ttl = db_ttl
+        self._memory = TTLCache(maxsize=maxsize)
+
+    async def get(self, track_id: str) -> TrackInfo | None:
+        return (await self.get_many([track_id])).get(str(track_id))
+
+    async def get_many(self, track_ids: list[str]) -> dict[str, TrackInfo]:
+        """Возвращает {track_id: TrackInfo}; не найденных треков в ответе нет."""
+        result: dict[str, TrackInfo] = {}
+        missing = []
+        for track_id in dict.fromkeys(str(t) for t in track_ids):
+            info = self._memory.get(track_id)
+            if info is not None:
+                result[track_id] = info
+            else:
+                missing.append(track_id)
+
+        if missing:
+            rows = await self.db.get_tracks(missing, max_age=self.db_ttl)
+            for track_id, data in rows.items():
+                info = TrackInfo.from_json(data)
+                self._memory.set(track_id, info)
+                result[track_id] = info
+            missing = [track_id for track_id in missing if track_id not in rows]
+
+        if missing:
+            try:
+                tracks = await self.yandex.client.tracks(missing)
+            except Exception as e:
+                logger.warning(f"Failed to fetch tracks {missing}: {e}")
+                tracks = []
+            for info in await self.remember(tracks):
+                result[info.id] = info
+
+        return result
+
+    async def remember(self, tracks: list[Track]) -> list[TrackInfo]:
+        """Кладет уже полученные объекты Track (например, из поиска) в кэш."""
+        infos = [TrackInfo.from_track(track) for track in tracks if track and track.id]
+        for info in infos:
+            self._memory.set(info.id, info)
+        if infos:
+            await self.db.save_tracks({info.id: info.to_json() for info in infos})
+        return infos
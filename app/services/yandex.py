@@ -1,10 +1,13 @@
-import asyncio
 import os
-import glob
-import subprocess 
+import shutil
+import tempfile
 import logging
 import re
-from yandex_music import Client, Track
+from yandex_music import Track
+from yandex_music.exceptions import NotFoundError
+
+from app.services.processes import ProcessRunner, ProgressCallback
+from app.services.yandex_api import YandexClientPool
 
 logger = logging.getLogger(__name__)
 
@@ -12,49 +15,81 @@ logger = logging.getLogger(__name__)
 DOWNLOAD_DIR = "downloads"
 os.makedirs(DOWNLOAD_DIR, exist_ok=True)
 
-async def setup_yandex_client(token: str) -> Client:
+# Имя результата CLI внутри рабочей папки (--path-pattern без заполнителей):
+# у задачи своя папка, поэтому путь известен заранее - job_dir/track.<ext>.
+# Расширение CLI добавляет сам, по кодеку.
+CLI_OUTPUT_NAME = "track"
+# Расширения, под которыми загрузчики сохраняют треки
+AUDIO_EXTENSIONS = (".mp3", ".flac", ".m4a", ".aac")
+
+async def setup_yandex_client(
+    tokens: list[str],
+    max_connections: int = 16,
+    timeout: float = 10,
+    retries: int = 3
+) -> YandexClientPool:
     """
-    Асинхронно инициализирует клиент Яндекс.Музыки.
-    (Используется только для поиска)
+    Асинхронно инициализирует клиенты Яндекс.Музыки
+    (поиск, информация о треках, тексты, ссылки на файлы).
     """
-    client = Client(token)
-    await asyncio.to_thread(client.init)
-    return client
+    return await YandexClientPool(tokens, max_connections, timeout, retries).init()
 
-async def search_tracks(client: Client, query: str) -> list:
+async def search_tracks(yandex: YandexClientPool, query: str, page: int = 0) -> tuple[list, int]:
     """
     Асинхронно ищет треки.
-    (Остается без изменений)
+    Возвращает (треки на странице page, всего найдено).
     """
     if not query:
-        return []
+        return [], 0
     
-    search_result = await asyncio.to_thread(client.search, query)
+    search_result = await yandex.client.search(query, type_="track", page=page)
     
-    if search_result.tracks:
-        return search_result.tracks.results[:10]
-    return []
+    if search_result and search_result.tracks:
+        return search_result.tracks.results or [], search_result.tracks.total or 0
+    return [], 0
 
-def _clear_download_dir():
-    """Очищает папку загрузок перед новой операцией."""
+def create_job_dir() -> str:
+    """
+    Создает отдельную рабочую папку для одной операции.
+    Каждая загрузка пишет только в свою папку, поэтому
+    параллельные запросы не трогают чужие файлы.
+    """
+    return tempfile.mkdtemp(prefix="job_", dir=DOWNLOAD_DIR)
+
+def remove_job_dir(job_dir: str | None):
+    """Удаляет рабочую папку операции (вызывает только ее владелец)."""
+    if not job_dir:
+        return
     try:
-        files = glob.glob(os.path.join(DOWNLOAD_DIR, "**", "*.*"), recursive=True)
-        for f in files:
-            os.remove(f)
+        shutil.rmtree(job_dir)
+    except FileNotFoundError:
+        pass
     except Exception as e:
-        logger.warning(f"Failed to clear download dir: {e}")
+        logger.warning(f"Failed to remove job dir {job_dir}: {e}")
+
+def _cli_audio_path(job_dir: str) -> str | None:
+    """Файл, который CLI сохранил по пути job_dir/CLI_OUTPUT_NAME.<ext>."""
+    base = os.path.join(job_dir, CLI_OUTPUT_NAME)
+    for extension in AUDIO_EXTENSIONS:
+        if os.path.exists(base + extension):
+            return base + extension
+    return None
 
 async def download_track_via_cli(
     token: str, 
     track_id: str, 
-    quality_code: int
+    quality_code: int,
+    job_dir: str,
+    runner: ProcessRunner,
+    on_progress: ProgressCallback | None = None,
+    filename: str | None = None
 ) -> str:
     """
-    Скачивает трек с помощью yandex-music-downloader в отдельном потоке.
+    Скачивает трек с помощью yandex-music-downloader (через runner).
+    Файл сохраняется в рабочую папку job_dir (см. create_job_dir)
+    и переименовывается в filename (без расширения), если он задан.
     Возвращает путь к скачанному файлу.
     """
-    _clear_download_dir()
-    
     quality_str = str(quality_code)
     url = f"https://music.yandex.ru/track/{track_id}"
     
@@ -65,42 +100,68 @@ async def download_track_via_cli(
         "--embed-cover",
         "--cover-resolution", "400",
         "--url", url,
-        "--dir", DOWNLOAD_DIR,
-        # ===>>> ИСПРАВЛЕНИЕ ЗДЕСЬ: Задаем чистый паттерн <<<===
-        "--path-pattern", "#track-artist - #title"
+        "--dir", job_dir,
+        "--path-pattern", CLI_OUTPUT_NAME
     ]
 
-    # Запускаем блокирующий subprocess в потоке
-    result = await asyncio.to_thread(
-        subprocess.run, cmd, capture_output=True, text=True, encoding='utf-8'
-    )
+    result = await runner.run(cmd, on_progress=on_progress)
 
     if result.returncode != 0:
         logger.error(f"Downloader failed: {result.stderr}")
         raise Exception(f"Ошибка загрузчика: {result.stderr[:1000]}")
 
-    # Ищем скачанный файл
-    audio_files = sorted(
-        glob.glob(os.path.join(DOWNLOAD_DIR, "**", "*.*"), recursive=True),
-        key=os.path.getmtime,
-        reverse=True
-    )
-    
-    if not audio_files:
+    path = _cli_audio_path(job_dir)
+    if path is None:
         raise Exception("Файл был скачан, но не найден в папке.")
-        
-    return audio_files[0]
+
+    if filename:
+        target = os.path.join(job_dir, filename + os.path.splitext(path)[1])
+        os.replace(path, target)
+        path = target
+    return path
 
 def _parse_lrc_to_plain(lrc_text: str) -> str:
     """Убирает [xx:xx.xx] таймкоды из LRC."""
     return re.sub(r'\[\d{2}:\d{2}\.\d{2,3}\]', '', lrc_text).strip()
 
-async def get_lyrics_via_cli(token: str, track_id: str) -> (str, str):
+async def _fetch_lyrics_text(yandex: YandexClientPool, track_id: str, lyrics_format: str) -> str | None:
+    """Скачивает текст в формате LRC или TEXT."""
+    try:
+        lyrics = await yandex.download_client.tracks_lyrics(track_id, format=lyrics_format)
+        return await lyrics.fetch_lyrics_async()
+    except NotFoundError:
+        return None
+
+async def get_lyrics_via_api(
+    yandex: YandexClientPool,
+    track_id: str,
+    has_sync: bool | None = None,
+    has_text: bool | None = None
+) -> (str, str):
+    """
+    Получает LRC и Plain text напрямую через API (без скачивания аудио).
+    has_sync / has_text - что известно о тексте заранее (None - неизвестно);
+    заведомо отсутствующий формат не запрашивается.
+    Возвращает (lrc_text, plain_text)
+    """
+    lrc_text = plain_text = None
+
+    if has_sync is not False:
+        lrc_text = await _fetch_lyrics_text(yandex, track_id, "LRC")
+
+    if lrc_text:
+        plain_text = _parse_lrc_to_plain(lrc_text)
+    elif has_text is not False:
+        plain_text = await _fetch_lyrics_text(yandex, track_id, "TEXT")
+
+    return lrc_text, plain_text
+
+async def get_lyrics_via_cli(token: str, track_id: str, runner: ProcessRunner) -> (str, str):
     """
     Скачивает LRC и Plain text с помощью yandex-music-downloader.
     Возвращает (lrc_text, plain_text)
     """
-    _clear_download_dir()
+    job_dir = create_job_dir()
     
     url = f"https://music.yandex.ru/track/{track_id}"
     
@@ -111,47 +172,43 @@ async def get_lyrics_via_cli(token: str, track_id: str) -> (str, str):
         "--quality", "0",
         "--skip-existing",
         "--url", url,
-        "--dir", DOWNLOAD_DIR,
-        # ===>>> ИСПРАВЛЕНИЕ ЗДЕСЬ: Задаем чистый паттерн <<<===
-        "--path-pattern", "#track-artist - #title"
+        "--dir", job_dir,
+        "--path-pattern", CLI_OUTPUT_NAME
     ]
     
-    result = await asyncio.to_thread(
-        subprocess.run, cmd, capture_output=True, text=True, encoding='utf-8'
-    )
+    try:
+        result = await runner.run(cmd)
 
-    if result.returncode != 0:
-        logger.error(f"Lyrics Downloader failed: {result.stderr}")
-        raise Exception(f"Ошибка загрузчика текста: {result.stderr[:1000]}")
-    
-    lrc_files = glob.glob(os.path.join(DOWNLOAD_DIR, "**", "*.lrc"), recursive=True)
-    
-    if not lrc_files:
-        return None, None
+        if result.returncode != 0:
+            logger.error(f"Lyrics Downloader failed: {result.stderr}")
+            raise Exception(f"Ошибка загрузчика текста: {result.stderr[:1000]}")
         
-    lrc_filepath = lrc_files[0]
-    
-    try:
-        with open(lrc_filepath, 'r', encoding='utf-8') as f:
-            lrc_text = f.read()
+        lrc_path = os.path.join(job_dir, CLI_OUTPUT_NAME + ".lrc")
+        if not os.path.exists(lrc_path):
+            return None, None
             
-        plain_text = _parse_lrc_to_plain(lrc_text)
-        
-        return lrc_text, plain_text
-        
-    except Exception as e:
-        logger.error(f"Failed to read LRC file: {e}")
-        return None, None
+        try:
+            with open(lrc_path, 'r', encoding='utf-8') as f:
+                lrc_text = f.read()
+                
+            plain_text = _parse_lrc_to_plain(lrc_text)
+            
+            return lrc_text, plain_text
+            
+        except Exception as e:
+            logger.error(f"Failed to read LRC file: {e}")
+            return None, None
     finally:
-        _clear_download_dir() 
+        remove_job_dir(job_dir)
 
-async def get_cover_via_cli(token: str, track_id: str) -> str:
+async def get_cover_via_cli(
+    token: str, track_id: str, job_dir: str, runner: ProcessRunner
+) -> str:
     """
-    Скачивает трек с обложкой в макс. разрешении ("original").
+    Скачивает трек с обложкой в макс. разрешении ("original")
+    в рабочую папку job_dir.
     Возвращает путь к скачанному файлу (для извлечения обложки).
     """
-    _clear_download_dir()
-    
     url = f"https://music.yandex.ru/track/{track_id}"
     
     cmd = [
@@ -161,31 +218,17 @@ async def get_cover_via_cli(token: str, track_id: str) -> str:
         "--embed-cover",
         "--cover-resolution", "original",
         "--url", url,
-        "--dir", DOWNLOAD_DIR,
-        # ===>>> ИСПРАВЛЕНИЕ ЗДЕСЬ: Задаем чистый паттерн <<<===
-        "--path-pattern", "#track-artist - #title"
+        "--dir", job_dir,
+        "--path-pattern", CLI_OUTPUT_NAME
     ]
 
-    result = await asyncio.to_thread(
-        subprocess.run, cmd, capture_output=True, text=True, encoding='utf-8'
-    )
+    result = await runner.run(cmd)
 
     if result.returncode != 0:
         logger.error(f"Downloader failed (for cover): {result.stderr}")
         raise Exception(f"Ошибка загрузчика: {result.stderr[:1000]}")
 
-    audio_files = sorted(
-        glob.glob(os.path.join(DOWNLOAD_DIR, "**", "*.*"), recursive=True),
-        key=os.path.getmtime,
-        reverse=True
-    )
-    
-    if not audio_files:
+    path = _cli_audio_path(job_dir)
+    if path is None:
         raise Exception("Файл для обложки был скачан, но не найден.")
-        
-    audio_file = next((f for f in audio_files if not f.endswith('.lrc')), None)
-    
-    if not audio_file:
-         raise Exception("Файл для обложки не найден (только .lrc).")
-         
-    return audio_file
\ No newline at end of file
+    return path
\ No newline at end of file
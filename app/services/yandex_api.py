@@ -0,0 +1,127 @@
+import asyncio
+import itertools
+import logging
+import random
+
+import aiohttp
+from yandex_music import ClientAsync
+from yandex_music.exceptions import BadRequestError, NetworkError, NotFoundError
+from yandex_music.utils.request_async import Request
+
+logger = logging.getLogger(__name__)
+
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 8.0
+KEEPALIVE_TIMEOUT = 60
+
+
+def backoff_delay(attempt: int) -> float:
+    """Экспоненциальная пауза перед повтором со случайным разбросом (full jitter)."""
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+
+class PooledRequest(Request):
+    """
+    Запросы ClientAsync через общий пул соединений.
+
+    Сама библиотека на каждый запрос открывает новое соединение
+    (aiohttp.request без connector). Здесь передается общий
+    TCPConnector: соединения с API переиспользуются (keep-alive),
+    а их общее число ограничено размером пула.
+    Сетевые ошибки и таймауты повторяются с паузой,
+    ошибки запроса (400, 404, авторизация) - нет.
+    Переопределяет внутренний _request_wrapper библиотеки, поэтому
+    версия yandex-music закреплена в requirements.txt точно.
+    """
+
+    def __init__(self, connector: aiohttp.TCPConnector, timeout: float, retries: int):
+        super().__init__(timeout=timeout)
+        self.connector = connector
+        self.retries = max(0, retries)
+
+    async def _request_wrapper(self, *args, **kwargs):
+        kwargs["connector"] = self.connector
+        attempt = 0
+        while True:
+            try:
+                return await super()._request_wrapper(*args, **kwargs)
+            except (BadRequestError, NotFoundError):
+                raise
+            except NetworkError as e:
+                if attempt >= self.retries:
+                    raise
+                delay = backoff_delay(attempt)
+                attempt += 1
+                logger.debug(f"Yandex API request failed ({e}), retry {attempt} in {delay:.2f}s")
+                await asyncio.sleep(delay)
+
+
+class YandexClientPool:
+    """
+    Асинхронные клиенты Яндекс.Музыки (по одному на токен)
+    над общим пулом HTTP-соединений.
+
+    - client - очередной клиент по кругу: поиск и информация
+      о треках распределяются между всеми токенами;
+    - download_client - только токены с подпиской Plus (проверяются
+      в init): без нее download-info отдает превью или низкий битрейт,
+      а такой файл потом закэшировался бы как полноценный.
+      Ссылки на файлы и тексты берутся только через них.
+    Первый токен - основной; если подписки нет ни у одного,
+    загрузки идут через него.
+    """
+
+    def __init__(
+        self,
+        tokens: list[str],
+        max_connections: int = 16,
+        timeout: float = 10,
+        retries: int = 3
+    ):
+        if not tokens:
+            raise ValueError("At least one Yandex token is required")
+        self.connector = aiohttp.TCPConnector(
+            limit=max_connections,
+            keepalive_timeout=KEEPALIVE_TIMEOUT,
+            ttl_dns_cache=300
+        )
+        self.clients = [
+            ClientAsync(token, request=PooledRequest(self.connector, timeout, retries))
+            for token in tokens
+        ]
+        self._next = itertools.cycle(self.clients)
+        self.download_clients = self.clients[:1]
+        self._next_download = itertools.cycle(self.download_clients)
+
+    @property
+    def client(self) -> ClientAsync:
+        return next(self._next)
+
+    @property
+    def download_client(self) -> ClientAsync:
+        return next(self._next_download)
+
+    @staticmethod
+    def _has_plus(client: ClientAsync) -> bool:
+        plus = client.me.plus if client.me else None
+        return bool(plus and plus.has_plus)
+
+    async def init(self) -> "YandexClientPool":
+        """Проверяет все токены (account_status) одновременно."""
+        await asyncio.gather(*(client.init() for client in self.clients))
+
+        eligible = [client for client in self.clients if self._has_plus(client)]
+        if not eligible:
+            logger.warning("No Yandex token has a Plus subscription, downloads use the main token.")
+            eligible = self.clients[:1]
+        elif len(eligible) < len(self.clients):
+            logger.warning(
+                f"{len(self.clients) - len(eligible)} Yandex token(s) without Plus "
+                "are used for search and track info only."
+            )
+        self.download_clients = eligible
+        self._next_download = itertools.cycle(eligible)
+        return self
+
+    async def close(self):
+        await self.connector.close()
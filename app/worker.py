@@ -0,0 +1,175 @@
+import asyncio
+import logging
+import time
+
+from aiogram import Bot, types
+from aiogram.exceptions import TelegramAPIError, TelegramBadRequest
+
+from app.handlers.media import audio_tags, sent_file_id
+from app.services.yandex import create_job_dir, remove_job_dir
+from app.services.downloader import Downloader
+from app.services.tracks import TrackCatalog, TrackInfo
+from app.services.database import Database, FILE_AUDIO, FILE_LRC
+from app.services.job_queue import JobQueue, QueuedJob
+
+logger = logging.getLogger(__name__)
+
+
+class DownloadWorker:
+    """
+    Воркер загрузок: берет задачи из общей очереди, качает трек
+    и сам отправляет его в чат (через Bot API, без входящего апдейта).
+    Процессов-воркеров может быть сколько угодно, но только на машине
+    бота: file_id, тексты и статистика пишутся в его bot_data.db,
+    а кэш треков - общая папка downloads/cache.
+    """
+
+    def __init__(
+        self,
+        bot: Bot,
+        queue: JobQueue,
+        downloader: Downloader,
+        catalog: TrackCatalog,
+        db: Database,
+        concurrency: int = 4
+    ):
+        self.bot = bot
+        self.queue = queue
+        self.downloader = downloader
+        self.catalog = catalog
+        self.db = db
+        self.concurrency = max(1, concurrency)
+
+    async def run(self):
+        """Крутит concurrency обработчиков, пока процесс не остановят."""
+        await asyncio.gather(*(self._consume() for _ in range(self.concurrency)))
+
+    async def _consume(self):
+        while True:
+            try:
+                job = await self.queue.get()
+            except Exception as e:
+                logger.error(f"Failed to fetch job: {e}")
+                await asyncio.sleep(1)
+                continue
+            if job is None:
+                continue
+
+            try:
+                await self._process(job)
+            except Exception as e:
+                logger.error(f"Job {job.id} failed (attempt {job.attempts}): {e}")
+                await self._finish(job, e)
+            else:
+                await self._finish(job)
+
+    async def _finish(self, job: QueuedJob, error: Exception | None = None):
+        """
+        ack / retry задачи. Ошибки здесь только логируются: одна задача
+        (заблокированный бот, недоступная очередь) не должна
+        останавливать обработчик. Не подтвержденная задача
+        выдается снова по истечении аренды.
+        """
+        try:
+            if error is None:
+                await self.queue.ack(job)
+            else:
+                await self._report_error(job, error)
+                await self.queue.retry(job, str(error))
+        except Exception as e:
+            logger.error(f"Failed to finish job {job.id}: {e}")
+
+    async def _edit_status(self, payload: dict, text: str):
+        try:
+            await self.bot.edit_message_text(
+                text, chat_id=payload["chat_id"], message_id=payload["status_message_id"]
+            )
+        except TelegramAPIError as e:
+            logger.debug(f"Failed to edit status message: {e}")
+
+    async def _delete_status(self, payload: dict):
+        try:
+            await self.bot.delete_message(payload["chat_id"], payload["status_message_id"])
+        except TelegramAPIError as e:
+            logger.debug(f"Failed to delete status message: {e}")
+
+    async def _report_error(self, job: QueuedJob, error: Exception):
+        if job.attempts < self.queue.max_attempts:
+            text = f"🔁 <b>Ошибка, пробую еще раз</b> ({job.attempts}/{self.queue.max_attempts})"
+        else:
+            error_text = str(error).replace("<", "&lt;").replace(">", "&gt;")
+            text = f"❌ <b>Ошибка при загрузке:</b>\n<code>{error_text}</code>"
+        await self._edit_status(job.payload, text)
+
+    async def _send_cached_audio(self, payload: dict) -> bool:
+        """Трек уже загрузили (другой воркер или бот) - шлем по file_id."""
+        file_id = await self.db.get_file_id(payload["track_id"], FILE_AUDIO, payload["quality"])
+        if not file_id:
+            return False
+        try:
+            await self.bot.send_audio(payload["chat_id"], audio=file_id)
+            return True
+        except TelegramBadRequest as e:
+            logger.warning(f"Cached file_id rejected ({payload['track_id']}): {e}")
+            await self.db.delete_file_id(payload["track_id"], FILE_AUDIO, payload["quality"])
+            return False
+
+    async def _process(self, job: QueuedJob):
+        payload = job.payload
+        chat_id = payload["chat_id"]
+        track_id = payload["track_id"]
+        quality_code = payload["quality"]
+        started = time.perf_counter()
+
+        track_obj = await self.catalog.get(track_id)
+        if not await self._send_cached_audio(payload):
+            await self._edit_status(
+                payload, "⏳ <b>Начинаю скачивание...</b>\n<i>(Это может занять время)</i>"
+            )
+            job_dir = create_job_dir()
+            try:
+                audio = await self.downloader.download_audio(
+                    track_id, quality_code, job_dir, track_obj
+                )
+                await self._edit_status(payload, "📤 <b>Загружаю аудио в Telegram...</b>")
+                sent = await self.bot.send_audio(
+                    chat_id, audio=types.FSInputFile(audio.path), **audio_tags(audio)
+                )
+                await self.db.save_file_id(track_id, FILE_AUDIO, sent_file_id(sent), quality_code)
+            finally:
+                remove_job_dir(job_dir)
+
+        await self._delete_status(payload)
+        await self.db.increment_track_count(payload["user_id"])
+        logger.info(f"Job {job.id}: track {track_id} delivered in {time.perf_counter() - started:.2f}s")
+
+        if payload.get("send_lrc"):
+            try:
+                await self._send_lrc(payload, track_obj)
+            except Exception as e:
+                logger.warning(f"Failed to auto-send LRC: {e}")
+
+    async def _send_lrc(self, payload: dict, track_obj: TrackInfo | None):
+        track_id = payload["track_id"]
+        file_id = await self.db.get_file_id(track_id, FILE_LRC)
+        if file_id:
+            await self.bot.send_document(payload["chat_id"], document=file_id)
+            await self.db.increment_lyrics_count(payload["user_id"])
+            return
+
+        cached = await self.db.get_lyrics(track_id)
+        if cached is None:
+            cached = await self.downloader.get_lyrics(track_id, track_obj)
+            await self.db.save_lyrics(track_id, *cached)
+
+        lrc_text, _ = cached
+        if lrc_text and track_obj:
+            sent = await self.bot.send_document(
+                payload["chat_id"],
+                document=types.BufferedInputFile(
+                    lrc_text.encode("utf-8"),
+                    filename=f"{track_obj.main_artist} - {track_obj.title}.lrc"
+                )
+            )
+            await self.db.save_file_id(track_id, FILE_LRC, sent_file_id(sent))
+            await self.db.increment_lyrics_count(payload["user_id"])
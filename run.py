@@ -1,60 +1,203 @@
 import asyncio
 import logging
 
+from aiohttp import web
 from aiogram import Bot, Dispatcher
-from aiogram.fsm.storage.memory import MemoryStorage 
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
 from aiogram.client.default import DefaultBotProperties 
 
-from app.config import load_config
-from app.services.yandex import setup_yandex_client
-from app.services.database import Database, DB_FILE
+from app.bootstrap import create_database, create_downloader, create_yandex_client
+from app.config import Config, load_config
+from app.services.database import DB_FILE
+from app.services.fsm_storage import create_fsm_storage
+from app.services.job_queue import create_job_queue
+from app.services.scheduler import JobScheduler
+from app.services.singleflight import SingleFlight
+from app.services.search_cache import SearchCache
+from app.services.tracks import TrackCatalog
+
+from app.handlers import common, settings, search, download, batch
+
+logger = logging.getLogger(__name__)
+
+# Сколько секунд при остановке ждать обработки уже принятых обновлений
+SHUTDOWN_GRACE = 60
+
+
+async def run_polling(bot: Bot, dp: Dispatcher, config: Config):
+    """Long polling: бот сам забирает обновления у Telegram."""
+    logger.info("Starting polling...")
+    await bot.delete_webhook(drop_pending_updates=config.bot.drop_pending_updates)
+    await dp.start_polling(bot)
+
+
+async def run_webhook(bot: Bot, dp: Dispatcher, config: Config):
+    """
+    Webhook: Telegram сам присылает обновления на aiohttp-сервер.
+    Запросы без правильного секретного заголовка отклоняются,
+    поэтому несколько экземпляров можно поставить за один адрес.
+
+    Обновления обрабатываются в фоне (Telegram сразу получает ответ),
+    поэтому их задачи запоминаются и при остановке дожидаются.
+    """
+    webhook = config.webhook
+    if not webhook.url:
+        raise ValueError("BOT_MODE=webhook requires WEBHOOK_URL")
+    url = f"{webhook.url}{webhook.path}"
+
+    async def on_startup(bot: Bot):
+        # Вебхук общий для всех экземпляров. set_webhook идемпотентен,
+        # а вызывается всегда: секрет getWebhookInfo не показывает, и его
+        # смена иначе не дошла бы до Telegram. Накопившиеся обновления
+        # не сбрасываем - перезапуск одной реплики не должен их терять.
+        await bot.set_webhook(
+            url,
+            secret_token=webhook.secret,
+            allowed_updates=dp.resolve_used_update_types(),
+            drop_pending_updates=False
+        )
+        logger.info(f"Webhook set to {url}")
+
+    # Вебхук при остановке не снимаем: другие экземпляры
+    # могут продолжать принимать обновления.
+    dp.startup.register(on_startup)
+
+    in_flight: set[asyncio.Task] = set()
+
+    async def track_update(handler, event, data):
+        # Middleware выполняется внутри фоновой задачи обновления
+        task = asyncio.current_task()
+        in_flight.add(task)
+        try:
+            return await handler(event, data)
+        finally:
+            in_flight.discard(task)
+
+    dp.update.outer_middleware(track_update)
+
+    app = web.Application()
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        secret_token=webhook.secret
+    ).register(app, path=webhook.path)
+    setup_application(app, dp, bot=bot)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host=webhook.host, port=webhook.port)
+    await site.start()
+    logger.info(f"Listening for webhook updates on {webhook.host}:{webhook.port}{webhook.path}")
+
+    try:
+        await asyncio.Event().wait()
+    finally:
+        # Сначала перестаем принимать запросы, затем ждем фоновые
+        # обработчики: runner.cleanup() о них не знает.
+        await site.stop()
+        if in_flight:
+            logger.info(f"Waiting for {len(in_flight)} update(s) to finish...")
+            _, pending = await asyncio.wait(set(in_flight), timeout=SHUTDOWN_GRACE)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        await runner.cleanup()
 
-from app.handlers import common, settings, search, download
 
 async def main():
     logging.basicConfig(
         level=logging.INFO,
         format="%(asctime)s - %(levelname)s - %(name)s - %(message)s",
     )
-    logger = logging.getLogger(__name__)
     logger.info("Starting bot...")
 
-    bot_config, yandex_config = load_config()
+    config = load_config()
 
-    storage = MemoryStorage()
-    logger.info("Using MemoryStorage (persistent settings are in SQLite).")
-    
-    db = Database(db_path=DB_FILE)
-    await db.init_db()
+    # Миграции (в т.ч. таблицы FSM и очереди) - до открытия хранилищ
+    db = await create_database(config)
+
+    storage = await create_fsm_storage(
+        config.backend.fsm_storage, DB_FILE, config.backend.redis_url
+    )
+    logger.info(f"FSM storage: {type(storage).__name__}.")
+
+    job_queue = await create_job_queue(
+        config.backend.job_queue,
+        config.backend.job_queue_name,
+        DB_FILE,
+        config.backend.redis_url,
+        lease=config.backend.job_lease,
+        max_attempts=config.backend.job_max_attempts
+    )
+    if job_queue:
+        logger.info(f"Downloads go to {type(job_queue).__name__} '{job_queue.name}' (run worker.py).")
     
     bot = Bot(
-        token=bot_config.token,
+        token=config.bot.token,
         default=DefaultBotProperties(parse_mode="HTML")
     )
     dp = Dispatcher(storage=storage)
 
-    yandex_client = await setup_yandex_client(yandex_config.token)
-    logger.info("Yandex.Music client (for Search) initialized!")
+    yandex_client = await create_yandex_client(config)
+
+    downloader = await create_downloader(config, yandex_client)
+
+    scheduler = JobScheduler(
+        max_concurrent=config.queue.max_concurrent_jobs,
+        max_per_user=config.queue.max_jobs_per_user
+    )
+    logger.info(
+        f"Job scheduler: {scheduler.max_concurrent} concurrent, "
+        f"{scheduler.max_per_user} per user."
+    )
         
     dp["bot_username"] = (await bot.get_me()).username
     dp["yandex_client"] = yandex_client
-    dp["yandex_token"] = yandex_config.token
     dp["db"] = db 
+    dp["scheduler"] = scheduler
+    dp["flights"] = SingleFlight()
+    dp["downloader"] = downloader
+    dp["job_queue"] = job_queue
+    catalog = TrackCatalog(
+        yandex_client,
+        db,
+        maxsize=config.cache.track_cache_size,
+        db_ttl=config.cache.track_cache_ttl
+    )
+    dp["catalog"] = catalog
+    dp["search_cache"] = SearchCache(
+        yandex_client,
+        catalog,
+        maxsize=config.cache.search_cache_size,
+        ttl=config.cache.search_cache_ttl,
+        debounce=config.cache.inline_debounce,
+        page_size=config.cache.inline_page_size
+    )
+    dp["inline_cache_time"] = config.cache.inline_cache_time
+    dp["batch_max_tracks"] = config.queue.batch_max_tracks
     
     dp.include_router(common.router) 
     dp.include_router(settings.router)
     dp.include_router(search.router)
+    dp.include_router(batch.router)
     dp.include_router(download.router)
     
     logger.info("All routers registered!")
 
-    logger.info("Starting polling...")
     try:
-        await bot.delete_webhook(drop_pending_updates=True)
-        await dp.start_polling(bot)
+        if config.bot.mode == "webhook":
+            await run_webhook(bot, dp, config)
+        else:
+            await run_polling(bot, dp, config)
     finally:
         await bot.session.close()
-        await db.connection.close() 
+        await downloader.close()
+        await yandex_client.close()
+        logger.info(f"Audio cache: {downloader.cache.stats()}")
+        if job_queue:
+            await job_queue.close()
+        await storage.close()
+        await db.close()
         logger.info("Bot stopped!")
 
 if __name__ == "__main__":
@@ -0,0 +1,139 @@
+import asyncio
+import time
+
+import pytest
+
+aiosqlite = pytest.importorskip("aiosqlite")
+
+from app.services.job_queue import RedisJobQueue, SQLiteJobQueue  # noqa: E402
+from app.services.migrations import migrate  # noqa: E402
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+async def _redis_queue(**kwargs) -> RedisJobQueue:
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")  # Lua-скрипты в fakeredis
+    queue = RedisJobQueue("redis://unused", "test", **kwargs)
+    queue.redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+    queue.POLL_INTERVAL = 0.01
+    await queue.open()
+    return queue
+
+
+async def _sqlite_queue(path, **kwargs) -> SQLiteJobQueue:
+    async with aiosqlite.connect(path) as connection:
+        await migrate(connection)
+    queue = SQLiteJobQueue(str(path), "test", **kwargs)
+    queue.POLL_INTERVAL = 0.01
+    await queue.open()
+    return queue
+
+
+@pytest.fixture(params=["redis", "sqlite"])
+def make_queue(request, tmp_path):
+    async def factory(**kwargs):
+        if request.param == "redis":
+            return await _redis_queue(**kwargs)
+        return await _sqlite_queue(tmp_path / "jobs.db", **kwargs)
+    return factory
+
+
+def test_put_get_ack(make_queue):
+    async def scenario():
+        queue = await make_queue()
+        await queue.put({"track_id": "1"})
+        await queue.put({"track_id": "2"})
+
+        first = await queue.get(timeout=0)
+        second = await queue.get(timeout=0)
+        assert [first.payload["track_id"], second.payload["track_id"]] == ["1", "2"]
+        assert await queue.get(timeout=0) is None
+
+        await queue.ack(first)
+        await queue.ack(second)
+        assert await queue.get(timeout=0) is None
+        await queue.close()
+    run(scenario())
+
+
+def test_crashed_worker_job_is_redelivered(make_queue):
+    async def scenario():
+        queue = await make_queue(lease=0.05)
+        await queue.put({"track_id": "1"})
+
+        lost = await queue.get(timeout=0)  # воркер взял задачу и умер
+        assert await queue.get(timeout=0) is None
+
+        await asyncio.sleep(0.06)
+        job = await queue.get(timeout=0)
+        assert job.id == lost.id
+        assert job.attempts == 2
+        await queue.close()
+    run(scenario())
+
+
+def test_late_retry_does_not_duplicate(make_queue):
+    async def scenario():
+        queue = await make_queue(lease=0.05)
+        await queue.put({"track_id": "1"})
+
+        slow = await queue.get(timeout=0)
+        await asyncio.sleep(0.06)
+        again = await queue.get(timeout=0)  # аренда истекла, задачу взял другой
+        await queue.retry(slow, "timeout")  # запоздалый retry первого воркера
+
+        await queue.ack(again)
+        assert await queue.get(timeout=0) is None
+        await queue.close()
+    run(scenario())
+
+
+def test_failed_after_max_attempts(make_queue):
+    async def scenario():
+        queue = await make_queue(max_attempts=2)
+        await queue.put({"track_id": "1"})
+
+        for attempt in (1, 2):
+            job = await queue.get(timeout=0)
+            assert job.attempts == attempt
+            await queue.retry(job, "boom")
+        assert await queue.get(timeout=0) is None
+        await queue.close()
+    run(scenario())
+
+
+def test_get_waits_for_new_job(make_queue):
+    async def scenario():
+        queue = await make_queue()
+
+        async def put_later():
+            await asyncio.sleep(0.05)
+            await queue.put({"track_id": "late"})
+
+        started = time.monotonic()
+        _, job = await asyncio.gather(put_later(), queue.get(timeout=2))
+        assert job.payload["track_id"] == "late"
+        assert time.monotonic() - started < 1
+        await queue.close()
+    run(scenario())
+
+
+def test_redis_claim_is_atomic():
+    """Выданная задача всегда и в processing, и с арендой - без промежуточного состояния."""
+    async def scenario():
+        queue = await _redis_queue()
+        await queue.put({"track_id": "1"})
+        job = await queue.get(timeout=0)
+
+        processing = await queue.redis.lrange("test:processing", 0, -1)
+        leases = await queue.redis.zrange("test:leases", 0, -1)
+        assert processing == [job.id] and leases == [job.id]
+
+        await queue.ack(job)
+        assert await queue.redis.lrange("test:processing", 0, -1) == []
+        assert await queue.redis.exists(f"test:job:{job.id}") == 0
+        await queue.close()
+    run(scenario())
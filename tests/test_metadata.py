@@ -0,0 +1,172 @@
+import struct
+
+import pytest
+
+mutagen = pytest.importorskip("mutagen")
+
+from mutagen import File as MutagenFile  # noqa: E402
+from mutagen.flac import FLAC, Picture  # noqa: E402
+from mutagen.id3 import APIC, ID3, TIT2, TPE1  # noqa: E402
+from mutagen.mp4 import MP4, MP4Cover  # noqa: E402
+
+from app.services.metadata import TrackTags, read_tags  # noqa: E402
+
+TITLE = "Песня"
+ARTIST = "Исполнитель"
+COVER = b"\xff\xd8\xff\xe0" + bytes(range(256)) * 8 + b"\xff\xd9"
+BACK_COVER = b"\x89PNG" + b"\x01" * 300
+
+
+def _mpeg_frames(seconds: int) -> bytes:
+    """Кадры MPEG-1 Layer III, 128 кбит/с, 44100 Гц, без padding."""
+    header = b"\xff\xfb\x90\x00"
+    frame = header + b"\x00" * (417 - len(header))
+    count = round(seconds * 44100 / 1152)
+    return frame * count
+
+
+def _expected(path) -> tuple[TrackTags, bytes]:
+    """Эталон: то же самое, прочитанное mutagen целиком."""
+    audio = MutagenFile(str(path))
+    if isinstance(audio, MP4):
+        title, artist = audio.tags["\xa9nam"][0], audio.tags["\xa9ART"][0]
+        cover = bytes(audio.tags["covr"][0])
+    elif isinstance(audio, FLAC):
+        title, artist = audio["title"][0], audio["artist"][0]
+        cover = next(p.data for p in audio.pictures if p.type == 3)
+    else:
+        title, artist = str(audio.tags["TIT2"]), str(audio.tags["TPE1"])
+        cover = next(a.data for a in audio.tags.getall("APIC") if a.type == 3)
+    return TrackTags(path=str(path), title=title, performer=artist,
+                     duration=int(audio.info.length)), cover
+
+
+def _assert_same(path):
+    tags = read_tags(str(path))
+    expected, cover = _expected(path)
+    assert (tags.title, tags.performer, tags.duration) == (
+        expected.title, expected.performer, expected.duration
+    )
+    assert tags.cover_span is not None and not tags.cover_via_mutagen
+    assert tags.read_cover() == cover
+
+
+@pytest.mark.parametrize("version", [3, 4])
+def test_mp3_utf16_cover_description(tmp_path, version):
+    path = tmp_path / "track.mp3"
+    path.write_bytes(_mpeg_frames(7))
+    id3 = ID3()
+    id3.add(TIT2(encoding=1, text=TITLE))
+    id3.add(TPE1(encoding=3 if version == 4 else 1, text=ARTIST))
+    # Задняя обложка первой: выбрать нужно переднюю
+    id3.add(APIC(encoding=1, mime="image/png", type=4, desc="Зад", data=BACK_COVER))
+    id3.add(APIC(encoding=1, mime="image/jpeg", type=3, desc="Обложка", data=COVER))
+    id3.save(str(path), v2_version=version)
+
+    _assert_same(path)
+
+
+def _id3v23_frame(frame_id: bytes, body: bytes) -> bytes:
+    return frame_id + struct.pack(">IH", len(body), 0) + body
+
+
+def _syncsafe(value: int) -> bytes:
+    return bytes((value >> shift) & 0x7F for shift in (21, 14, 7, 0))
+
+
+def test_mp3_id3v23_extended_header(tmp_path):
+    # mutagen не пишет расширенный заголовок - собираем тег вручную
+    utf16 = lambda text: b"\x01" + text.encode("utf-16") + b"\x00\x00"  # noqa: E731
+    frames = (
+        _id3v23_frame(b"TIT2", utf16(TITLE))
+        + _id3v23_frame(b"TPE1", b"\x00" + b"Artist")
+        + _id3v23_frame(b"APIC", b"\x01image/jpeg\x00\x03" + "Обл".encode("utf-16") + b"\x00\x00" + COVER)
+    )
+    extended = struct.pack(">IHI", 6, 0, 16)  # размер, флаги, размер padding
+    body = extended + frames + b"\x00" * 16
+    tag = b"ID3\x03\x00\x40" + _syncsafe(len(body)) + body
+
+    path = tmp_path / "track.mp3"
+    path.write_bytes(tag + _mpeg_frames(5))
+
+    tags = read_tags(str(path))
+    audio = MutagenFile(str(path))
+    assert tags.title == str(audio.tags["TIT2"]) == TITLE
+    assert tags.performer == str(audio.tags["TPE1"]) == "Artist"
+    assert tags.duration == int(audio.info.length)
+    assert tags.cover_span is not None and not tags.cover_via_mutagen
+    assert tags.read_cover() == audio.tags.getall("APIC")[0].data == COVER
+
+
+def _flac_streaminfo(seconds: int, sample_rate: int = 44100) -> bytes:
+    total = seconds * sample_rate
+    packed = (sample_rate << 44) | (1 << 41) | (15 << 36) | total
+    body = struct.pack(">HH", 4096, 4096) + b"\x00" * 6 + packed.to_bytes(8, "big") + b"\x00" * 16
+    return b"fLaC" + bytes([0x80]) + len(body).to_bytes(3, "big") + body
+
+
+def test_flac(tmp_path):
+    path = tmp_path / "track.flac"
+    path.write_bytes(_flac_streaminfo(42))
+    audio = FLAC(str(path))
+    audio["title"] = TITLE
+    audio["artist"] = ARTIST
+    for picture_type, data in ((4, BACK_COVER), (3, COVER)):
+        picture = Picture()
+        picture.type, picture.mime, picture.desc, picture.data = picture_type, "image/jpeg", "Обл", data
+        audio.add_picture(picture)
+    audio.save()
+
+    _assert_same(path)
+
+
+def _atom(name: bytes, body: bytes) -> bytes:
+    return struct.pack(">I", 8 + len(body)) + name + body
+
+
+def _mp4_base(seconds: int, timescale: int = 44100) -> bytes:
+    """ftyp + moov с mvhd/mdhd версии 1 (64-битные длительности)."""
+    duration = seconds * timescale
+    mvhd = _atom(b"mvhd", b"\x01\x00\x00\x00" + struct.pack(">QQIQ", 0, 0, timescale, duration) + b"\x00" * 80)
+    mdhd = _atom(b"mdhd", b"\x01\x00\x00\x00" + struct.pack(">QQIQ", 0, 0, timescale, duration) + b"\x00" * 4)
+    hdlr = _atom(b"hdlr", b"\x00" * 8 + b"soun" + b"\x00" * 13)
+    trak = _atom(b"trak", _atom(b"mdia", mdhd + hdlr))
+    return _atom(b"ftyp", b"M4A \x00\x00\x00\x00M4A mp42isom") + _atom(b"moov", mvhd + trak) + _atom(b"mdat", b"")
+
+
+def test_mp4_64bit_mvhd(tmp_path):
+    path = tmp_path / "track.m4a"
+    path.write_bytes(_mp4_base(185))
+    audio = MP4(str(path))
+    audio.add_tags()
+    audio.tags["\xa9nam"] = [TITLE]
+    audio.tags["\xa9ART"] = [ARTIST]
+    audio.tags["covr"] = [MP4Cover(COVER, imageformat=MP4Cover.FORMAT_JPEG)]
+    audio.save()
+
+    _assert_same(path)
+    assert read_tags(str(path)).duration == 185
+
+
+def test_unknown_container_without_cover_falls_back_to_mutagen(tmp_path):
+    path = tmp_path / "track.bin"
+    path.write_bytes(b"\x00" * 64)
+
+    tags = read_tags(str(path))
+    assert tags.title is None and not tags.has_cover
+    assert tags.read_cover() is None
+
+
+def test_mutagen_fallback_reports_missing_cover(tmp_path):
+    path = tmp_path / "track.mp3"
+    path.write_bytes(_mpeg_frames(3))
+    id3 = ID3()
+    id3.add(TIT2(encoding=3, text=TITLE))
+    id3.save(str(path), v2_version=4)
+    data = bytearray(path.read_bytes())
+    data[5] |= 0x80  # флаг рассинхронизации: вручную не разбирается
+    path.write_bytes(bytes(data))
+
+    tags = read_tags(str(path))
+    assert tags.title == TITLE
+    assert not tags.has_cover
@@ -0,0 +1,189 @@
+import asyncio
+
+import pytest
+
+from app.services.scheduler import JobScheduler, PRIORITY_DOWNLOAD, PRIORITY_LIGHT
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+async def settle():
+    """Дает запущенным задачам дойти до ближайшего ожидания."""
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+
+class Jobs:
+    """Задачи, которые ждут команды на завершение и записывают порядок старта."""
+
+    def __init__(self):
+        self.started: list[str] = []
+        self._release: dict[str, asyncio.Event] = {}
+
+    def job(self, name: str, result=None):
+        self._release[name] = asyncio.Event()
+
+        async def func():
+            self.started.append(name)
+            await self._release[name].wait()
+            return result if result is not None else name
+        return func
+
+    def release(self, name: str):
+        self._release[name].set()
+
+
+def test_per_user_cap():
+    async def scenario():
+        scheduler = JobScheduler(max_concurrent=4, max_per_user=2)
+        jobs = Jobs()
+        waiters = [
+            asyncio.create_task(scheduler.submit(1, jobs.job(f"a{i}"))) for i in range(3)
+        ]
+        await settle()
+        assert jobs.started == ["a0", "a1"]
+        assert (scheduler.running, scheduler.pending) == (2, 1)
+
+        jobs.release("a0")
+        await settle()
+        assert jobs.started == ["a0", "a1", "a2"]
+
+        jobs.release("a1")
+        jobs.release("a2")
+        assert await asyncio.gather(*waiters) == ["a0", "a1", "a2"]
+        assert (scheduler.running, scheduler.pending) == (0, 0)
+    run(scenario())
+
+
+def test_user_with_fewer_running_jobs_goes_first():
+    async def scenario():
+        scheduler = JobScheduler(max_concurrent=2, max_per_user=2)
+        jobs = Jobs()
+        waiters = [
+            asyncio.create_task(scheduler.submit(1, jobs.job("a-running"))),
+            asyncio.create_task(scheduler.submit(2, jobs.job("b-running"))),
+        ]
+        await settle()
+        # Очередь: сначала две задачи юзера 1, потом одна - юзера 3
+        for user_id, name in ((1, "a1"), (1, "a2"), (3, "c1")):
+            waiters.append(asyncio.create_task(scheduler.submit(user_id, jobs.job(name))))
+            await settle()
+        assert scheduler.pending == 3
+
+        # У юзера 1 задача еще идет, у юзера 3 - ни одной: он первый
+        jobs.release("b-running")
+        await settle()
+        assert jobs.started[2:] == ["c1"]
+
+        for name in ("a-running", "c1", "a1", "a2"):
+            jobs.release(name)
+            await settle()
+        await asyncio.gather(*waiters)
+        assert jobs.started[2:] == ["c1", "a1", "a2"]
+    run(scenario())
+
+
+def test_light_jobs_overtake_downloads():
+    async def scenario():
+        scheduler = JobScheduler(max_concurrent=1, max_per_user=1)
+        jobs = Jobs()
+        waiters = [asyncio.create_task(scheduler.submit(1, jobs.job("blocker")))]
+        await settle()
+        waiters.append(asyncio.create_task(
+            scheduler.submit(2, jobs.job("download"), priority=PRIORITY_DOWNLOAD)
+        ))
+        waiters.append(asyncio.create_task(
+            scheduler.submit(3, jobs.job("lyrics"), priority=PRIORITY_LIGHT)
+        ))
+        await settle()
+
+        for name in ("blocker", "lyrics", "download"):
+            jobs.release(name)
+            await settle()
+        await asyncio.gather(*waiters)
+        assert jobs.started == ["blocker", "lyrics", "download"]
+    run(scenario())
+
+
+def test_queue_position_is_reported():
+    async def scenario():
+        scheduler = JobScheduler(max_concurrent=1, max_per_user=1)
+        jobs = Jobs()
+        positions = []
+
+        async def on_queued(position):
+            positions.append(position)
+
+        first = asyncio.create_task(scheduler.submit(1, jobs.job("first"), on_queued=on_queued))
+        await settle()
+        second = asyncio.create_task(scheduler.submit(2, jobs.job("second"), on_queued=on_queued))
+        await settle()
+        assert positions == [1]  # первая стартовала сразу
+
+        jobs.release("first")
+        jobs.release("second")
+        await asyncio.gather(first, second)
+    run(scenario())
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def scenario():
+        scheduler = JobScheduler(max_concurrent=1, max_per_user=1)
+        jobs = Jobs()
+        blocker = asyncio.create_task(scheduler.submit(1, jobs.job("blocker")))
+        queued = asyncio.create_task(scheduler.submit(2, jobs.job("queued")))
+        await settle()
+        assert scheduler.pending == 1
+
+        queued.cancel()
+        await settle()
+        assert scheduler.pending == 0
+
+        jobs.release("blocker")
+        await blocker
+        await settle()
+        assert jobs.started == ["blocker"]
+        assert queued.cancelled()
+    run(scenario())
+
+
+def test_cancelled_waiter_stops_running_job():
+    async def scenario():
+        scheduler = JobScheduler(max_concurrent=1, max_per_user=1)
+        cancelled = asyncio.Event()
+
+        async def func():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        waiter = asyncio.create_task(scheduler.submit(1, func))
+        await settle()
+        assert scheduler.running == 1
+
+        waiter.cancel()
+        await settle()
+        assert cancelled.is_set()
+        assert scheduler.running == 0
+    run(scenario())
+
+
+def test_job_error_reaches_waiter_and_frees_slot():
+    async def scenario():
+        scheduler = JobScheduler(max_concurrent=1, max_per_user=1)
+
+        async def fail():
+            raise ValueError("boom")
+
+        async def ok():
+            return "ok"
+
+        with pytest.raises(ValueError, match="boom"):
+            await scheduler.submit(1, fail)
+        assert await scheduler.submit(1, ok) == "ok"
+        assert scheduler.running == 0
+    run(scenario())
@@ -0,0 +1,126 @@
+import asyncio
+
+import pytest
+
+from app.services.singleflight import SingleFlight
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+async def settle():
+    """Дает запущенным задачам дойти до ближайшего ожидания."""
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+
+def test_concurrent_calls_share_one_run():
+    async def scenario():
+        flights = SingleFlight()
+        release = asyncio.Event()
+        calls = 0
+
+        async def func():
+            nonlocal calls
+            calls += 1
+            await release.wait()
+            return "file_id"
+
+        leader = asyncio.create_task(flights.do("key", func))
+        await settle()
+        waiters = [asyncio.create_task(flights.do("key", func)) for _ in range(3)]
+        await settle()
+        assert flights.in_flight("key")
+
+        release.set()
+        assert await leader == ("file_id", False)
+        assert await asyncio.gather(*waiters) == [("file_id", True)] * 3
+        assert calls == 1
+        assert not flights.in_flight("key")
+    run(scenario())
+
+
+def test_different_keys_run_separately():
+    async def scenario():
+        flights = SingleFlight()
+
+        async def func(value):
+            await asyncio.sleep(0)
+            return value
+
+        results = await asyncio.gather(
+            flights.do("a", lambda: func("a")), flights.do("b", lambda: func("b"))
+        )
+        assert results == [("a", False), ("b", False)]
+    run(scenario())
+
+
+def test_leader_error_reaches_waiters_and_releases_key():
+    async def scenario():
+        flights = SingleFlight()
+        release = asyncio.Event()
+
+        async def fail():
+            await release.wait()
+            raise ValueError("boom")
+
+        leader = asyncio.create_task(flights.do("key", fail))
+        await settle()
+        waiter = asyncio.create_task(flights.do("key", fail))
+        await settle()
+
+        release.set()
+        for task in (leader, waiter):
+            with pytest.raises(ValueError, match="boom"):
+                await task
+
+        # Ключ освобожден: следующий вызов выполняется заново
+        async def ok():
+            return "ok"
+        assert await flights.do("key", ok) == ("ok", False)
+    run(scenario())
+
+
+def test_leader_cancellation_fails_waiters():
+    async def scenario():
+        flights = SingleFlight()
+
+        async def slow():
+            await asyncio.sleep(10)
+
+        leader = asyncio.create_task(flights.do("key", slow))
+        await settle()
+        waiter = asyncio.create_task(flights.do("key", slow))
+        await settle()
+
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        with pytest.raises(RuntimeError):
+            await waiter
+        assert not flights.in_flight("key")
+    run(scenario())
+
+
+def test_waiter_cancellation_does_not_cancel_leader():
+    async def scenario():
+        flights = SingleFlight()
+        release = asyncio.Event()
+
+        async def func():
+            await release.wait()
+            return "done"
+
+        leader = asyncio.create_task(flights.do("key", func))
+        await settle()
+        waiter = asyncio.create_task(flights.do("key", func))
+        await settle()
+
+        waiter.cancel()
+        await settle()
+        assert waiter.cancelled() and not leader.done()
+
+        release.set()
+        assert await leader == ("done", False)
+    run(scenario())
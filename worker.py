@@ -0,0 +1,91 @@
+import asyncio
+import logging
+import os
+
+from aiogram import Bot
+from aiogram.client.default import DefaultBotProperties 
+
+from app.bootstrap import create_database, create_downloader, create_yandex_client
+from app.config import load_config
+from app.services.database import DB_FILE
+from app.services.job_queue import create_job_queue
+from app.services.tracks import TrackCatalog
+from app.worker import DownloadWorker
+
+logger = logging.getLogger(__name__)
+
+
+async def main():
+    """
+    Отдельный процесс загрузок. Бот (run.py с JOB_QUEUE=sqlite/redis)
+    только принимает апдейты и ставит задачи, а воркеров можно
+    запускать сколько нужно, независимо от бота - но на той же
+    машине: база и кэш треков общие с ботом.
+    """
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(levelname)s - %(name)s - %(message)s",
+    )
+    logger.info("Starting download worker...")
+
+    config = load_config()
+    if not config.backend.job_queue:
+        raise SystemExit("worker.py needs JOB_QUEUE=sqlite or JOB_QUEUE=redis")
+    if not os.path.exists(DB_FILE):
+        # Своя пустая база - это file_id и статистика, которые бот не увидит
+        raise SystemExit(
+            f"{DB_FILE} not found: run worker.py on the bot's host, from the bot's directory"
+        )
+
+    db = await create_database(config)
+    job_queue = await create_job_queue(
+        config.backend.job_queue,
+        config.backend.job_queue_name,
+        DB_FILE,
+        config.backend.redis_url,
+        lease=config.backend.job_lease,
+        max_attempts=config.backend.job_max_attempts
+    )
+
+    bot = Bot(
+        token=config.bot.token,
+        default=DefaultBotProperties(parse_mode="HTML")
+    )
+    yandex_client = await create_yandex_client(config)
+    downloader = await create_downloader(config, yandex_client)
+    catalog = TrackCatalog(
+        yandex_client,
+        db,
+        maxsize=config.cache.track_cache_size,
+        db_ttl=config.cache.track_cache_ttl
+    )
+
+    worker = DownloadWorker(
+        bot,
+        job_queue,
+        downloader,
+        catalog,
+        db,
+        concurrency=config.backend.worker_concurrency
+    )
+    logger.info(
+        f"Worker: {worker.concurrency} parallel jobs from "
+        f"{type(job_queue).__name__} '{job_queue.name}'."
+    )
+
+    try:
+        await worker.run()
+    finally:
+        await bot.session.close()
+        await downloader.close()
+        await yandex_client.close()
+        logger.info(f"Audio cache: {downloader.cache.stats()}")
+        await job_queue.close()
+        await db.close()
+        logger.info("Worker stopped!")
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except (KeyboardInterrupt, SystemExit):
+        logging.info("Worker execution manually interrupted!")